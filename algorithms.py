@@ -1,19 +1,25 @@
 # ===== File: algorithms.py (最终正确版) =====
 # 版本确认：此文件已包含扇区生成函数
 
-from haversine import haversine, Unit
 import numpy as np
-import math
+
+# haversine公式使用的地球平均半径（米），与haversine库一致
+AVG_EARTH_RADIUS_M = 6371008.8
+# 扇区绘制参数：地球半径(WGS84长半轴)、弧上分段数、4G/5G扇区半径(米)和张角(度)
+SECTOR_EARTH_RADIUS_M = 6378137.0
+SECTOR_STEPS = 20
+SECTOR_RADIUS_4G_M = 500
+SECTOR_RADIUS_5G_M = 400
+SECTOR_ANGLE_DEG = 60
+
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
     使用haversine公式精确计算两个经纬度点之间的球面距离。
-    此函数对应《计划书》第7页的"经纬度计算小区距离算法"。
+    此函数对应《计划书》第7页的"经纬度计算小区距离算法"。标量版本，内部调用calculate_distance_batch。
     """
     try:
-        point1 = (lat1, lon1)
-        point2 = (lat2, lon2)
-        return haversine(point1, point2, unit=Unit.METERS)
+        return float(calculate_distance_batch(float(lat1), float(lon1), float(lat2), float(lon2)))
     except (ValueError, TypeError):
         return float('inf')
 
@@ -21,61 +27,80 @@ def calculate_distance(lat1, lon1, lat2, lon2):
 def calculate_azimuth_difference(azimuth1, azimuth2):
     """
     计算两个方位角(0-360度)之间的最小夹角。
-    此函数对应《计划书》第9页中"共站方位夹角计算"的核心逻辑。
+    此函数对应《计划书》第9页中"共站方位夹角计算"的核心逻辑。标量版本，内部调用calculate_azimuth_difference_batch。
     """
     try:
-        diff = abs(azimuth1 - azimuth2)
-        return min(diff, 360 - diff)
+        return float(calculate_azimuth_difference_batch(float(azimuth1), float(azimuth2)))
     except (ValueError, TypeError):
         return float('inf')
 
 
+def calculate_distance_batch(lat1, lon1, lat2, lon2):
+    """
+    calculate_distance的NumPy批量版本，输入为等长(或可广播)的经纬度数组，返回距离数组(米)。
+    经纬度超出合法范围的点返回inf，与标量版本的行为一致。
+    """
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    lon1 = np.asarray(lon1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    lon2 = np.asarray(lon2, dtype=np.float64)
+
+    lat1_rad = np.radians(lat1)
+    lon1_rad = np.radians(lon1)
+    lat2_rad = np.radians(lat2)
+    lon2_rad = np.radians(lon2)
+    d = (np.sin((lat2_rad - lat1_rad) * 0.5) ** 2
+         + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin((lon2_rad - lon1_rad) * 0.5) ** 2)
+    distances = AVG_EARTH_RADIUS_M * (2 * np.arcsin(np.sqrt(d)))
+
+    valid = ((np.abs(lat1) <= 90) & (np.abs(lon1) <= 180) &
+             (np.abs(lat2) <= 90) & (np.abs(lon2) <= 180))
+    return np.where(valid, distances, np.inf)
+
+
+def calculate_azimuth_difference_batch(azimuth1, azimuth2):
+    """
+    calculate_azimuth_difference的NumPy批量版本，返回两组方位角之间的最小夹角数组。
+    """
+    diff = np.abs(np.asarray(azimuth1, dtype=np.float64) - np.asarray(azimuth2, dtype=np.float64))
+    return np.minimum(diff, 360 - diff)
+
+
+def create_sector_polygon_batch(lon, lat, azimuth, radius_m=SECTOR_RADIUS_4G_M, angle_deg=SECTOR_ANGLE_DEG,
+                                steps=SECTOR_STEPS):
+    """
+    create_sector_polygon的NumPy批量版本：输入N个中心点的经纬度、方位角(半径和张角可为标量或数组)，
+    返回(N, steps+3, 2)的扇形顶点数组，每个点为[经度, 纬度]，依次为中心点、弧上steps+1个点、中心点(闭合)。
+    """
+    lon = np.asarray(lon, dtype=np.float64).reshape(-1, 1)
+    lat = np.asarray(lat, dtype=np.float64).reshape(-1, 1)
+    azimuth_rad = np.radians(np.asarray(azimuth, dtype=np.float64)).reshape(-1, 1)
+    radius_m = np.asarray(radius_m, dtype=np.float64).reshape(-1, 1)
+    angle_rad = np.radians(np.asarray(angle_deg, dtype=np.float64)).reshape(-1, 1)
+
+    # 弧上各点相对方位角的偏转角：张角为标量时形状为(1, steps+1)，所有小区共用
+    arc_offsets = angle_rad * (np.arange(steps + 1) / steps - 0.5)
+    cos_offsets, sin_offsets = np.cos(arc_offsets), np.sin(arc_offsets)
+    # 和角公式展开 cos/sin(方位角+偏转角)，每个小区只需计算一次方位角的三角函数
+    cos_az, sin_az = np.cos(azimuth_rad), np.sin(azimuth_rad)
+    lat_scale = np.degrees(radius_m / SECTOR_EARTH_RADIUS_M)
+    lon_scale = lat_scale / np.cos(np.radians(lat))
+
+    n = np.broadcast_shapes(lon.shape, lat.shape, azimuth_rad.shape)[0]
+    points = np.empty((n, steps + 3, 2))
+    points[:, 0, 0] = points[:, -1, 0] = lon[:, 0]
+    points[:, 0, 1] = points[:, -1, 1] = lat[:, 0]
+    points[:, 1:-1, 0] = lon + lon_scale * (sin_az * cos_offsets + cos_az * sin_offsets)
+    points[:, 1:-1, 1] = lat + lat_scale * (cos_az * cos_offsets - sin_az * sin_offsets)
+    return points
+
+
 def create_sector_polygon(lon, lat, azimuth, radius_m, angle_deg):
     """
-    根据中心点、方位角、半径和角度，生成扇形多边形的顶点坐标列表。
+    根据中心点、方位角、半径和角度，生成扇形多边形的顶点坐标列表([[经度, 纬度], ...])；参数无效时返回None。
     """
     try:
-        # 检查输入参数是否有效
-        if (not isinstance(lon, (int, float)) or not isinstance(lat, (int, float)) or 
-            not isinstance(azimuth, (int, float)) or not isinstance(radius_m, (int, float)) or 
-            not isinstance(angle_deg, (int, float))):
-            return None
-        
-        # 地球半径（米）
-        EARTH_RADIUS = 6378137.0
-        
-        # 将角度转换为弧度
-        azimuth_rad = math.radians(azimuth)
-        angle_rad = math.radians(angle_deg)
-        
-        # 计算扇区左右两边的起始和结束角度
-        start_angle = azimuth_rad - angle_rad / 2
-        end_angle = azimuth_rad + angle_rad / 2
-        
-        # 扇形弧上的点数量，越多越平滑
-        steps = 20
-        
-        # 顶点列表，第一个点是中心点
-        points = [[lon, lat]]
-        
-        # 计算弧上的所有点
-        for i in range(steps + 1):
-            current_angle = start_angle + (end_angle - start_angle) * i / steps
-            
-            # 计算经纬度偏移量
-            lat_offset = (radius_m * math.cos(current_angle)) / EARTH_RADIUS
-            lon_offset = (radius_m * math.sin(current_angle)) / (EARTH_RADIUS * math.cos(math.radians(lat)))
-            
-            # 计算新的经纬度
-            new_lat = lat + math.degrees(lat_offset)
-            new_lon = lon + math.degrees(lon_offset)
-            
-            points.append([new_lon, new_lat])
-            
-        # 闭合多边形
-        points.append([lon, lat])
-        
-        return points
-    except Exception as e:
-        # 如果出现任何错误，返回None
-        return None
\ No newline at end of file
+        return create_sector_polygon_batch(float(lon), float(lat), float(azimuth), float(radius_m),
+                                           float(angle_deg))[0].tolist()
+    except (TypeError, ValueError):
+        return None
@@ -1,35 +1,28 @@
 # ===== File: app.py (最终稳定版 v5.5) =====
 import streamlit as st
 import pandas as pd
-from io import BytesIO
 import time
 import streamlit.components.v1 as components
 import gc
-from main_analyzer import analyze_5g_offload
-from map_generator import create_folium_map
+import os
+from main_analyzer import (analyze_5g_offload, incremental_analyze_5g_offload, sweep_5g_offload, make_param_grid,
+                           category_counts, CATEGORY_LABELS)
+from map_generator import render_map_html, build_sector_tiles
+from index_cache import IndexCache
+from progress import ProgressReporter, BackgroundTask, AnalysisCancelled
+from coverage_analysis import add_coverage_ratio
+from datasets import Dataset, StageCache
+from ingestion import parse_table, select_columns, UPLOAD_TYPES
+from workspace import WorkspaceStore
+from exporter import ResultExporter, EXPORT_FORMATS, export_file_name
+from preview import PagedTable
 REQUIRED_COLUMNS = ['小区名称', '经度', '纬度', '方位角']
 def load_and_validate_data(uploaded_file, file_type):
     if uploaded_file is None: 
         raise ValueError(f"请先上传{file_type}文件。")
     try:
-        # 读取所有列名，用于验证
-        all_cols = pd.read_excel(uploaded_file, nrows=0).columns
-        
-        # 清理列名空格并创建映射
-        cleaned_cols_map = {col.strip(): col for col in all_cols}
-        
-        # 验证必需列
-        missing_cols = [req_col for req_col in REQUIRED_COLUMNS if req_col not in cleaned_cols_map]
-        if missing_cols: 
-            raise ValueError(f"{file_type}文件缺少以下必需的列: {', '.join(missing_cols)}")
-        
-        # 加载所有数据，但只保留必需列
-        cols_to_load = [cleaned_cols_map[req_col] for req_col in REQUIRED_COLUMNS]
-        df = pd.read_excel(uploaded_file, usecols=cols_to_load)
-        
-        # 重命名列为标准名称
-        rename_map = {cleaned_cols_map[req_col]: req_col for req_col in REQUIRED_COLUMNS}
-        df.rename(columns=rename_map, inplace=True)
+        # 文件只解析一次(与数据预览共用，列名已去掉空格)，这里只取出必需列并验证
+        df = select_columns(parse_table(uploaded_file), REQUIRED_COLUMNS, file_type)
         
         # 验证数据完整性
         if df.empty:
@@ -81,52 +74,106 @@ def load_and_validate_data(uploaded_file, file_type):
     except pd.errors.EmptyDataError:
         raise ValueError(f"{file_type}文件为空或没有数据行！")
     except pd.errors.ParserError:
-        raise ValueError(f"{file_type}文件格式错误！请确保上传的是有效的Excel文件（.xlsx或.xls格式）。")
+        raise ValueError(f"{file_type}文件格式错误！请确保上传的是有效的Excel、CSV、Parquet或Feather文件。")
     except Exception as e:
-        raise ValueError(f"读取{file_type}文件时出错: {type(e).__name__}: {str(e)}. 请确保文件是有效的Excel格式。")
-def display_paginated_dataframe(df, title):
+        raise ValueError(f"读取{file_type}文件时出错: {type(e).__name__}: {str(e)}. 请确保文件是有效的Excel、CSV、Parquet或Feather文件。")
+@st.cache_resource
+def get_index_cache():
+    """5G空间索引磁盘缓存，进程内共享一个实例"""
+    return IndexCache()
+@st.cache_resource
+def get_workspace_store():
+    """分析工作区的磁盘存储，进程内共享一个实例"""
+    return WorkspaceStore()
+@st.cache_resource
+def get_result_exporter():
+    """分析结果导出文件的磁盘缓存，进程内共享一个实例"""
+    return ResultExporter()
+@st.cache_resource
+def get_stats_cache():
+    """分析结果统计按结果数据集指纹缓存，重跑页面时不再重新统计"""
+    return StageCache('结果统计', 4)
+# 页面脚本轮询后台分析进度的间隔(秒)
+ANALYSIS_POLL_INTERVAL = 0.2
+def run_analysis(task, df_4g, df_5g, previous, params, workers, top_k, with_coverage, index_cache):
+    """在后台线程中运行分析(不能调用streamlit命令)，返回(df_4g, df_5g, 分析结果)；previous 为上次的(结果, 5G表)"""
+    if previous is not None:
+        # 已有上次分析结果时做增量分析，只重新计算受变化影响的4G小区
+        results_df = incremental_analyze_5g_offload(*previous, df_4g, df_5g, **params,
+                                                    progress_callback=task.reporter(), index_cache=index_cache,
+                                                    workers=workers)
+    else:
+        results_df = analyze_5g_offload(df_4g, df_5g, **params, progress_callback=task.reporter(),
+                                        index_cache=index_cache, workers=workers, top_k=top_k)
+    if with_coverage:
+        results_df = add_coverage_ratio(results_df, df_5g, task.reporter("覆盖比例"))
+    return df_4g, df_5g, results_df
+def cancel_analysis():
+    """停止按钮的回调：在点击后的重跑开始时执行，设置后台分析的取消标记"""
+    task = st.session_state.get('analysis_task')
+    if task is not None:
+        task.cancel()
+def display_paginated_dataframe(uploaded_file, title):
+    """分页预览上传的文件：第一页只读文件开头几行，翻页/排序/筛选时从解析缓存按页取数据"""
     st.subheader(title)
-    if df is None or df.empty: st.warning("请先上传文件。"); return
-    page_size = 10; total_pages = -(-len(df) // page_size) if len(df) > 0 else 1; page_num_key = f"page_{title}"
+    if uploaded_file is None: st.warning("请先上传文件。"); return
+    table = PagedTable(uploaded_file); columns = table.columns; page_num_key = f"page_{title}"
+    sort_col, order_col, filter_col, query_col = st.columns([2, 1, 2, 3])
+    with sort_col: sort_by = st.selectbox("排序列", columns, index=None, placeholder="不排序", key=f"sort_{title}")
+    with order_col: ascending = st.selectbox("顺序", [True, False], format_func={True: "升序", False: "降序"}.get, key=f"ascending_{title}")
+    with filter_col: filter_column = st.selectbox("筛选列", columns, index=columns.index('小区名称') if '小区名称' in columns else 0, key=f"filter_{title}")
+    with query_col: query = st.text_input("包含", key=f"query_{title}").strip()
     if page_num_key not in st.session_state: st.session_state[page_num_key] = 1
-    page_num = st.session_state.get(page_num_key, 1); start_idx = (page_num - 1) * page_size; end_idx = start_idx + page_size
-    st.dataframe(df.iloc[start_idx:end_idx])
+    page_num = st.session_state[page_num_key]; page_df, total = table.page(page_num, sort_by, ascending, filter_column, query)
+    total_pages = table.page_count(total)
+    if total_pages is not None and page_num > total_pages:
+        # 筛选后页数变少，回到最后一页
+        st.session_state[page_num_key] = page_num = total_pages; page_df, total = table.page(page_num, sort_by, ascending, filter_column, query)
+    st.dataframe(page_df)
     col1, col2 = st.columns([3, 1]); 
     with col1: st.write("");
     with col2:
         pagination_container = st.container(); sub_col1, sub_col2 = pagination_container.columns([2,1])
-        with sub_col1: st.markdown(f"<div style='text-align: right; padding-top: 10px;'>总计: {len(df)} 条，共 {total_pages} 页</div>", unsafe_allow_html=True)
+        summary = f"总计: {total} 条，共 {total_pages} 页" if total is not None else "总行数在翻页后显示"
+        with sub_col1: st.markdown(f"<div style='text-align: right; padding-top: 10px;'>{summary}</div>", unsafe_allow_html=True)
         with sub_col2: st.number_input("页码", 1, total_pages, step=1, key=page_num_key, label_visibility="collapsed")
 st.set_page_config(page_title="5G分流分析系统 (Leaflet地图版)", page_icon="📡", layout="wide"); st.title("🛰️ 5G分流分析系统 (Leaflet地图版)")
-st.sidebar.header("操作面板"); uploaded_4g_file = st.sidebar.file_uploader("1. 上传4G小区工参表 (Excel)", type=['xlsx', 'xls']); uploaded_5g_file = st.sidebar.file_uploader("2. 上传5G小区工参表 (Excel)", type=['xlsx', 'xls'])
+st.sidebar.header("操作面板"); uploaded_4g_file = st.sidebar.file_uploader("1. 上传4G小区工参表 (Excel/CSV/Parquet/Feather)", type=UPLOAD_TYPES); uploaded_5g_file = st.sidebar.file_uploader("2. 上传5G小区工参表 (Excel/CSV/Parquet/Feather)", type=UPLOAD_TYPES)
 st.sidebar.markdown("---"); st.sidebar.subheader("算法参数"); d_colo = st.sidebar.number_input("共站址距离阈值 (米)", 1, 500, 50); theta_colo = st.sidebar.number_input("共站址方位角偏差阈值 (度)", 1, 180, 30); d_non_colo = st.sidebar.number_input("非共站址搜索半径 (米)", 50, 2000, 300); n_non_colo = st.sidebar.number_input("非共站址5G小区数量阈值 (个)", 1, 10, 1)
+workers = st.sidebar.number_input("并行进程数", 1, os.cpu_count() or 1, 1, help="大于1时按地理分块多进程并行分析")
+with_coverage = st.sidebar.checkbox("计算5G扇区覆盖比例", help="估算每个4G扇区有多大比例落在5G扇区覆盖范围内")
+top_k = st.sidebar.number_input("候选5G小区数 (top-K)", 0, 10, 0, help="大于0时在共站址候选中选方位角最匹配的5G小区，并列出排名前K的候选")
+lod_zoom = st.sidebar.number_input("扇区显示的最小缩放级别", 0, 18, 0,
+                                   help="地图缩放到该级别以上才显示扇区(只绘制视野内的扇区)，以下显示网格汇总；0为按小区数量自动选择")
+render_mode = st.sidebar.selectbox("扇区绘制方式", ['geojson', 'canvas', 'tiles'],
+                                   format_func={'geojson': '服务端生成扇区', 'canvas': '浏览器端生成扇区(页面更小)',
+                                                'tiles': '预渲染瓦片(超大区域)'}.get)
 st.sidebar.markdown("---")
+with st.sidebar.expander("📈 参数扫描"):
+    sweep_param = st.selectbox("扫描参数", ['共站址距离阈值', '共站址方位角偏差阈值', '非共站址搜索半径', '非共站址5G小区数量阈值'])
+    sweep_values_text = st.text_input("取值列表 (逗号分隔)", "50,100,200,300,500,800")
+    sweep_clicked = st.button("运行参数扫描")
+with st.sidebar.expander("💾 工作区"):
+    workspace_name = st.text_input("工作区名称", "默认工作区")
+    save_workspace_clicked = st.button("保存当前分析")
+    saved_workspaces = get_workspace_store().list()
+    selected_workspace = st.selectbox(
+        "已保存的工作区", [m['name'] for m in saved_workspaces], index=None, placeholder="选择要打开的工作区",
+        format_func=lambda name: next(f"{name} ({time.strftime('%Y-%m-%d %H:%M', time.localtime(m['updated']))}, "
+                                      f"{m['tables'].get('4g', {}).get('rows', 0)}个4G小区)"
+                                      for m in saved_workspaces if m['name'] == name))
+    open_workspace_clicked = st.button("打开工作区", disabled=selected_workspace is None)
 
 # 初始化会话状态
-if 'df_4g_preview' not in st.session_state: st.session_state.df_4g_preview = None; 
-if 'df_5g_preview' not in st.session_state: st.session_state.df_5g_preview = None
 if 'search_name' not in st.session_state: st.session_state.search_name = ""
 
-# 加载全部数据用于预览
-if uploaded_4g_file and st.session_state.df_4g_preview is None:
-    try:
-        st.session_state.df_4g_preview = pd.read_excel(uploaded_4g_file)
-    except Exception as e:
-        st.error(f"读取4G文件预览时出错：{e}")
-        st.session_state.df_4g_preview = None
-
-if uploaded_5g_file and st.session_state.df_5g_preview is None:
-    try:
-        st.session_state.df_5g_preview = pd.read_excel(uploaded_5g_file)
-    except Exception as e:
-        st.error(f"读取5G文件预览时出错：{e}")
-        st.session_state.df_5g_preview = None
-
-# 显示数据预览
-if st.session_state.df_4g_preview is not None:
-    display_paginated_dataframe(st.session_state.df_4g_preview, "4G数据预览")
-if st.session_state.df_5g_preview is not None:
-    display_paginated_dataframe(st.session_state.df_5g_preview, "5G数据预览")
+# 数据预览：按页读取，不在会话状态中保存整张表；完整解析结果按文件内容缓存，校验和分析直接复用
+for uploaded_file, file_type in ((uploaded_4g_file, "4G"), (uploaded_5g_file, "5G")):
+    if uploaded_file:
+        try:
+            display_paginated_dataframe(uploaded_file, f"{file_type}数据预览")
+        except Exception as e:
+            st.error(f"读取{file_type}文件预览时出错：{e}")
 
 # 初始化会话状态
 if 'analysis_done' not in st.session_state:
@@ -139,12 +186,43 @@ if 'df_5g' not in st.session_state:
     st.session_state.df_5g = None
 if 'results_df' not in st.session_state:
     st.session_state.results_df = None
+if 'analysis_task' not in st.session_state:
+    st.session_state.analysis_task = None
+
+# 保存/打开工作区：打开后直接显示保存的分析结果，之后上传新工参表时在其基础上增量分析
+if save_workspace_clicked:
+    if st.session_state.results_df is None:
+        st.sidebar.error("还没有分析结果，无法保存工作区。")
+    else:
+        try:
+            get_workspace_store().save(
+                workspace_name,
+                {'4g': st.session_state.df_4g, '5g': st.session_state.df_5g, 'results': st.session_state.results_df},
+                params=st.session_state.results_df.view().attrs.get('params'),
+                sources={'4g': getattr(uploaded_4g_file, 'name', None), '5g': getattr(uploaded_5g_file, 'name', None)})
+            st.sidebar.success(f"工作区 '{workspace_name}' 已保存。")
+        except ValueError as e:
+            st.sidebar.error(f"保存工作区失败：{e}")
+if open_workspace_clicked:
+    try:
+        manifest, workspace_tables = get_workspace_store().open(selected_workspace)
+        st.session_state.df_4g = workspace_tables['4g']
+        st.session_state.df_5g = workspace_tables['5g']
+        st.session_state.results_df = workspace_tables['results']
+        st.session_state.analysis_done = True
+        st.sidebar.success(f"已打开工作区 '{selected_workspace}'，分析参数: {manifest.get('params')}")
+    except (ValueError, KeyError) as e:
+        st.sidebar.error(f"打开工作区失败：{e}")
 
 # 分析和地图显示逻辑
-if st.sidebar.button("🚀 开始分析", type="primary") or st.session_state.analysis_done:
+start_clicked = st.sidebar.button("🚀 开始分析", type="primary")
+# 分析在后台线程中运行，页面脚本只轮询进度：点击停止时Streamlit中断当前脚本并重跑，重跑开始时回调设置
+# 取消标记，后台分析在下一批次之间检查到后停止；重跑的脚本继续轮询同一个任务直到它结束
+st.sidebar.button("⏹ 停止分析", on_click=cancel_analysis)
+if start_clicked or st.session_state.analysis_done or st.session_state.analysis_task is not None:
     try:
-        # 如果还没有完成分析，则执行分析
-        if not st.session_state.analysis_done:
+        # 点击开始分析时，加载数据并启动后台分析
+        if start_clicked:
             # 检查是否上传了必要的文件
             if not uploaded_4g_file or not uploaded_5g_file:
                 st.error("请先上传4G和5G小区工参表文件！")
@@ -159,24 +237,47 @@ if st.sidebar.button("🚀 开始分析", type="primary") or st.session_state.an
                 st.error("4G数据文件中没有有效的数据行！")
                 st.stop()
             
+            # 还在运行的上一次分析先取消
+            if st.session_state.analysis_task is not None:
+                st.session_state.analysis_task.cancel()
+            previous = None
+            if st.session_state.results_df is not None and not top_k:
+                previous = (st.session_state.results_df.view(), st.session_state.df_5g.view())
+            params = dict(d_colo=d_colo, theta_colo=theta_colo, d_non_colo=d_non_colo, n_non_colo=n_non_colo)
+            index_cache = get_index_cache()
+            st.session_state.analysis_task = BackgroundTask(
+                lambda task: run_analysis(task, df_4g, df_5g, previous, params, workers, top_k, with_coverage,
+                                          index_cache)).start()
+
+        task = st.session_state.analysis_task
+        if task is not None:
             progress_bar = st.progress(0, text="分析准备中...")
-            
-            def update_progress(current, total): 
-                progress_bar.progress(current/total if total>0 else 0, text=f"正在分析: {current}/{total} 条记录...")
-            
-            results_df = analyze_5g_offload(df_4g, df_5g, d_colo, theta_colo, d_non_colo, n_non_colo, update_progress)
+            # 轮询后台分析，显示限频后的进度(附吞吐量和预计剩余时间)；每次轮询都更新进度条，
+            # Streamlit 在界面调用处检查重跑请求，点击停止后当前脚本才能及时中断
+            while not task.wait(ANALYSIS_POLL_INTERVAL):
+                stage, info = task.progress or ('', None)
+                if info is None:
+                    progress_bar.progress(0, text="分析准备中...")
+                else:
+                    progress_bar.progress(info.fraction, text=f"{stage}: {info}" if stage else str(info))
+            st.session_state.analysis_task = None
+            df_4g, df_5g, results_df = task.result()
+            if 'incremental' in results_df.attrs:
+                st.info(f"增量分析：重新计算了 {results_df.attrs['incremental']['recomputed']} 个4G小区"
+                        f"（{results_df.attrs['incremental']['reason']}）。")
             progress_bar.progress(1.0, text="分析完成！正在准备结果展示...")
             
-            # 保存数据到会话状态
-            st.session_state.df_4g = df_4g
-            st.session_state.df_5g = df_5g
-            st.session_state.results_df = results_df
+            # 保存数据到会话状态：加载/分析完成时只计算一次指纹，之后各阶段缓存都以句柄为键
+            st.session_state.df_4g = Dataset(df_4g, '4G工参')
+            st.session_state.df_5g = Dataset(df_5g, '5G工参')
+            st.session_state.results_df = Dataset(results_df, '分析结果')
             st.session_state.analysis_done = True
         
-        # 从会话状态中获取数据
-        df_4g = st.session_state.df_4g
-        df_5g = st.session_state.df_5g
-        results_df = st.session_state.results_df
+        # 从会话状态中获取数据句柄，展示和导出使用零拷贝的只读视图
+        ds_4g = st.session_state.df_4g
+        ds_5g = st.session_state.df_5g
+        ds_results = st.session_state.results_df
+        results_df = ds_results.view()
         
         # 显示分析结果，无论地图是否可用
         st.markdown("---"); st.subheader("📊 详细分析结果")
@@ -185,10 +286,11 @@ if st.sidebar.button("🚀 开始分析", type="primary") or st.session_state.an
         # 添加结果统计
         st.markdown("### 分析结果统计")
         total_4g = len(results_df)
-        colo_offload = len(results_df[results_df['分析结果'].str.contains('共站址5G分流小区')])
-        colo_tune = len(results_df[results_df['分析结果'].str.contains('共站址5G射频调优小区')])
-        non_colo_offload = len(results_df[results_df['分析结果'].str.contains('非共站址5G分流小区')])
-        need_construction = len(results_df[results_df['分析结果'].str.contains('5G规划建设')])
+        counts_by_category = get_stats_cache().get([ds_results], lambda: category_counts(results_df))
+        colo_offload = int(counts_by_category['共站址5G分流小区'])
+        colo_tune = int(counts_by_category['共站址5G射频调优小区'])
+        non_colo_offload = int(counts_by_category['非共站址5G分流小区'])
+        need_construction = int(counts_by_category['5G规划建设'])
         
         col1, col2, col3, col4, col5 = st.columns(5)
         with col1: st.metric("总4G小区数", total_4g)
@@ -235,21 +337,32 @@ if st.sidebar.button("🚀 开始分析", type="primary") or st.session_state.an
             map_progress.progress(50)
             map_progress.text("正在处理数据...")
             
-            # 调用地图生成函数，传递搜索名称
-            map_obj = create_folium_map(df_4g, df_5g, results_df, None, st.session_state.search_name)
+            tile_pyramid = None
+            if render_mode == 'tiles':
+                # 基于上一版瓦片增量生成，只重画结果有变化的小区所在的瓦片
+                map_progress.text("正在生成扇区瓦片...")
+                tile_pyramid = build_sector_tiles(ds_4g, ds_5g, ds_results,
+                                                  previous=st.session_state.get('tile_fingerprint'), workers=workers)
+                st.session_state.tile_fingerprint = tile_pyramid.fingerprint
+
+            # 生成地图页面：底图按分析结果缓存，搜索时只在底图上叠加搜索结果
+            map_html, search_matches = render_map_html(ds_4g, ds_5g, ds_results, st.session_state.search_name,
+                                                       lod_zoom=lod_zoom or None, render_mode=render_mode,
+                                                       tile_pyramid=tile_pyramid)
+            if st.session_state.search_name:
+                total_matches = search_matches.attrs['total']
+                if total_matches:
+                    st.info(f"找到 {total_matches} 个匹配小区" +
+                            (f"，地图上标记排名前 {len(search_matches)} 个" if total_matches > len(search_matches) else ""))
+                    st.dataframe(search_matches.head(10), use_container_width=True, hide_index=True)
+                else:
+                    st.warning(f"没有找到名称包含 '{st.session_state.search_name}' 的小区。")
             
             map_progress.progress(100)
             map_progress.text("地图生成完成！")
             
-            # 显示地图生成结果
-            if isinstance(map_obj, str) and "地图生成过程中出错" in map_obj:
-                st.error(map_obj)
-            elif isinstance(map_obj, str) and "没有有效" in map_obj:
-                st.warning(map_obj)
-            else:
-                # 使用folium_static显示地图对象，还原为之前的尺寸
-                from streamlit_folium import folium_static
-                folium_static(map_obj, width=1600, height=1200)
+            # 显示地图，保持之前的尺寸
+            components.html(map_html, width=1600, height=1210)
         except Exception as e:
             st.error(f"地图生成过程中出错：{e}")
             # 显示详细的错误信息
@@ -259,33 +372,61 @@ if st.sidebar.button("🚀 开始分析", type="primary") or st.session_state.an
             # 清理进度条
             map_progress.empty()
         
-        output = BytesIO();
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            results_df.to_excel(writer, index=False, sheet_name='5G分流分析结果')
-            # 添加统计信息到Excel
-            workbook = writer.book
-            stats_sheet = workbook.create_sheet('分析统计')
-            stats_data = [
-                ['统计项', '数量'],
-                ['总4G小区数', total_4g],
-                ['共站址5G分流小区', colo_offload],
-                ['共站址射频调优小区', colo_tune],
-                ['非共站址5G分流小区', non_colo_offload],
-                ['需要5G规划建设小区', need_construction]
-            ]
-            for row in stats_data:
-                stats_sheet.append(row)
-        
-        st.download_button("📥 下载分析结果", output.getvalue(), "5G分流分析结果.xlsx", "application/vnd.ms-excel")
-            
+        # 结果文件在点击下载时才生成(按结果指纹缓存)，页面重跑不再序列化整张结果表
+        export_format = st.radio("导出格式", list(EXPORT_FORMATS), horizontal=True,
+                                 format_func=lambda fmt: EXPORT_FORMATS[fmt][0],
+                                 help="CSV、Parquet比Excel快得多；Excel附带分析统计工作表")
+        st.download_button("📥 下载分析结果", lambda: get_result_exporter().read(ds_results, export_format),
+                           export_file_name(export_format), EXPORT_FORMATS[export_format][1])
 
-        
+    except AnalysisCancelled:
+        st.warning("分析已取消。")
     except ValueError as e:
         st.error(f"**数据加载或格式错误！**\n\n**错误详情**: {e}")
         st.info("请检查文件格式是否正确，确保包含所有必需的列：['小区名称', '经度', '纬度', '方位角']")
     except MemoryError:
         st.error("**内存不足错误！**\n\n文件过大，无法一次性处理。请尝试使用较小的文件或联系管理员增加服务器资源。")
+        st.info("超大4G工参表可使用分块流式分析，内存占用与表大小无关：\n\n"
+                "`python streaming.py 4G工参.csv 5G工参.xlsx 分析结果.parquet`")
     except Exception as e:
         st.error(f"**分析过程中出现意外错误！**\n\n**错误详情**: {type(e).__name__}: {e}")
         st.info("常见原因：\n1. 数据格式问题（如'经度'或'纬度'列包含非数字内容）\n2. 文件损坏或格式不正确\n3. 百度地图AK配置问题")
         
+
+
+# 参数扫描：一次近邻搜索，评估多组阈值
+if 'sweep_result' not in st.session_state:
+    st.session_state.sweep_result = None
+if sweep_clicked:
+    try:
+        if not uploaded_4g_file or not uploaded_5g_file:
+            st.error("请先上传4G和5G小区工参表文件！")
+            st.stop()
+        sweep_values = [float(v) for v in sweep_values_text.replace('，', ',').split(',') if v.strip()]
+        if not sweep_values:
+            raise ValueError("请至少输入一个扫描取值。")
+        base_params = {'d_colo': d_colo, 'theta_colo': theta_colo, 'd_non_colo': d_non_colo, 'n_non_colo': n_non_colo}
+        sweep_key = {'共站址距离阈值': 'd_colo', '共站址方位角偏差阈值': 'theta_colo',
+                     '非共站址搜索半径': 'd_non_colo', '非共站址5G小区数量阈值': 'n_non_colo'}[sweep_param]
+        base_params[sweep_key] = sweep_values
+        with st.spinner("正在进行参数扫描..."):
+            df_4g_sweep = load_and_validate_data(uploaded_4g_file, "4G")
+            df_5g_sweep = load_and_validate_data(uploaded_5g_file, "5G")
+            sweep_progress = st.progress(0, text="参数扫描准备中...")
+            st.session_state.sweep_result = sweep_5g_offload(
+                df_4g_sweep, df_5g_sweep, make_param_grid(**base_params),
+                ProgressReporter(lambda info: sweep_progress.progress(info.fraction, text=f"参数扫描: {info}")),
+                index_cache=get_index_cache())
+            sweep_progress.empty()
+            st.session_state.sweep_key = sweep_key
+    except ValueError as e:
+        st.error(f"**参数扫描失败！**\n\n**错误详情**: {e}")
+
+if st.session_state.sweep_result is not None:
+    sweep_result = st.session_state.sweep_result
+    st.markdown("---"); st.subheader("📈 参数扫描结果")
+    st.dataframe(sweep_result.summary, use_container_width=True)
+    st.line_chart(sweep_result.summary.set_index(st.session_state.sweep_key)[list(CATEGORY_LABELS.values())])
+    selected_set = st.selectbox("查看某组参数的完整结果", range(len(sweep_result.param_sets)),
+                                format_func=lambda i: ", ".join(f"{k}={v}" for k, v in sweep_result.param_sets[i].items()))
+    st.dataframe(sweep_result.results(selected_set), use_container_width=True)
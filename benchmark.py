@@ -0,0 +1,408 @@
+# ===== File: benchmark.py (性能基准测试) =====
+# 用法: python benchmark.py <engine|index|stream|parallel|incremental|topk|progress|sectors|coverage|map|tiles> ...
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import folium
+import numpy as np
+import pandas as pd
+
+from main_analyzer import analyze_5g_offload, incremental_analyze_5g_offload, format_analysis_text, RESULT_COLUMNS
+from map_generator import create_folium_map, sector_tile_cells
+from tiles import build_tile_pyramid
+from streaming import stream_analysis
+from progress import ProgressReporter, CancelToken
+from coverage_analysis import calculate_coverage_ratio
+from haversine import haversine, Unit
+from algorithms import (create_sector_polygon, create_sector_polygon_batch, SECTOR_RADIUS_4G_M,
+                        SECTOR_RADIUS_5G_M, SECTOR_ANGLE_DEG)
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    pass
+
+# 默认算法参数，与app.py侧边栏默认值一致
+DEFAULT_PARAMS = dict(d_colo=50, theta_colo=30, d_non_colo=300, n_non_colo=1)
+
+
+def make_synthetic_network(n_4g, ratio_5g=0.4, seed=0):
+    """生成模拟的4G/5G工参表：每个站点3个扇区，5G站点部分与4G共站址、部分为新建站点"""
+    rng = np.random.default_rng(seed)
+    # 站点密度按南宁城区估算，网络规模越大覆盖范围越大
+    n_sites_4g = max(1, -(-n_4g // 3))
+    span = 0.2 * np.sqrt(n_sites_4g / 3000)
+    site_lat = 22.8170 + rng.uniform(-span, span, n_sites_4g)
+    site_lon = 108.3661 + rng.uniform(-span, span, n_sites_4g)
+
+    def build_cells(lats, lons, n_cells, prefix):
+        site_idx = np.arange(n_cells) // 3
+        azimuth = (np.arange(n_cells) % 3) * 120 + rng.uniform(0, 60, n_cells)
+        return pd.DataFrame({
+            '小区名称': [f"{prefix}_{i // 3}_{i % 3 + 1}" for i in range(n_cells)],
+            '经度': lons[site_idx],
+            '纬度': lats[site_idx],
+            '方位角': np.round(azimuth % 360, 1),
+        })
+
+    df_4g = build_cells(site_lat, site_lon, n_4g, "LTE")
+
+    n_sites_5g = max(1, int(n_sites_4g * ratio_5g))
+    colo_sites = rng.choice(n_sites_4g, n_sites_5g // 2, replace=False)
+    new_lat = 22.8170 + rng.uniform(-span, span, n_sites_5g - len(colo_sites))
+    new_lon = 108.3661 + rng.uniform(-span, span, n_sites_5g - len(colo_sites))
+    # 共站址5G站点在4G站点附近做小幅偏移
+    lat_5g = np.concatenate([site_lat[colo_sites] + rng.normal(0, 0.0001, len(colo_sites)), new_lat])
+    lon_5g = np.concatenate([site_lon[colo_sites] + rng.normal(0, 0.0001, len(colo_sites)), new_lon])
+    df_5g = build_cells(lat_5g, lon_5g, n_sites_5g * 3, "NR")
+    return df_4g, df_5g
+
+
+def _legacy_distance(lat1, lon1, lat2, lon2):
+    """v4.0 标量距离计算（haversine库），保证逐行引擎的耗时与旧版一致"""
+    try:
+        return haversine((lat1, lon1), (lat2, lon2), unit=Unit.METERS)
+    except (ValueError, TypeError):
+        return float('inf')
+
+
+def _legacy_azimuth_difference(azimuth1, azimuth2):
+    diff = abs(azimuth1 - azimuth2)
+    return min(diff, 360 - diff)
+
+
+def legacy_analyze_5g_offload(df_4g, df_5g, d_colo, theta_colo, d_non_colo, n_non_colo, progress_callback=None):
+    """v4.0 逐行 iterrows 引擎（cKDTree 路径），仅用于对比结果和耗时"""
+    results = []
+    for col in ['经度', '纬度', '方位角']:
+        df_4g[col] = pd.to_numeric(df_4g[col], errors='coerce')
+        df_5g[col] = pd.to_numeric(df_5g[col], errors='coerce')
+    df_4g.dropna(subset=['经度', '纬度', '方位角'], inplace=True)
+    df_5g.dropna(subset=['经度', '纬度', '方位角'], inplace=True)
+
+    tree_5g = cKDTree(df_5g[['纬度', '经度']].values)
+    radius_in_degrees = d_non_colo * (1 / 111320)
+    for _, row_4g in df_4g.iterrows():
+        lat_4g, lon_4g, azimuth_4g = row_4g['纬度'], row_4g['经度'], row_4g['方位角']
+        nearby_indices = tree_5g.query_ball_point([lat_4g, lon_4g], r=radius_in_degrees)
+        analysis_result = "5G规划建设"
+        suggested_cell_name = "N/A"
+        if nearby_indices:
+            distances = []
+            for _, row_5g in df_5g.iloc[nearby_indices].iterrows():
+                distances.append((_legacy_distance(lat_4g, lon_4g, row_5g['纬度'], row_5g['经度']), row_5g))
+            min_dist, nearest_5g_cell = min(distances, key=lambda x: x[0])
+            angle_diff = _legacy_azimuth_difference(azimuth_4g, nearest_5g_cell['方位角'])
+            if min_dist <= d_colo:
+                suggested_cell_name = nearest_5g_cell['小区名称']
+                if angle_diff <= theta_colo:
+                    analysis_result = f"共站址5G分流小区 (关联小区: {suggested_cell_name}, 距离: {min_dist:.2f}m, 夹角: {angle_diff:.2f}°)"
+                else:
+                    analysis_result = f"共站址5G射频调优小区 (关联小区: {suggested_cell_name}, 距离: {min_dist:.2f}m, 夹角: {angle_diff:.2f}°)"
+            elif min_dist <= d_non_colo and len(nearby_indices) >= n_non_colo:
+                suggested_cell_name = nearest_5g_cell['小区名称']
+                analysis_result = f"非共站址5G分流小区 (范围内有{len(nearby_indices)}个5G小区，最近距离: {min_dist:.2f}m)"
+        current_result = row_4g.to_dict()
+        current_result['分析结果'] = analysis_result
+        current_result['建议分流小区'] = suggested_cell_name
+        results.append(current_result)
+    return pd.DataFrame(results)
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_engine(sizes, legacy_max_rows):
+    """向量化引擎与逐行引擎的耗时对比；逐行引擎超过legacy_max_rows时按前legacy_max_rows行的速度线性估算"""
+    print(f"{'4G小区数':>10} {'逐行引擎(s)':>14} {'向量化引擎(s)':>14} {'加速比':>8}  分类不同行数")
+    for n in sizes:
+        df_4g, df_5g = make_synthetic_network(n)
+        results_new, t_new = _timed(analyze_5g_offload, df_4g.copy(), df_5g.copy(), **DEFAULT_PARAMS)
+
+        legacy_rows = min(n, legacy_max_rows)
+        results_old, t_old = _timed(legacy_analyze_5g_offload, df_4g.iloc[:legacy_rows].copy(),
+                                    df_5g.copy(), **DEFAULT_PARAMS)
+        estimated = legacy_rows < n
+        t_old = t_old * n / legacy_rows
+        # 逐行引擎按度数搜索，经度方向半径偏小，少数边界小区的分类会与米制索引不同
+        text_new = format_analysis_text(results_new.iloc[:legacy_rows])
+        changed = int((results_old['分析结果'].str[:6] != text_new.str[:6]).sum())
+        label = f"{t_old:.2f}{'*' if estimated else ''}"
+        print(f"{n:>10} {label:>14} {t_new:>14.3f} {t_old / t_new:>7.0f}x  {changed}")
+    print("* 逐行引擎耗时为按部分数据线性估算")
+
+
+def bench_index(sizes):
+    """米制空间索引与按度数搜索的候选数量对比"""
+    print(f"{'4G小区数':>10} {'耗时(s)':>10} {'米制候选/查询':>14} {'度数候选/查询':>14} {'节省/查询':>10}")
+    for n in sizes:
+        df_4g, df_5g = make_synthetic_network(n)
+        stats = {}
+        _, elapsed = _timed(analyze_5g_offload, df_4g, df_5g, index_stats=stats, **DEFAULT_PARAMS)
+        queries = stats['queries']
+        print(f"{n:>10} {elapsed:>10.3f} {stats['candidates'] / queries:>14.2f} "
+              f"{stats['degree_candidates'] / queries:>14.2f} {stats['saved_per_query']:>10.2f}")
+
+
+def bench_stream(sizes, chunk_size):
+    """分块流式分析与整表分析的峰值内存对比（tracemalloc统计Python/NumPy分配）"""
+    print(f"{'4G小区数':>10} {'整表峰值(MB)':>14} {'流式峰值(MB)':>14} {'流式耗时(s)':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n in sizes:
+            df_4g, df_5g = make_synthetic_network(n)
+            path_4g = os.path.join(tmp_dir, '4g.csv')
+            df_4g.to_csv(path_4g, index=False)
+            del df_4g
+
+            tracemalloc.start()
+            stream_start = time.perf_counter()
+            stream_analysis(path_4g, df_5g.copy(), os.path.join(tmp_dir, 'result.parquet'),
+                            chunk_size=chunk_size, **DEFAULT_PARAMS)
+            t_stream = time.perf_counter() - stream_start
+            peak_stream = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            tracemalloc.start()
+            analyze_5g_offload(pd.read_csv(path_4g), df_5g.copy(), **DEFAULT_PARAMS)
+            peak_full = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{n:>10} {peak_full / 1e6:>14.1f} {peak_stream / 1e6:>14.1f} {t_stream:>12.2f}")
+
+
+def bench_parallel(n, workers_list):
+    """多进程地理分块并行分析的吞吐量随进程数的变化"""
+    df_4g, df_5g = make_synthetic_network(n)
+    print(f"4G小区数: {n}，CPU核数: {os.cpu_count()}")
+    print(f"{'进程数':>6} {'耗时(s)':>10} {'吞吐量(小区/s)':>16} {'相对单进程':>10}")
+    baseline = None
+    for workers in workers_list:
+        _, elapsed = _timed(analyze_5g_offload, df_4g.copy(), df_5g.copy(), workers=workers, **DEFAULT_PARAMS)
+        baseline = baseline or elapsed
+        print(f"{workers:>6} {elapsed:>10.3f} {n / elapsed:>16.0f} {baseline / elapsed:>9.2f}x")
+
+
+def bench_incremental(sizes, workers_list, changed_ratio):
+    """增量分析：部分4G/5G小区变化后，完整重新分析 vs 只重新计算受影响小区(各进程数)的耗时"""
+    print(f"{'4G小区数':>10} {'变化小区数':>10} {'进程数':>6} {'完整分析(s)':>12} {'增量分析(s)':>12} "
+          f"{'重新计算小区数':>14} {'加速比':>8}")
+    for n in sizes:
+        df_4g, df_5g = make_synthetic_network(n)
+        previous = analyze_5g_offload(df_4g.copy(), df_5g.copy(), **DEFAULT_PARAMS)
+
+        # 随机移动部分4G、5G小区的位置，模拟一次工参更新
+        rng = np.random.default_rng(0)
+        df_4g_new, df_5g_new = df_4g.copy(), df_5g.copy()
+        changed_4g = rng.choice(len(df_4g), max(1, int(len(df_4g) * changed_ratio)), replace=False)
+        changed_5g = rng.choice(len(df_5g), max(1, int(len(df_5g) * changed_ratio)), replace=False)
+        df_4g_new.loc[changed_4g, '纬度'] += 0.001
+        df_5g_new.loc[changed_5g, '纬度'] += 0.001
+
+        for workers in workers_list:
+            _, t_full = _timed(analyze_5g_offload, df_4g_new.copy(), df_5g_new.copy(), workers=workers,
+                               **DEFAULT_PARAMS)
+            results, t_incremental = _timed(incremental_analyze_5g_offload, previous, df_5g.copy(),
+                                            df_4g_new.copy(), df_5g_new.copy(), workers=workers,
+                                            **DEFAULT_PARAMS)
+            recomputed = results.attrs['incremental']['recomputed']
+            print(f"{n:>10} {len(changed_4g) + len(changed_5g):>10} {workers:>6} {t_full:>12.3f} "
+                  f"{t_incremental:>12.3f} {recomputed:>14} {t_full / t_incremental:>7.1f}x")
+
+
+def bench_top_k(sizes, top_k):
+    """top-K候选匹配相对只取最近5G小区的额外耗时，以及因选到方位角对齐的候选而改判为分流的小区数"""
+    print(f"{'4G小区数':>10} {'最近匹配(s)':>12} {f'top-{top_k}(s)':>12} {'额外耗时/小区(us)':>18}  调优改判为分流")
+    for n in sizes:
+        df_4g, df_5g = make_synthetic_network(n)
+        results_nearest, t_nearest = _timed(analyze_5g_offload, df_4g.copy(), df_5g.copy(), **DEFAULT_PARAMS)
+        results_top_k, t_top_k = _timed(analyze_5g_offload, df_4g.copy(), df_5g.copy(), top_k=top_k,
+                                        **DEFAULT_PARAMS)
+        retuned = int(((results_nearest['分析类别'] == '共站址5G射频调优小区')
+                       & (results_top_k['分析类别'] == '共站址5G分流小区')).sum())
+        print(f"{n:>10} {t_nearest:>12.3f} {t_top_k:>12.3f} {(t_top_k - t_nearest) / n * 1e6:>18.2f}  {retuned}")
+
+
+def bench_progress(sizes, ui_cost_ms):
+    """
+    限频进度报告的开销：无进度回调 vs ProgressReporter(界面更新用sleep模拟，每次ui_cost_ms毫秒)。
+    旧版逐行回调的界面更新次数等于4G小区数，按同样的单次耗时估算其开销。
+    """
+    def fake_ui(info):
+        time.sleep(ui_cost_ms / 1000)
+
+    print(f"{'4G小区数':>10} {'无进度(s)':>10} {'带进度(s)':>10} {'开销':>7} {'界面更新次数':>12} {'旧版逐行估算(s)':>16}")
+    for n in sizes:
+        df_4g, df_5g = make_synthetic_network(n)
+        _, t_plain = _timed(analyze_5g_offload, df_4g.copy(), df_5g.copy(), **DEFAULT_PARAMS)
+        reporter = ProgressReporter(fake_ui, cancel_token=CancelToken())
+        _, t_progress = _timed(analyze_5g_offload, df_4g.copy(), df_5g.copy(), progress_callback=reporter,
+                               **DEFAULT_PARAMS)
+        overhead = (t_progress - t_plain) / t_plain
+        print(f"{n:>10} {t_plain:>10.3f} {t_progress:>10.3f} {overhead:>7.1%} {reporter.updates:>12} "
+              f"{n * ui_cost_ms / 1000:>16.1f}")
+
+
+def bench_sectors(sizes, scalar_max_rows):
+    """扇区顶点生成：逐个调用create_sector_polygon vs create_sector_polygon_batch一次生成"""
+    print(f"{'小区数':>10} {'逐个生成(s)':>12} {'批量生成(ms)':>14} {'加速比':>8}")
+    for n in sizes:
+        df_4g, _ = make_synthetic_network(n)
+        lon, lat, azimuth = (df_4g[col].to_numpy() for col in ('经度', '纬度', '方位角'))
+        _, t_batch = _timed(create_sector_polygon_batch, lon, lat, azimuth, SECTOR_RADIUS_4G_M, SECTOR_ANGLE_DEG)
+        scalar_rows = min(n, scalar_max_rows)
+        start = time.perf_counter()
+        for i in range(scalar_rows):
+            create_sector_polygon(lon[i], lat[i], azimuth[i], SECTOR_RADIUS_4G_M, SECTOR_ANGLE_DEG)
+        t_scalar = (time.perf_counter() - start) * n / scalar_rows
+        label = f"{t_scalar:.2f}{'*' if scalar_rows < n else ''}"
+        print(f"{n:>10} {label:>12} {t_batch * 1000:>14.1f} {t_scalar / t_batch:>7.0f}x")
+    print("* 逐个生成耗时为按部分数据线性估算")
+
+
+def bench_coverage(sizes):
+    """4G扇区5G覆盖比例：外接圆索引预筛 + 扇区内采样网格的耗时"""
+    print(f"{'4G扇区数':>10} {'5G扇区数':>10} {'耗时(s)':>10} {'候选扇区对/4G扇区':>18} {'平均覆盖比例':>12}")
+    for n in sizes:
+        df_4g, df_5g = make_synthetic_network(n)
+        (ratio, overlaps), elapsed = _timed(
+            calculate_coverage_ratio, *(df[col].to_numpy() for df in (df_4g, df_5g) for col in ('纬度', '经度', '方位角')))
+        print(f"{n:>10} {len(df_5g):>10} {elapsed:>10.3f} {overlaps.mean():>18.2f} {ratio.mean():>12.1%}")
+
+
+def legacy_polygon_map(df_4g, df_5g, results_df):
+    """旧版地图图层：每个扇区一个folium.Polygon(各自的样式和提示信息)，仅用于对比页面体积和耗时"""
+    m = folium.Map(location=[22.8170, 108.3661], zoom_start=12, tiles=None, prefer_canvas=True)
+    df_4g_with_result = pd.merge(df_4g, results_df[['小区名称'] + RESULT_COLUMNS], on='小区名称', how='inner')
+    df_4g_with_result['分析结果'] = format_analysis_text(df_4g_with_result)
+    layers = [(df_5g, SECTOR_RADIUS_5G_M, '5G小区', None), (df_4g, SECTOR_RADIUS_4G_M, '4G小区', None),
+              (df_4g_with_result, SECTOR_RADIUS_4G_M, '分析结果', '分析结果')]
+    for df, radius_m, name, result_col in layers:
+        layer = folium.FeatureGroup(name=name)
+        for row in df.to_dict('records'):
+            points = create_sector_polygon(row['经度'], row['纬度'], row['方位角'], radius_m, SECTOR_ANGLE_DEG)
+            tooltip = f"{name}: {row['小区名称']}" + (f"<br>分析结果: {row[result_col]}" if result_col else "")
+            folium.Polygon(locations=[(lat, lon) for lon, lat in points], color='#336699', fill=True,
+                           fill_color='#336699', fill_opacity=0.3, weight=2, opacity=0.8,
+                           tooltip=tooltip).add_to(layer)
+        layer.add_to(m)
+    return m
+
+
+def bench_map(sizes):
+    """地图生成：每个扇区一个Polygon vs 每个图层一个GeoJSON vs 浏览器端生成扇区，比较生成+渲染HTML的耗时和页面体积"""
+    print(f"{'4G小区数':>10} {'Polygon耗时(s)':>14} {'Polygon页面(MB)':>15} {'GeoJSON耗时(s)':>14} "
+          f"{'GeoJSON页面(MB)':>15} {'canvas耗时(s)':>13} {'canvas页面(MB)':>14}")
+    for n in sizes:
+        df_4g, df_5g = make_synthetic_network(n)
+        results_df = analyze_5g_offload(df_4g.copy(), df_5g.copy(), **DEFAULT_PARAMS)
+        html_old, t_old = _timed(lambda: legacy_polygon_map(df_4g, df_5g, results_df).get_root().render())
+        html_new, t_new = _timed(lambda: create_folium_map(df_4g, df_5g, results_df, None,
+                                                           lod_zoom=0).get_root().render())
+        html_canvas, t_canvas = _timed(lambda: create_folium_map(df_4g, df_5g, results_df, None, lod_zoom=0,
+                                                                 render_mode='canvas').get_root().render())
+        print(f"{n:>10} {t_old:>14.2f} {len(html_old.encode()) / 1e6:>15.1f} {t_new:>14.2f} "
+              f"{len(html_new.encode()) / 1e6:>15.1f} {t_canvas:>13.2f} {len(html_canvas.encode()) / 1e6:>14.1f}")
+
+
+def bench_tiles(sizes, workers, changed_ratio):
+    """瓦片金字塔：全量生成、相同数据复用、部分小区变化后增量生成的耗时"""
+    print(f"{'4G小区数':>10} {'瓦片数':>8} {'全量(s)':>9} {'复用(s)':>9} {'变化小区数':>10} {'增量瓦片数':>10} {'增量(s)':>9}")
+    for n in sizes:
+        df_4g, df_5g = make_synthetic_network(n)
+        results_df = analyze_5g_offload(df_4g.copy(), df_5g.copy(), **DEFAULT_PARAMS)
+        cells, colors = sector_tile_cells(df_4g, df_5g, results_df)
+        with tempfile.TemporaryDirectory() as tile_dir:
+            full, t_full = _timed(lambda: build_tile_pyramid(cells, colors, tile_dir=tile_dir, workers=workers))
+            _, t_reuse = _timed(lambda: build_tile_pyramid(cells, colors, tile_dir=tile_dir, workers=workers))
+
+            # 随机调整部分4G小区的方位角，模拟一次工参更新
+            changed = np.random.default_rng(0).choice(n, max(1, int(n * changed_ratio)), replace=False)
+            df_4g_new = df_4g.copy()
+            df_4g_new.loc[changed, '方位角'] = (df_4g_new.loc[changed, '方位角'] + 90) % 360
+            results_new = analyze_5g_offload(df_4g_new.copy(), df_5g.copy(), **DEFAULT_PARAMS)
+            cells_new, _ = sector_tile_cells(df_4g_new, df_5g, results_new)
+            incremental, t_incremental = _timed(lambda: build_tile_pyramid(
+                cells_new, colors, tile_dir=tile_dir, previous=full.fingerprint, workers=workers))
+        print(f"{n:>10} {full.stats['rendered']:>8} {t_full:>9.2f} {t_reuse:>9.3f} {len(changed):>10} "
+              f"{incremental.stats['rendered']:>10} {t_incremental:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="5G分流分析系统性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    engine_parser = subparsers.add_parser("engine", help="分析引擎: 向量化 vs 逐行 iterrows")
+    engine_parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    engine_parser.add_argument("--legacy-max-rows", type=int, default=20_000)
+
+    index_parser = subparsers.add_parser("index", help="空间索引: 米制索引 vs 度数搜索的候选数量")
+    index_parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+
+    stream_parser = subparsers.add_parser("stream", help="流式分析: 峰值内存 vs 整表分析")
+    stream_parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    stream_parser.add_argument("--chunk-size", type=int, default=100_000)
+
+    parallel_parser = subparsers.add_parser("parallel", help="多进程并行: 吞吐量随进程数的变化")
+    parallel_parser.add_argument("--size", type=int, default=1_000_000)
+    parallel_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+
+    incremental_parser = subparsers.add_parser("incremental", help="增量分析: 完整重新分析 vs 只重新计算受影响小区")
+    incremental_parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    incremental_parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    incremental_parser.add_argument("--changed-ratio", type=float, default=0.01, help="变化的4G、5G小区比例")
+
+    top_k_parser = subparsers.add_parser("topk", help="top-K候选匹配: 相对最近匹配的额外开销")
+    top_k_parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    top_k_parser.add_argument("--k", type=int, default=5)
+
+    progress_parser = subparsers.add_parser("progress", help="进度报告: 限频回调的开销")
+    progress_parser.add_argument("--sizes", type=int, nargs="+", default=[200_000, 1_000_000])
+    progress_parser.add_argument("--ui-cost-ms", type=float, default=1.0, help="模拟每次界面更新的耗时(毫秒)")
+
+    sectors_parser = subparsers.add_parser("sectors", help="扇区生成: 逐个生成 vs 批量生成")
+    sectors_parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    sectors_parser.add_argument("--scalar-max-rows", type=int, default=20_000)
+
+    coverage_parser = subparsers.add_parser("coverage", help="覆盖比例: 4G扇区的5G覆盖比例分析耗时")
+    coverage_parser.add_argument("--sizes", type=int, nargs="+", default=[50_000, 200_000])
+
+    map_parser = subparsers.add_parser("map", help="地图生成: 逐个Polygon vs 按图层GeoJSON vs 浏览器端生成")
+    map_parser.add_argument("--sizes", type=int, nargs="+", default=[3_000, 10_000, 30_000])
+
+    tiles_parser = subparsers.add_parser("tiles", help="瓦片金字塔: 全量 vs 复用 vs 增量生成")
+    tiles_parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    tiles_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    tiles_parser.add_argument("--changed-ratio", type=float, default=0.001, help="增量生成时变化的4G小区比例")
+
+    args = parser.parse_args()
+    if args.command == "engine":
+        bench_engine(args.sizes, args.legacy_max_rows)
+    elif args.command == "index":
+        bench_index(args.sizes)
+    elif args.command == "stream":
+        bench_stream(args.sizes, args.chunk_size)
+    elif args.command == "parallel":
+        bench_parallel(args.size, args.workers)
+    elif args.command == "incremental":
+        bench_incremental(args.sizes, args.workers, args.changed_ratio)
+    elif args.command == "topk":
+        bench_top_k(args.sizes, args.k)
+    elif args.command == "progress":
+        bench_progress(args.sizes, args.ui_cost_ms)
+    elif args.command == "sectors":
+        bench_sectors(args.sizes, args.scalar_max_rows)
+    elif args.command == "coverage":
+        bench_coverage(args.sizes)
+    elif args.command == "map":
+        bench_map(args.sizes)
+    elif args.command == "tiles":
+        bench_tiles(args.sizes, args.workers, args.changed_ratio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# ===== File: coverage_analysis.py (4G扇区的5G覆盖比例分析) =====
+# 计算每个4G扇区的覆盖范围中有多大比例落在5G扇区内。扇区几何与 algorithms.create_sector_polygon 一致
+# (以小区为中心的局部平面近似，半径和张角取 SECTOR_* 常量)。
+# 先用空间索引按扇区外接圆预筛出可能相交的(4G, 5G)扇区对，再在每个4G扇区内取固定的采样点网格，
+# 向量化判断各采样点是否落在任一候选5G扇区内，被覆盖的采样点比例即为覆盖比例。
+import numpy as np
+
+from algorithms import SECTOR_EARTH_RADIUS_M, SECTOR_RADIUS_4G_M, SECTOR_RADIUS_5G_M, SECTOR_ANGLE_DEG
+from spatial_index import build_spatial_index
+
+# 扇区内采样网格：径向圈数 × 每圈角度数，共48个采样点，覆盖比例的分辨率约2%
+DEFAULT_RADIAL_SAMPLES = 6
+DEFAULT_ANGULAR_SAMPLES = 8
+# 每批处理的4G扇区数量，控制(扇区对 × 采样点)数组的内存占用
+COVERAGE_CHUNK_SIZE = 5000
+# 纬度方向每度对应的米数（与扇区绘制使用的地球半径一致）
+_METERS_PER_DEGREE = SECTOR_EARTH_RADIUS_M * np.pi / 180
+
+
+def sector_sample_offsets(azimuth, radius_m, angle_deg, n_radial=DEFAULT_RADIAL_SAMPLES,
+                          n_angular=DEFAULT_ANGULAR_SAMPLES):
+    """
+    扇区内固定采样网格相对扇区中心的偏移(米)，返回(东向偏移, 北向偏移)，形状均为(N, n_radial*n_angular)。
+    径向按面积等分(每个采样点代表相同面积)，角度方向取各等分的中点。
+    """
+    azimuth_rad = np.radians(np.asarray(azimuth, dtype=np.float64)).reshape(-1, 1, 1)
+    radius_m = np.asarray(radius_m, dtype=np.float64).reshape(-1, 1, 1)
+    angle_rad = np.radians(np.asarray(angle_deg, dtype=np.float64)).reshape(-1, 1, 1)
+
+    radial = np.sqrt((np.arange(n_radial) + 0.5) / n_radial).reshape(1, -1, 1)
+    angular = ((np.arange(n_angular) + 0.5) / n_angular - 0.5).reshape(1, 1, -1)
+    bearing = azimuth_rad + angle_rad * angular
+    distance = radius_m * radial
+    n = max(len(azimuth_rad), len(radius_m), len(angle_rad))
+    east = np.broadcast_to(distance * np.sin(bearing), (n, n_radial, n_angular)).reshape(n, -1)
+    north = np.broadcast_to(distance * np.cos(bearing), (n, n_radial, n_angular)).reshape(n, -1)
+    return east, north
+
+
+def _bounding_circle(lat, lon, azimuth, radius_m, angle_deg):
+    """
+    扇区的外接圆(圆心纬度, 圆心经度, 半径米)。张角小于180°时取过扇区顶点和弧两端点的圆
+    (圆心在方位角方向 R/(2cos(张角/2)) 处)，否则取以小区为中心、半径R的圆。
+    """
+    half_angle = np.radians(angle_deg) / 2
+    if half_angle >= np.pi / 2:
+        return lat, lon, float(radius_m)
+    circle_radius = radius_m / (2 * np.cos(half_angle))
+    azimuth_rad = np.radians(azimuth)
+    center_lat = lat + circle_radius * np.cos(azimuth_rad) / _METERS_PER_DEGREE
+    center_lon = lon + circle_radius * np.sin(azimuth_rad) / (_METERS_PER_DEGREE * np.cos(np.radians(lat)))
+    return center_lat, center_lon, circle_radius
+
+
+def calculate_coverage_ratio(lat_4g, lon_4g, azimuth_4g, lat_5g, lon_5g, azimuth_5g,
+                             radius_4g=SECTOR_RADIUS_4G_M, radius_5g=SECTOR_RADIUS_5G_M, angle_deg=SECTOR_ANGLE_DEG,
+                             n_radial=DEFAULT_RADIAL_SAMPLES, n_angular=DEFAULT_ANGULAR_SAMPLES,
+                             progress_callback=None):
+    """
+    计算每个4G扇区被5G扇区覆盖的面积比例(0~1)，返回(覆盖比例数组, 与之重叠的5G扇区数数组)。
+    重叠指5G扇区覆盖了该4G扇区的至少一个采样点，外接圆相交但没有覆盖任何采样点的5G扇区不计入。
+    """
+    lat_4g, lon_4g, azimuth_4g, lat_5g, lon_5g, azimuth_5g = (
+        np.asarray(a, dtype=np.float64) for a in (lat_4g, lon_4g, azimuth_4g, lat_5g, lon_5g, azimuth_5g))
+    total_rows = len(lat_4g)
+    n_samples = n_radial * n_angular
+    ratio = np.zeros(total_rows)
+    overlaps = np.zeros(total_rows, dtype=np.intp)
+    if total_rows == 0 or len(lat_5g) == 0:
+        if progress_callback:
+            progress_callback(total_rows, total_rows)
+        return ratio, overlaps
+
+    # 按扇区外接圆建立5G索引，外接圆相交的扇区对才需要逐点判断
+    circle_lat_4g, circle_lon_4g, circle_radius_4g = _bounding_circle(lat_4g, lon_4g, azimuth_4g, radius_4g, angle_deg)
+    circle_lat_5g, circle_lon_5g, circle_radius_5g = _bounding_circle(lat_5g, lon_5g, azimuth_5g, radius_5g, angle_deg)
+    search_radius = circle_radius_4g + circle_radius_5g
+    index_5g = build_spatial_index(circle_lat_5g, circle_lon_5g, search_radius)
+
+    cos_lat_5g = np.cos(np.radians(lat_5g))
+    sin_az_5g = np.sin(np.radians(azimuth_5g)).astype(np.float32)
+    cos_az_5g = np.cos(np.radians(azimuth_5g)).astype(np.float32)
+    cos_half_angle = float(np.cos(np.radians(angle_deg) / 2))
+
+    for start in range(0, total_rows, COVERAGE_CHUNK_SIZE):
+        end = min(start + COVERAGE_CHUNK_SIZE, total_rows)
+        chunk = slice(start, end)
+        counts, indices, _ = index_5g.query_radius(circle_lat_4g[chunk], circle_lon_4g[chunk], search_radius)
+        rows = np.repeat(np.arange(end - start), counts)
+
+        # 采样点相对5G小区中心的偏移(米) = 采样点相对4G中心的偏移 + 4G中心相对5G中心的偏移；
+        # 偏移不超过几公里，用float32计算精度足够，内存带宽减半
+        east, north = sector_sample_offsets(azimuth_4g[chunk], radius_4g, angle_deg, n_radial, n_angular)
+        center_east = (lon_4g[chunk][rows] - lon_5g[indices]) * _METERS_PER_DEGREE * cos_lat_5g[indices]
+        center_north = (lat_4g[chunk][rows] - lat_5g[indices]) * _METERS_PER_DEGREE
+        dx = east.astype(np.float32)[rows] + center_east.astype(np.float32)[:, None]
+        dy = north.astype(np.float32)[rows] + center_north.astype(np.float32)[:, None]
+
+        # 落在5G扇区内：距离不超过半径，且与5G方位角的夹角不超过张角一半；
+        # 夹角用点积判断 (dot >= |d|·cos(张角/2))，两边平方后比较，避免开方和反三角函数
+        squared = dx * dx + dy * dy
+        dot = dx * sin_az_5g[indices, None] + dy * cos_az_5g[indices, None]
+        if cos_half_angle >= 0:
+            in_angle = (dot >= 0) & (dot * dot >= cos_half_angle ** 2 * squared)
+        else:
+            in_angle = (dot >= 0) | (dot * dot <= cos_half_angle ** 2 * squared)
+        inside = (squared <= radius_5g ** 2) & in_angle
+
+        covered = np.zeros((end - start, n_samples), dtype=bool)
+        pair_rows, sample_cols = np.nonzero(inside)
+        covered[rows[pair_rows], sample_cols] = True
+        ratio[chunk] = covered.mean(axis=1)
+        overlaps[chunk] = np.bincount(rows[inside.any(axis=1)], minlength=end - start)
+
+        if progress_callback:
+            progress_callback(end, total_rows)
+
+    return ratio, overlaps
+
+
+def add_coverage_ratio(results_df, df_5g, progress_callback=None, **kwargs):
+    """
+    在分析结果中增加 '5G覆盖比例' 和 '重叠5G扇区数' 列(results_df与df_5g均为分析后已清洗的数据)，
+    kwargs 传给 calculate_coverage_ratio (扇区半径、张角、采样密度)。
+    """
+    ratio, overlaps = calculate_coverage_ratio(
+        results_df['纬度'].to_numpy(dtype=np.float64), results_df['经度'].to_numpy(dtype=np.float64),
+        results_df['方位角'].to_numpy(dtype=np.float64), df_5g['纬度'].to_numpy(dtype=np.float64),
+        df_5g['经度'].to_numpy(dtype=np.float64), df_5g['方位角'].to_numpy(dtype=np.float64),
+        progress_callback=progress_callback, **kwargs)
+    results_df['5G覆盖比例'] = ratio
+    results_df['重叠5G扇区数'] = overlaps.astype(np.int32)
+    return results_df
@@ -0,0 +1,147 @@
+# ===== File: datasets.py (数据集句柄与分阶段缓存) =====
+# 工参表和分析结果在加载(或分析完成)时只计算一次内容指纹，包装为 Dataset 句柄。
+# 下游各处理阶段(坐标清洗、扇区几何、地图底图、结果统计)用 StageCache 按句柄的指纹缓存，
+# 命中时不再逐行哈希整张表；句柄只对外提供零拷贝的只读视图，不复制数据。
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def _column_digest(series):
+    """
+    单列内容的哈希字节。普通列逐行哈希；列表类型的列(如top-K候选列)不可逐行哈希，
+    有pyarrow时转为Arrow数组后哈希其数据缓冲区，否则哈希元素的文本形式。
+    """
+    try:
+        return pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes()
+    except TypeError:
+        pass
+    if pa is not None:
+        try:
+            array = pa.array(series, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            array = None
+        if array is not None:
+            digest = hashlib.sha1(str(array.type).encode())
+            for chunk in (array.chunks if isinstance(array, pa.ChunkedArray) else [array]):
+                # 切片与原数组共享缓冲区，偏移和长度也计入指纹
+                digest.update(f'{chunk.offset}:{len(chunk)}'.encode())
+                for buffer in chunk.buffers():
+                    digest.update(b'-' if buffer is None else memoryview(buffer))
+            return digest.digest()
+    text = series.map(lambda value: repr(value.tolist() if hasattr(value, 'tolist') else value))
+    return pd.util.hash_pandas_object(text, index=False).to_numpy().tobytes()
+
+
+def fingerprint_frame(df):
+    """整张表的内容指纹：列名、类型和各列逐行哈希一起取SHA1，行顺序变化也会得到不同指纹"""
+    digest = hashlib.sha1(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    for position in range(df.shape[1]):
+        digest.update(_column_digest(df.iloc[:, position]))
+    digest.update(str(len(df)).encode())
+    return digest.hexdigest()
+
+
+def _freeze(df):
+    """把表中 numpy 数据块设为只读，之后任何原地修改都会报错，不会悄悄改变已缓存的数据"""
+    for block in getattr(df._mgr, 'blocks', ()):
+        if isinstance(block.values, np.ndarray):
+            block.values.flags.writeable = False
+
+
+class Dataset:
+    """
+    一张表的不可变句柄。key 为构造时计算一次的内容指纹(也可由上游阶段传入派生指纹)，
+    view() 返回共享数据的浅拷贝：可以增删列、筛选行，但不能原地修改已有数据。
+    read_only 为假时不冻结数据块(调用方传入的表之后可能还要原地修改)，此时指纹只代表构造时的内容。
+    """
+
+    def __init__(self, frame, name='', key=None, read_only=True):
+        self._frame = frame
+        self.name = name
+        self.key = key if key is not None else fingerprint_frame(frame)
+        self.read_only = read_only
+        if read_only:
+            _freeze(frame)
+
+    def view(self):
+        """零拷贝只读视图"""
+        return self._frame.copy(deep=False)
+
+    def derive(self, frame, stage):
+        """
+        由本数据集经 stage 处理得到的新数据集，指纹由本数据集指纹派生，不再哈希 frame。
+        frame 通常与本数据集共享数据块，因此只在本数据集只读时才冻结。
+        """
+        key = hashlib.sha1(f'{self.key}:{stage}'.encode()).hexdigest()
+        return Dataset(frame, f'{self.name}({stage})', key=key, read_only=self.read_only)
+
+    @property
+    def columns(self):
+        return self._frame.columns
+
+    @property
+    def empty(self):
+        return self._frame.empty
+
+    def __len__(self):
+        return len(self._frame)
+
+    def __repr__(self):
+        return f"Dataset({self.name!r}, rows={len(self)}, key={self.key[:12]})"
+
+
+def as_dataset(obj, name=''):
+    """Dataset 原样返回，DataFrame 包装为不冻结的句柄(当场计算指纹)，None 原样返回"""
+    if obj is None or isinstance(obj, Dataset):
+        return obj
+    return Dataset(obj, name, read_only=False)
+
+
+def as_frame(obj):
+    """Dataset 返回只读视图，DataFrame 和 None 原样返回"""
+    return obj.view() if isinstance(obj, Dataset) else obj
+
+
+class StageCache:
+    """
+    某一处理阶段的结果缓存(LRU)，按输入数据集的指纹和其余参数查找。
+    参数须可哈希；输入为 None 的位置指纹记为空串。
+    """
+
+    def __init__(self, stage, maxsize):
+        self.stage = stage
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _key(datasets, params):
+        return (tuple('' if ds is None else ds.key for ds in datasets),) + params
+
+    def get(self, datasets, build, *params):
+        """命中时返回缓存结果，否则调用 build() 计算并缓存"""
+        key = self._key(datasets, params)
+        result = self._entries.pop(key, None)
+        if result is None:
+            result = build()
+        self._entries[key] = result
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return result
+
+    def discard(self, datasets, *params):
+        """删除一项缓存结果(如结果引用的磁盘文件已被删除)"""
+        self._entries.pop(self._key(datasets, params), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,114 @@
+# ===== File: exporter.py (分析结果导出) =====
+# 结果文件只在用户点击下载时生成，并按结果数据集指纹缓存在磁盘上：页面重跑(搜索、翻页)不再重新
+# 序列化整张结果表，同一结果重复下载直接读取已生成的文件。
+# 写入复用 streaming.py 的分块写入器，逐块生成可读文本并写出，内存占用只与块大小有关：
+# - Excel：xlsxwriter constant_memory 模式或openpyxl只写模式，另附'分析统计'工作表；
+# - CSV、Parquet：比Excel快得多，Parquet保留结构化列(分析类别为分类类型)，不生成文本列。
+import logging
+import os
+import tempfile
+
+import pandas as pd
+
+from datasets import as_dataset
+from main_analyzer import category_counts, with_analysis_text
+from streaming import open_sink
+
+logger = logging.getLogger(__name__)
+
+# 导出格式：扩展名 -> (显示名称, MIME类型)
+EXPORT_FORMATS = {
+    'xlsx': ('Excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('CSV', 'text/csv'),
+    'parquet': ('Parquet', 'application/vnd.apache.parquet'),
+}
+# 导出文件格式版本，导出内容变化时递增，使旧的缓存文件失效
+EXPORT_FORMAT_VERSION = 1
+DEFAULT_EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.export_cache')
+# 每次写入的行数，以及磁盘上最多保留的导出文件数
+EXPORT_CHUNK_SIZE = 50_000
+DEFAULT_MAX_EXPORTS = 6
+EXPORT_FILE_STEM = '5G分流分析结果'
+# 统计工作表中各分析类别的名称(与页面上的统计指标一致)
+STATISTICS_LABELS = {
+    '共站址5G分流小区': '共站址5G分流小区',
+    '共站址5G射频调优小区': '共站址射频调优小区',
+    '非共站址5G分流小区': '非共站址5G分流小区',
+    '5G规划建设': '需要5G规划建设小区',
+}
+
+
+def result_statistics(results_df):
+    """结果统计表(统计项, 数量)：总4G小区数和各分析类别数量，由分类列的计数直接得到"""
+    counts = category_counts(results_df)
+    rows = [('总4G小区数', len(results_df))]
+    rows += [(STATISTICS_LABELS[category], int(counts[category])) for category in STATISTICS_LABELS]
+    return pd.DataFrame(rows, columns=['统计项', '数量'])
+
+
+def export_file_name(fmt):
+    return f'{EXPORT_FILE_STEM}.{fmt}'
+
+
+class ResultExporter:
+    """按结果数据集指纹缓存导出文件，首次请求某种格式时分块写出"""
+
+    def __init__(self, export_dir=DEFAULT_EXPORT_DIR, max_files=DEFAULT_MAX_EXPORTS, chunk_size=EXPORT_CHUNK_SIZE):
+        self.export_dir = export_dir
+        self.max_files = max_files
+        self.chunk_size = chunk_size
+
+    def _path(self, dataset, fmt):
+        return os.path.join(self.export_dir, f'{dataset.key}.v{EXPORT_FORMAT_VERSION}.{fmt}')
+
+    def export(self, results, fmt):
+        """返回结果的导出文件路径，未生成过时当场生成。results 为 Dataset 或 DataFrame"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(EXPORT_FORMATS)}")
+        dataset = as_dataset(results, '分析结果')
+        path = self._path(dataset, fmt)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+
+        os.makedirs(self.export_dir, exist_ok=True)
+        # 临时文件保留扩展名(open_sink按扩展名选择写入器)；下载回调在单独线程中运行，不能只用进程号区分
+        fd, tmp_path = tempfile.mkstemp(dir=self.export_dir, suffix=f'.{fmt}')
+        os.close(fd)
+        try:
+            results_df = dataset.view()
+            chunks = (results_df.iloc[start:start + self.chunk_size]
+                      for start in range(0, len(results_df), self.chunk_size))
+            if fmt != 'parquet':
+                chunks = map(with_analysis_text, chunks)
+            sink = open_sink(tmp_path)
+            try:
+                for chunk in chunks:
+                    sink.write(chunk)
+                if fmt == 'xlsx':
+                    sink.write_sheet('分析统计', result_statistics(results_df))
+            finally:
+                sink.close()
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"导出分析结果: {path} ({len(dataset)} 行)")
+        self.evict()
+        return path
+
+    def read(self, results, fmt):
+        """导出文件的内容(bytes)，供下载按钮使用"""
+        with open(self.export(results, fmt), 'rb') as f:
+            return f.read()
+
+    def evict(self):
+        """只保留最近使用的 max_files 个导出文件"""
+        files = [os.path.join(self.export_dir, name) for name in os.listdir(self.export_dir)
+                 if name.endswith(tuple(f'.v{EXPORT_FORMAT_VERSION}.{fmt}' for fmt in EXPORT_FORMATS))]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[self.max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
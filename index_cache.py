@@ -0,0 +1,181 @@
+# ===== File: index_cache.py (5G空间索引磁盘缓存) =====
+# 5G工参表每周才变化一次，但每天要分析几十次。这里把清洗后的5G经纬度数组和预建的cKDTree
+# 按5G小区坐标的指纹存放到缓存目录，重复分析时直接加载，跳过索引构建：经纬度数组以内存映射方式打开，
+# cKDTree 以pickle反序列化(树的数据和下标数组会读入内存，但不用重新建树)。
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+from spatial_index import SpatialIndex, build_spatial_index, DEFAULT_GRID_CELL_M
+
+try:
+    import scipy
+except ImportError:
+    scipy = None
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本，SpatialIndex的存储结构或指纹算法变化时递增，旧版本缓存会被视为过期
+CACHE_FORMAT_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.index_cache')
+# 默认缓存上限：总大小 2GB，单个条目 30 天未使用即淘汰
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+# 空间索引只由坐标决定，指纹只取经纬度列：小区改名、调整方位角不会使缓存失效
+FINGERPRINT_COLUMNS = ['经度', '纬度']
+ARRAY_FILES = ('lat', 'lon')
+
+
+def fingerprint_5g(df_5g):
+    """5G小区坐标指纹：经纬度按float64取SHA1，行顺序变化也会得到不同指纹"""
+    digest = hashlib.sha1(str(len(df_5g)).encode())
+    for col in FINGERPRINT_COLUMNS:
+        digest.update(np.ascontiguousarray(df_5g[col].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+class IndexCache:
+    """按内容指纹存取5G空间索引的磁盘缓存，每个条目一个子目录"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+    def _entry_dir(self, fingerprint):
+        return os.path.join(self.cache_dir, fingerprint)
+
+    def _is_fresh(self, entry_dir, fingerprint):
+        """检查缓存条目是否可用：格式版本、scipy版本、指纹和文件完整性"""
+        manifest_path = os.path.join(entry_dir, 'manifest.json')
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (manifest.get('version') != CACHE_FORMAT_VERSION or manifest.get('fingerprint') != fingerprint
+                or manifest.get('scipy') != getattr(scipy, '__version__', None)):
+            return False
+        for name, size in manifest.get('files', {}).items():
+            path = os.path.join(entry_dir, name)
+            if not os.path.exists(path) or os.path.getsize(path) != size:
+                return False
+        return True
+
+    def load(self, fingerprint):
+        """加载缓存的索引，坐标数组以只读内存映射方式打开，cKDTree 反序列化读入内存；缓存不存在或已过期时返回None"""
+        entry_dir = self._entry_dir(fingerprint)
+        if not os.path.isdir(entry_dir):
+            return None
+        if not self._is_fresh(entry_dir, fingerprint):
+            logger.info(f"5G索引缓存已过期，删除: {fingerprint}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        try:
+            arrays = {name: np.load(os.path.join(entry_dir, f'{name}.npy'), mmap_mode='r') for name in ARRAY_FILES}
+            with open(os.path.join(entry_dir, 'tree.pkl'), 'rb') as f:
+                tree = pickle.load(f)
+        except Exception as e:
+            logger.error(f"读取5G索引缓存失败: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        # 更新访问时间，供按使用时间淘汰
+        os.utime(entry_dir)
+        return SpatialIndex.from_tree(arrays['lat'], arrays['lon'], tree)
+
+    def save(self, fingerprint, index):
+        """写入缓存条目：先写临时目录再原子重命名，避免并发分析读到半写入的文件"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_dir = self._entry_dir(fingerprint)
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        arrays = {'lat': index.lat, 'lon': index.lon}
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_dir, 'tree.pkl'), 'wb') as f:
+            pickle.dump(index.tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        files = {name: os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)}
+        manifest = {
+            'version': CACHE_FORMAT_VERSION,
+            'fingerprint': fingerprint,
+            'scipy': getattr(scipy, '__version__', None),
+            'rows': len(index),
+            'created': time.time(),
+            'files': files,
+        }
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # 其他进程已写入同一指纹的条目，内容相同，丢弃本次结果即可
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def get_or_build(self, df_5g, cell_size_m=DEFAULT_GRID_CELL_M):
+        """
+        返回df_5g(已清洗)对应的空间索引：命中缓存时直接加载，否则构建并写入缓存。
+        scipy不可用时不使用缓存，直接构建网格边长为 cell_size_m 的网格索引（构建很快）。
+        """
+        lat = df_5g['纬度'].to_numpy(dtype=np.float64)
+        lon = df_5g['经度'].to_numpy(dtype=np.float64)
+        if scipy is None:
+            return build_spatial_index(lat, lon, cell_size_m)
+
+        fingerprint = fingerprint_5g(df_5g)
+        index = self.load(fingerprint)
+        if index is not None:
+            return index
+
+        index = build_spatial_index(lat, lon)
+        try:
+            self.save(fingerprint, index)
+        except OSError as e:
+            logger.error(f"写入5G索引缓存失败: {e}")
+        return index
+
+    def entries(self):
+        """列出缓存条目: [(目录, 大小字节数, 最后访问时间)]"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        result = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(entry_dir) or '.tmp' in name:
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            result.append((entry_dir, size, os.path.getmtime(entry_dir)))
+        return result
+
+    def evict(self):
+        """淘汰超过最长保留时间的条目，再按最近访问时间从旧到新淘汰，直到总大小不超过上限"""
+        now = time.time()
+        entries = []
+        for entry_dir, size, last_used in self.entries():
+            if now - last_used > self.max_age_seconds:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            else:
+                entries.append((last_used, size, entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
@@ -0,0 +1,231 @@
+# ===== File: ingestion.py (工参表读取) =====
+# 上传的工参表只解析一次：按文件内容哈希缓存解析结果(Dataset 句柄)，数据预览、列校验和分析
+# 都从同一份解析结果取只读视图，不再为预览、读表头、读必需列各解析一遍Excel。
+# 文件内容的哈希按上传文件ID只计算一次(TableSource)，页面重跑时直接用缓存键查找解析结果。
+# 支持 Excel(.xlsx/.xls)、CSV、Parquet、Feather，按格式选用最快的读取方式：
+# - Excel：装有 python-calamine 时用 calamine 引擎(Rust实现，比openpyxl快很多)，否则用pandas默认引擎；
+# - CSV：有pyarrow时用多线程的 pyarrow.csv，非UTF-8编码(如GBK导出的文件)退回 pandas 按GB18030读取；
+# - Parquet/Feather：pyarrow 直接读成列式数据再转换为DataFrame。
+import hashlib
+import io
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from datasets import Dataset
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+logger = logging.getLogger(__name__)
+
+# 缓存的解析结果数量(4G、5G表各占一个，留出重新上传的余量)
+PARSE_CACHE_SIZE = 4
+# 缓存的文件内容指纹数量(按上传文件ID或本地文件路径，页面重跑时不再重新哈希文件内容)
+SOURCE_KEY_CACHE_SIZE = 16
+# 上传控件接受的扩展名
+UPLOAD_TYPES = ['xlsx', 'xls', 'csv', 'parquet', 'feather']
+
+
+def _read_excel(data):
+    engine = 'calamine' if python_calamine is not None else None
+    return pd.read_excel(io.BytesIO(data), engine=engine)
+
+
+def _read_csv(data):
+    if pa is not None:
+        try:
+            return pa_csv.read_csv(pa.BufferReader(data)).to_pandas()
+        except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+            # pyarrow只支持UTF-8，其他编码交给pandas
+            logger.debug(f"pyarrow读取CSV失败，改用pandas: {e}")
+    try:
+        return pd.read_csv(io.BytesIO(data), encoding='utf-8-sig')
+    except UnicodeDecodeError:
+        return pd.read_csv(io.BytesIO(data), encoding='gb18030')
+
+
+def _read_parquet(data):
+    return pq.read_table(pa.BufferReader(data)).to_pandas()
+
+
+def _read_feather(data):
+    return feather.read_table(pa.BufferReader(data)).to_pandas()
+
+
+def _head_excel(data, rows):
+    """openpyxl只读模式只读取表头和前rows行；.xls没有只读模式，交给pandas"""
+    if python_calamine is not None:
+        return pd.read_excel(io.BytesIO(data), engine='calamine', nrows=rows), None
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    except Exception:
+        return pd.read_excel(io.BytesIO(data), nrows=rows), None
+    try:
+        sheet_rows = workbook.active.iter_rows(max_row=rows + 1, values_only=True)
+        header = next(sheet_rows, None) or ()
+        return pd.DataFrame(list(sheet_rows), columns=[col if col is not None else '' for col in header]), None
+    finally:
+        workbook.close()
+
+
+def _head_csv(data, rows):
+    try:
+        return pd.read_csv(io.BytesIO(data), encoding='utf-8-sig', nrows=rows), None
+    except UnicodeDecodeError:
+        return pd.read_csv(io.BytesIO(data), encoding='gb18030', nrows=rows), None
+
+
+def _head_parquet(data, rows):
+    """只解码第一批数据，总行数取自文件元数据"""
+    parquet_file = pq.ParquetFile(pa.BufferReader(data))
+    batch = next(parquet_file.iter_batches(batch_size=rows), None)
+    head = batch.to_pandas() if batch is not None else parquet_file.schema_arrow.empty_table().to_pandas()
+    return head, parquet_file.metadata.num_rows
+
+
+def _head_feather(data, rows):
+    reader = pa.ipc.open_file(pa.BufferReader(data))
+    if reader.num_record_batches == 0:
+        return reader.schema.empty_table().to_pandas(), 0
+    return reader.get_batch(0).slice(0, rows).to_pandas(), None
+
+
+READERS = {'.xlsx': _read_excel, '.xls': _read_excel, '.csv': _read_csv,
+           '.parquet': _read_parquet, '.feather': _read_feather}
+# 只读取前几行的读取方式(数据预览用)，返回(DataFrame, 总行数)，总行数在完整解析前未知时为None
+HEAD_READERS = {'.xlsx': _head_excel, '.xls': _head_excel, '.csv': _head_csv,
+                '.parquet': _head_parquet, '.feather': _head_feather}
+# 必须安装pyarrow才能读取的格式
+ARROW_FORMATS = ('.parquet', '.feather')
+
+_parsed = OrderedDict()
+_source_keys = OrderedDict()
+
+
+def _read_bytes(source):
+    """上传文件(UploadedFile/BytesIO)或本地路径的内容"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    return source.getvalue()
+
+
+def _source_id(source):
+    """
+    不读取内容即可标识文件内容的键：上传文件取 file_id 和大小，本地路径取路径、修改时间和大小；
+    没有 file_id 的对象(如BytesIO)返回None，每次按内容计算指纹。
+    """
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        return 'path', os.path.abspath(source), stat.st_mtime_ns, stat.st_size
+    file_id = getattr(source, 'file_id', None)
+    if file_id is None:
+        return None
+    return 'upload', file_id, getattr(source, 'size', None)
+
+
+class TableSource:
+    """
+    一个待读取的工参文件：文件名、扩展名和缓存键(内容SHA1 + 扩展名)。
+    缓存键按上传文件ID(或本地文件路径、修改时间)只计算一次；文件内容只在需要解析时读取。
+    不支持的格式抛出 ValueError。
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.name = os.fspath(source) if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+        self.ext = os.path.splitext(self.name)[1].lower()
+        if self.ext not in READERS:
+            raise ValueError(f"不支持的文件格式: {self.ext or self.name}，可选: {', '.join(UPLOAD_TYPES)}")
+        if self.ext in ARROW_FORMATS and pa is None:
+            raise ValueError(f"读取{self.ext}文件需要安装pyarrow。")
+        self._data = None
+        source_id = _source_id(source)
+        self.key = _source_keys.pop(source_id, None) if source_id is not None else None
+        if self.key is None:
+            self.key = hashlib.sha1(self.data).hexdigest() + self.ext
+        if source_id is not None:
+            _source_keys[source_id] = self.key
+            while len(_source_keys) > SOURCE_KEY_CACHE_SIZE:
+                _source_keys.popitem(last=False)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = _read_bytes(self.source)
+        return self._data
+
+
+def table_source(source):
+    """TableSource 原样返回，上传文件或本地路径包装为 TableSource"""
+    return source if isinstance(source, TableSource) else TableSource(source)
+
+
+def parse_table(source):
+    """
+    解析工参表(上传文件、本地路径或 TableSource)，返回 Dataset 句柄：列名已去掉首尾空格，数据只读，
+    指纹由文件内容哈希得到(不再逐行哈希)。同一文件内容只解析一次，之后直接返回缓存的句柄。
+    不支持的格式或文件损坏时抛出 ValueError。
+    """
+    source = table_source(source)
+    name, key = source.name, source.key
+    dataset = _parsed.pop(key, None)
+    if dataset is None:
+        start = time.perf_counter()
+        try:
+            df = READERS[source.ext](source.data)
+        except Exception as e:
+            raise ValueError(f"读取文件 {name} 出错: {type(e).__name__}: {e}") from e
+        df.columns = [str(col).strip() for col in df.columns]
+        dataset = Dataset(df, os.path.basename(name), key=key)
+        logger.info(f"解析 {name}: {len(df)} 行, {time.perf_counter() - start:.2f} 秒")
+    _parsed[key] = dataset
+    while len(_parsed) > PARSE_CACHE_SIZE:
+        _parsed.popitem(last=False)
+    return dataset
+
+
+def is_parsed(source):
+    """文件是否已解析(在缓存中)"""
+    return table_source(source).key in _parsed
+
+
+def peek_table(source, rows):
+    """
+    不完整解析文件，只读取表头和前rows行，返回(DataFrame, 总行数)。已解析过的文件直接取缓存；
+    否则总行数只有Parquet这类元数据中带行数的格式可知，其余为None。
+    """
+    source = table_source(source)
+    dataset = _parsed.get(source.key)
+    if dataset is not None:
+        return dataset.view().iloc[:rows], len(dataset)
+    try:
+        head, total = HEAD_READERS[source.ext](source.data, rows)
+    except Exception as e:
+        raise ValueError(f"读取文件 {source.name} 出错: {type(e).__name__}: {e}") from e
+    head.columns = [str(col).strip() for col in head.columns]
+    return head, total
+
+
+def select_columns(dataset, columns, file_type=''):
+    """从解析结果中取出指定列，缺少列时抛出 ValueError"""
+    missing_cols = [col for col in columns if col not in dataset.columns]
+    if missing_cols:
+        raise ValueError(f"{file_type}文件缺少以下必需的列: {', '.join(missing_cols)}")
+    return dataset.view()[columns]
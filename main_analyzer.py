@@ -1,135 +1,607 @@
-# ===== File: main_analyzer.py (最终高性能版 v4.0) =====
+# ===== File: main_analyzer.py (最终高性能版 v5.0 批量向量化) =====
 import pandas as pd
 import numpy as np
+from itertools import product
 # 简化导入，只导入必要的模块
-from algorithms import calculate_distance, calculate_azimuth_difference
+from algorithms import calculate_azimuth_difference_batch
+from spatial_index import build_spatial_index
 
-# 尝试导入 scipy，如果失败则使用替代方案
+# pyarrow可用时候选列存为Arrow列表列(一块连续内存+偏移量)，否则为逐行的NumPy数组视图
 try:
-    from scipy.spatial import cKDTree
+    import pyarrow as pa
 except ImportError:
-    # 如果 scipy 不可用，使用简单的距离计算替代
-    pass
-DEGREE_PER_METER = 1 / 111320
-def analyze_5g_offload(df_4g, df_5g, d_colo, theta_colo, d_non_colo, n_non_colo, progress_callback=None):
-    results = []
-    
-    # 转换数值类型并过滤无效数据
+    pa = None
+
+# 每批处理的4G小区数量，控制候选对数组的内存占用
+CHUNK_SIZE = 50000
+
+# 分析类别编码
+CATEGORY_PLANNING = 0       # 5G规划建设
+CATEGORY_COLO_OFFLOAD = 1   # 共站址5G分流小区
+CATEGORY_COLO_TUNE = 2      # 共站址5G射频调优小区
+CATEGORY_NON_COLO = 3       # 非共站址5G分流小区
+CATEGORY_LABELS = {
+    CATEGORY_PLANNING: '5G规划建设',
+    CATEGORY_COLO_OFFLOAD: '共站址5G分流小区',
+    CATEGORY_COLO_TUNE: '共站址5G射频调优小区',
+    CATEGORY_NON_COLO: '非共站址5G分流小区',
+}
+PARAM_NAMES = ['d_colo', 'theta_colo', 'd_non_colo', 'n_non_colo']
+CATEGORY_DTYPE = pd.CategoricalDtype(list(CATEGORY_LABELS.values()))
+# 分析结果中由分析引擎生成的列（其余列为4G工参原始列）
+RESULT_COLUMNS = ['分析类别', '建议分流小区', '最近距离(m)', '方位角夹角(°)', '范围内5G小区数']
+# 可读分析结果文本模板，只在显示/导出时按需生成
+TEXT_TEMPLATES = {
+    CATEGORY_COLO_OFFLOAD: "共站址5G分流小区 (关联小区: {}, 距离: {:.2f}m, 夹角: {:.2f}°)",
+    CATEGORY_COLO_TUNE: "共站址5G射频调优小区 (关联小区: {}, 距离: {:.2f}m, 夹角: {:.2f}°)",
+}
+# 判断小区是否变化时比较的列
+CELL_KEY_COLUMNS = ['经度', '纬度', '方位角']
+# top-K模式下的候选列：每行一个按优先级排列的数组（行间共享同一块内存）
+TOP_K_COLUMNS = ['候选5G小区', '候选距离(m)', '候选夹角(°)']
+# 候选排序分级：共站址且方位角对齐、共站址但方位角偏差大、非共站址
+_TIER_ALIGNED, _TIER_MISALIGNED, _TIER_FAR = 0, 1, 2
+
+
+def _clean_coordinates(df):
+    """转换数值类型并过滤无效数据（原地修改）"""
     for col in ['经度', '纬度', '方位角']:
-        df_4g[col] = pd.to_numeric(df_4g[col], errors='coerce')
-        df_5g[col] = pd.to_numeric(df_5g[col], errors='coerce')
-    
-    df_4g.dropna(subset=['经度', '纬度', '方位角'], inplace=True)
-    df_5g.dropna(subset=['经度', '纬度', '方位角'], inplace=True)
-    
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df.dropna(subset=['经度', '纬度', '方位角'], inplace=True)
+
+
+def _reduce_nearest(counts, indices, distances):
+    """
+    将CSR形式的候选归约为每个4G小区的最近5G小区。
+    距离相同时取候选顺序中的第一个（即5G索引最小者）；无候选时索引为-1、距离为inf。
+    """
+    n = len(counts)
+    min_dist = np.full(n, np.inf)
+    nearest = np.full(n, -1, dtype=np.intp)
+
+    has_candidates = counts > 0
+    if not has_candidates.any():
+        return min_dist, nearest
+
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    row_min = np.minimum.reduceat(distances, offsets[has_candidates])
+    min_dist[has_candidates] = row_min
+
+    rows = np.repeat(np.arange(n), counts)
+    first_min_pos = np.flatnonzero(distances == min_dist[rows])
+    min_rows, first_idx = np.unique(rows[first_min_pos], return_index=True)
+    nearest[min_rows] = indices[first_min_pos[first_idx]]
+    return min_dist, nearest
+
+
+def _classify(min_dist, angle_diff, counts, d_colo, theta_colo, d_non_colo, n_non_colo):
+    """根据最近距离、夹角和候选数量，用向量化掩码给每个4G小区分类"""
+    categories = np.full(len(min_dist), CATEGORY_PLANNING, dtype=np.int8)
+    colo = min_dist <= d_colo
+    non_colo = ~colo & (min_dist <= d_non_colo) & (counts >= n_non_colo)
+    categories[colo & (angle_diff <= theta_colo)] = CATEGORY_COLO_OFFLOAD
+    categories[colo & (angle_diff > theta_colo)] = CATEGORY_COLO_TUNE
+    categories[non_colo] = CATEGORY_NON_COLO
+    return categories
+
+
+def _assemble_results(df_4g, categories, suggested, min_dist, angle_diff, counts):
+    """按列构建结果DataFrame：原4G列 + 分析类别 + 建议分流小区 + 数值列；无候选时距离和夹角为NaN"""
+    results_df = df_4g.reset_index(drop=True)
+    results_df['分析类别'] = pd.Categorical.from_codes(categories, dtype=CATEGORY_DTYPE)
+    results_df['建议分流小区'] = suggested
+    results_df['最近距离(m)'] = np.where(np.isfinite(min_dist), min_dist, np.nan)
+    results_df['方位角夹角(°)'] = np.where(np.isfinite(angle_diff), angle_diff, np.nan)
+    results_df['范围内5G小区数'] = counts.astype(np.int32)
+    return results_df
+
+
+def _format_results(df_4g, categories, nearest, min_dist, angle_diff, counts, names_5g):
+    """由分类编码和最近5G索引构建结果DataFrame，建议分流小区以5G小区名称为类别的Categorical存储"""
+    name_codes, unique_names = pd.factorize(names_5g)
+    suggested_codes = np.full(len(categories), -1, dtype=np.intp)
+    has_suggestion = (categories != CATEGORY_PLANNING) & (nearest >= 0)
+    suggested_codes[has_suggestion] = name_codes[nearest[has_suggestion]]
+    suggested = pd.Categorical.from_codes(suggested_codes, categories=unique_names)
+    return _assemble_results(df_4g, categories, suggested, min_dist, angle_diff, counts)
+
+
+def format_analysis_text(results_df):
+    """按需生成可读的分析结果文本(与旧版'分析结果'列格式一致)，用于显示和导出"""
+    categories = results_df['分析类别'].cat.codes.to_numpy()
+    names = results_df['建议分流小区'].to_numpy(dtype=object)
+    min_dist = results_df['最近距离(m)'].to_numpy()
+    angle_diff = results_df['方位角夹角(°)'].to_numpy()
+    counts = results_df['范围内5G小区数'].to_numpy()
+
+    text = np.full(len(results_df), CATEGORY_LABELS[CATEGORY_PLANNING], dtype=object)
+    for category, template in TEXT_TEMPLATES.items():
+        mask = categories == category
+        text[mask] = [template.format(*args) for args in zip(names[mask], min_dist[mask], angle_diff[mask])]
+    mask = categories == CATEGORY_NON_COLO
+    text[mask] = [f"非共站址5G分流小区 (范围内有{count}个5G小区，最近距离: {dist:.2f}m)"
+                  for count, dist in zip(counts[mask], min_dist[mask])]
+    return pd.Series(text, index=results_df.index, name='分析结果')
+
+
+def with_analysis_text(results_df):
+    """
+    导出用的结果表：原4G列 + 分析结果文本 + 建议分流小区(无则为'N/A') + 数值列；
+    top-K结果另附一列可读的候选列表。
+    """
+    base_columns = [col for col in results_df.columns if col not in RESULT_COLUMNS + TOP_K_COLUMNS]
+    export_df = results_df[base_columns].copy()
+    export_df['分析结果'] = format_analysis_text(results_df)
+    suggested = results_df['建议分流小区'].to_numpy(dtype=object)
+    export_df['建议分流小区'] = np.where(pd.isna(suggested), "N/A", suggested)
+    for col in ['最近距离(m)', '方位角夹角(°)', '范围内5G小区数']:
+        export_df[col] = results_df[col]
+    if TOP_K_COLUMNS[0] in results_df.columns:
+        export_df['候选5G小区'] = [
+            '; '.join(f"{name} ({dist:.2f}m, {angle:.2f}°)" for name, dist, angle in zip(*row))
+            for row in zip(*(results_df[col] for col in TOP_K_COLUMNS))]
+    return export_df
+
+
+def category_counts(results_df):
+    """各分析类别的小区数量(按CATEGORY_LABELS顺序，包含数量为0的类别)"""
+    return results_df['分析类别'].value_counts(sort=False).reindex(CATEGORY_DTYPE.categories, fill_value=0)
+
+
+def _get_index(df_5g, lat_5g, lon_5g, index_cache, radius_m):
+    """构建5G空间索引(无scipy时为网格索引，网格边长取搜索半径)，有缓存时优先从缓存加载"""
+    if index_cache is not None:
+        return index_cache.get_or_build(df_5g, radius_m)
+    return build_spatial_index(lat_5g, lon_5g, radius_m)
+
+
+def _match_nearest(lat_4g, lon_4g, azimuth_4g, index_5g, lat_5g, lon_5g, azimuth_5g, d_non_colo,
+                   progress_callback=None, index_stats=None):
+    """分批为4G小区查找搜索半径内的最近5G小区，返回(最近5G索引, 最近距离, 方位角夹角, 范围内5G数量)"""
+    total_rows = len(lat_4g)
+    min_dist = np.full(total_rows, np.inf)
+    nearest = np.full(total_rows, -1, dtype=np.intp)
+    counts = np.zeros(total_rows, dtype=np.intp)
+    angle_diff = np.full(total_rows, np.inf)
+
+    for start in range(0, total_rows, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, total_rows)
+        chunk = slice(start, end)
+        chunk_counts, indices, distances = index_5g.query_radius(lat_4g[chunk], lon_4g[chunk], d_non_colo)
+        if index_stats is not None and hasattr(index_5g, 'degree_candidate_counts'):
+            index_stats['queries'] += end - start
+            index_stats['candidates'] += len(indices)
+            index_stats['degree_candidates'] += int(
+                index_5g.degree_candidate_counts(lat_4g[chunk], lon_4g[chunk], d_non_colo).sum())
+        counts[chunk] = chunk_counts
+        min_dist[chunk], nearest[chunk] = _reduce_nearest(chunk_counts, indices, distances)
+
+        if progress_callback:
+            progress_callback(end, total_rows)
+
+    # 计算最近5G小区的方位角夹角
+    matched = nearest >= 0
+    angle_diff[matched] = calculate_azimuth_difference_batch(azimuth_4g[matched], azimuth_5g[nearest[matched]])
+    return nearest, min_dist, angle_diff, counts
+
+
+def _rank_candidates(counts, indices, distances, azimuth_4g, azimuth_5g, d_colo, theta_colo, top_k):
+    """
+    对query_radius返回的CSR候选整体排序，返回每个4G小区排名前top_k的候选：
+    (5G索引矩阵(N, top_k)，不足补-1；距离矩阵；夹角矩阵，不足补inf；每行有效候选数)。
+    d_colo内的候选中方位角对齐的优先，同级内按 距离/d_colo + 夹角/theta_colo 综合得分排序；
+    d_colo外的候选排在最后并按距离排序。得分相同时5G索引小的优先。
+    """
+    n = len(counts)
+    rows = np.repeat(np.arange(n), counts)
+    angles = calculate_azimuth_difference_batch(azimuth_4g[rows], azimuth_5g[indices])
+    colo = distances <= d_colo
+    tier = np.where(colo, np.where(angles <= theta_colo, _TIER_ALIGNED, _TIER_MISALIGNED), _TIER_FAR)
+    score = np.where(colo, distances / max(d_colo, 1e-9) + angles / max(theta_colo, 1e-9), distances)
+    order = np.lexsort((indices, score, tier, rows))
+
+    # 每个候选在本行排序后的名次，只保留前top_k个
+    offsets = np.cumsum(counts) - counts
+    rank = np.arange(len(order)) - np.repeat(offsets, counts)
+    keep = rank < top_k
+    kept, kept_rows, kept_rank = order[keep], rows[keep], rank[keep]
+
+    top_indices = np.full((n, top_k), -1, dtype=np.intp)
+    top_distances = np.full((n, top_k), np.inf)
+    top_angles = np.full((n, top_k), np.inf)
+    top_indices[kept_rows, kept_rank] = indices[kept]
+    top_distances[kept_rows, kept_rank] = distances[kept]
+    top_angles[kept_rows, kept_rank] = angles[kept]
+    return top_indices, top_distances, top_angles, np.minimum(counts, top_k)
+
+
+def _match_top_k(lat_4g, lon_4g, azimuth_4g, index_5g, azimuth_5g, d_colo, theta_colo, d_non_colo, top_k,
+                 progress_callback=None):
+    """
+    top-K模式的近邻匹配：与_match_nearest共用一次半径查询，额外只做一次候选排序。
+    共站址4G小区选方位角最匹配的候选，其余选最近候选；返回值在_match_nearest的基础上
+    增加排名前top_k的候选矩阵 (5G索引, 距离, 夹角, 每行有效候选数)。
+    """
+    total_rows = len(lat_4g)
+    counts = np.zeros(total_rows, dtype=np.intp)
+    top_indices = np.full((total_rows, top_k), -1, dtype=np.intp)
+    top_distances = np.full((total_rows, top_k), np.inf)
+    top_angles = np.full((total_rows, top_k), np.inf)
+    top_counts = np.zeros(total_rows, dtype=np.intp)
+
+    for start in range(0, total_rows, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, total_rows)
+        chunk = slice(start, end)
+        chunk_counts, indices, distances = index_5g.query_radius(lat_4g[chunk], lon_4g[chunk], d_non_colo)
+        counts[chunk] = chunk_counts
+        (top_indices[chunk], top_distances[chunk], top_angles[chunk],
+         top_counts[chunk]) = _rank_candidates(chunk_counts, indices, distances, azimuth_4g[chunk], azimuth_5g,
+                                               d_colo, theta_colo, top_k)
+        if progress_callback:
+            progress_callback(end, total_rows)
+
+    # 排名第一的候选：共站址时为方位角最匹配的小区，否则为最近的小区
+    nearest, min_dist, angle_diff = top_indices[:, 0], top_distances[:, 0], top_angles[:, 0]
+    return nearest, min_dist, angle_diff, counts, (top_indices, top_distances, top_angles, top_counts)
+
+
+def _candidate_columns(results_df, top_indices, top_distances, top_angles, top_counts, names_5g):
+    """把候选矩阵写成紧凑的数组列(TOP_K_COLUMNS)，每行只含有效候选"""
+    # 有效候选位于每行开头，按行优先取出即为各行候选首尾相接的扁平数组
+    valid = top_indices >= 0
+    columns = (names_5g[top_indices[valid]].astype(str), top_distances[valid], top_angles[valid])
+    if pa is not None:
+        offsets = pa.array(np.concatenate([[0], np.cumsum(top_counts)]), type=pa.int32())
+        for col, values in zip(TOP_K_COLUMNS, columns):
+            results_df[col] = pd.arrays.ArrowExtensionArray(pa.ListArray.from_arrays(offsets, pa.array(values)))
+    else:
+        bounds = np.cumsum(top_counts)[:-1]
+        for col, values in zip(TOP_K_COLUMNS, columns):
+            results_df[col] = np.split(values, bounds) if len(top_counts) else []
+    return results_df
+
+
+def analyze_5g_offload(df_4g, df_5g, d_colo, theta_colo, d_non_colo, n_non_colo, progress_callback=None,
+                       index_stats=None, index_cache=None, workers=1, top_k=None):
+    """
+    5G分流分析主入口。index_stats传入dict时，会写入空间索引的候选统计：
+    查询数、米制索引返回的候选数、按度数搜索所需的候选数以及每次查询节省的候选数。
+    index_cache传入IndexCache时，5G空间索引优先从磁盘缓存加载。
+    workers大于1(或为None表示使用全部CPU)时按地理分块多进程并行计算，结果与单进程一致。
+    top_k为正整数时启用top-K匹配：共站址4G小区在d_colo内的候选中选方位角最匹配的5G小区，
+    并增加TOP_K_COLUMNS候选列(排名前top_k的5G小区、距离、夹角)；该模式在单进程中运行。
+    """
+    params = dict(d_colo=d_colo, theta_colo=theta_colo, d_non_colo=d_non_colo, n_non_colo=n_non_colo)
+    if top_k:
+        params['top_k'] = int(top_k)
+    # 转换数值类型并过滤无效数据
+    _clean_coordinates(df_4g)
+    _clean_coordinates(df_5g)
+
     total_rows = len(df_4g)
-    
+    lat_4g = df_4g['纬度'].to_numpy(dtype=np.float64)
+    lon_4g = df_4g['经度'].to_numpy(dtype=np.float64)
+    azimuth_4g = df_4g['方位角'].to_numpy(dtype=np.float64)
+
     # 处理5G数据为空的情况
     if df_5g.empty:
-        for idx, (_, row_4g) in enumerate(df_4g.iterrows()):
-            current_result = row_4g.to_dict()
-            current_result['分析结果'] = "5G规划建设"
-            current_result['建议分流小区'] = "N/A"
-            results.append(current_result)
-            if progress_callback:
-                progress_callback(idx + 1, total_rows)
-        return pd.DataFrame(results)
-    
+        categories = np.full(total_rows, CATEGORY_PLANNING, dtype=np.int8)
+        if progress_callback:
+            progress_callback(total_rows, total_rows)
+        results_df = _format_results(df_4g, categories, np.full(total_rows, -1, dtype=np.intp),
+                                     np.full(total_rows, np.inf), np.full(total_rows, np.inf),
+                                     np.zeros(total_rows, dtype=np.intp), np.empty(0, dtype=object))
+        if top_k:
+            _candidate_columns(results_df, np.full((total_rows, top_k), -1, dtype=np.intp),
+                               np.full((total_rows, top_k), np.inf), np.full((total_rows, top_k), np.inf),
+                               np.zeros(total_rows, dtype=np.intp), np.empty(0, dtype=object))
+        results_df.attrs['params'] = params
+        return results_df
+
     # 获取5G小区坐标
-    coords_5g = df_5g[['纬度', '经度']].values
-    
-    # 根据是否有cKDTree选择不同的近邻搜索方法
-    if 'cKDTree' in globals():
-        # 使用scipy的cKDTree进行高效搜索
-        tree_5g = cKDTree(coords_5g)
-        radius_in_degrees = d_non_colo * DEGREE_PER_METER
-        
-        for idx, (_, row_4g) in enumerate(df_4g.iterrows()):
-            lat_4g = row_4g['纬度']
-            lon_4g = row_4g['经度']
-            azimuth_4g = row_4g['方位角']
-            coord_4g = [lat_4g, lon_4g]
-            
-            # 使用KDTree查找附近的5G小区
-            nearby_indices = tree_5g.query_ball_point(coord_4g, r=radius_in_degrees)
-            
-            analysis_result = "5G规划建设"
-            suggested_cell_name = "N/A"
-            
-            if nearby_indices:
-                df_nearby_5g = df_5g.iloc[nearby_indices]
-                distances = []
-                
-                # 计算距离
-                for _, row_5g in df_nearby_5g.iterrows():
-                    dist = calculate_distance(lat_4g, lon_4g, row_5g['纬度'], row_5g['经度'])
-                    distances.append((dist, row_5g))
-                
-                min_dist, nearest_5g_cell = min(distances, key=lambda x: x[0])
-                azimuth_5g = nearest_5g_cell['方位角']
-                angle_diff = calculate_azimuth_difference(azimuth_4g, azimuth_5g)
-                
-                # 共站址判断
-                if min_dist <= d_colo:
-                    suggested_cell_name = nearest_5g_cell['小区名称']
-                    if angle_diff <= theta_colo:
-                        analysis_result = f"共站址5G分流小区 (关联小区: {suggested_cell_name}, 距离: {min_dist:.2f}m, 夹角: {angle_diff:.2f}°)"
-                    else:
-                        analysis_result = f"共站址5G射频调优小区 (关联小区: {suggested_cell_name}, 距离: {min_dist:.2f}m, 夹角: {angle_diff:.2f}°)"
-                elif min_dist <= d_non_colo:
-                    # 非共站址判断
-                    if len(nearby_indices) >= n_non_colo:
-                        suggested_cell_name = nearest_5g_cell['小区名称']
-                        analysis_result = f"非共站址5G分流小区 (范围内有{len(nearby_indices)}个5G小区，最近距离: {min_dist:.2f}m)"
-            
-            # 保存结果
-            current_result = row_4g.to_dict()
-            current_result['分析结果'] = analysis_result
-            current_result['建议分流小区'] = suggested_cell_name
-            results.append(current_result)
-            
-            if progress_callback:
-                progress_callback(idx + 1, total_rows)
+    lat_5g = df_5g['纬度'].to_numpy(dtype=np.float64)
+    lon_5g = df_5g['经度'].to_numpy(dtype=np.float64)
+    azimuth_5g = df_5g['方位角'].to_numpy(dtype=np.float64)
+    names_5g = df_5g['小区名称'].to_numpy(dtype=object)
+
+    candidates = None
+    if top_k:
+        index_5g = _get_index(df_5g, lat_5g, lon_5g, index_cache, d_non_colo)
+        nearest, min_dist, angle_diff, counts, candidates = _match_top_k(
+            lat_4g, lon_4g, azimuth_4g, index_5g, azimuth_5g, d_colo, theta_colo, d_non_colo, top_k,
+            progress_callback)
+    elif workers != 1:
+        # 延迟导入，parallel模块依赖本模块
+        from parallel import match_nearest_parallel
+        nearest, min_dist, angle_diff, counts = match_nearest_parallel(
+            lat_4g, lon_4g, azimuth_4g, lat_5g, lon_5g, azimuth_5g, d_non_colo, workers, progress_callback)
     else:
-        # 不使用cKDTree，直接计算距离（适合小数据集）
-        for idx, (_, row_4g) in enumerate(df_4g.iterrows()):
-            lat_4g = row_4g['纬度']
-            lon_4g = row_4g['经度']
-            azimuth_4g = row_4g['方位角']
-            
-            nearby_5g_cells = []
-            for _, row_5g in df_5g.iterrows():
-                dist = calculate_distance(lat_4g, lon_4g, row_5g['纬度'], row_5g['经度'])
-                if dist <= d_non_colo:
-                    nearby_5g_cells.append((dist, row_5g))
-            
-            analysis_result = "5G规划建设"
-            suggested_cell_name = "N/A"
-            
-            if nearby_5g_cells:
-                min_dist, nearest_5g_cell = min(nearby_5g_cells, key=lambda x: x[0])
-                azimuth_5g = nearest_5g_cell['方位角']
-                angle_diff = calculate_azimuth_difference(azimuth_4g, azimuth_5g)
-                
-                # 共站址判断
-                if min_dist <= d_colo:
-                    suggested_cell_name = nearest_5g_cell['小区名称']
-                    if angle_diff <= theta_colo:
-                        analysis_result = f"共站址5G分流小区 (关联小区: {suggested_cell_name}, 距离: {min_dist:.2f}m, 夹角: {angle_diff:.2f}°)"
-                    else:
-                        analysis_result = f"共站址5G射频调优小区 (关联小区: {suggested_cell_name}, 距离: {min_dist:.2f}m, 夹角: {angle_diff:.2f}°)"
-                # 非共站址判断
-                elif len(nearby_5g_cells) >= n_non_colo:
-                    suggested_cell_name = nearest_5g_cell['小区名称']
-                    analysis_result = f"非共站址5G分流小区 (范围内有{len(nearby_5g_cells)}个5G小区，最近距离: {min_dist:.2f}m)"
-            
-            # 保存结果
-            current_result = row_4g.to_dict()
-            current_result['分析结果'] = analysis_result
-            current_result['建议分流小区'] = suggested_cell_name
-            results.append(current_result)
-            
+        index_5g = _get_index(df_5g, lat_5g, lon_5g, index_cache, d_non_colo)
+        if index_stats is not None:
+            index_stats.update(queries=0, candidates=0, degree_candidates=0)
+        nearest, min_dist, angle_diff, counts = _match_nearest(lat_4g, lon_4g, azimuth_4g, index_5g,
+                                                               lat_5g, lon_5g, azimuth_5g, d_non_colo,
+                                                               progress_callback, index_stats)
+    if index_stats is not None and index_stats.get('queries'):
+        index_stats['saved_per_query'] = (
+            (index_stats['degree_candidates'] - index_stats['candidates']) / index_stats['queries'])
+
+    categories = _classify(min_dist, angle_diff, counts, d_colo, theta_colo, d_non_colo, n_non_colo)
+    results_df = _format_results(df_4g, categories, nearest, min_dist, angle_diff, counts, names_5g)
+    if candidates is not None:
+        _candidate_columns(results_df, *candidates, names_5g)
+    # 记录本次分析参数，供增量分析判断上次结果是否可复用
+    results_df.attrs['params'] = params
+    return results_df
+
+
+def _diff_cells(prev_df, new_df):
+    """
+    按小区名称对比新旧工参表。返回(新表中每行对应的旧表行号(新增为-1), 新表中新增或修改的行掩码,
+    旧表中删除或修改的行掩码)；任一表小区名称重复时无法按名称对齐，返回None。
+    """
+    prev_names = pd.Index(prev_df['小区名称'])
+    new_names = pd.Index(new_df['小区名称'])
+    if not prev_names.is_unique or not new_names.is_unique:
+        return None
+
+    pos_in_prev = prev_names.get_indexer(new_names)
+    matched = pos_in_prev >= 0
+    unchanged = matched.copy()
+    for col in CELL_KEY_COLUMNS:
+        new_values = new_df[col].to_numpy(dtype=np.float64)
+        prev_values = prev_df[col].to_numpy(dtype=np.float64)
+        unchanged[matched] &= new_values[matched] == prev_values[pos_in_prev[matched]]
+
+    prev_changed = np.ones(len(prev_df), dtype=bool)
+    prev_changed[pos_in_prev[unchanged]] = False
+    return pos_in_prev, ~unchanged, prev_changed
+
+
+def incremental_analyze_5g_offload(prev_results, prev_df_5g, df_4g, df_5g, d_colo, theta_colo, d_non_colo,
+                                   n_non_colo, progress_callback=None, index_cache=None, workers=1):
+    """
+    增量分析：对比上次分析的输入(上次结果中已包含4G工参列)与新的4G/5G工参表，
+    只重新计算新增/修改的4G小区，以及距离任一变化5G小区(新增、删除、修改前后的位置)
+    不超过 d_non_colo 的4G小区，其余小区直接复用上次结果。
+    无法安全复用时(参数不同、小区名称重复、5G表行顺序被打乱)退回完整分析。
+    workers 与 analyze_5g_offload 相同，完整分析和重新计算受影响小区时都按此并行；
+    progress_callback 报告重新计算受影响小区的进度(总数为受影响的小区数)。
+    结果的 attrs['incremental'] 记录重新计算的小区数量。
+    """
+    params = dict(d_colo=d_colo, theta_colo=theta_colo, d_non_colo=d_non_colo, n_non_colo=n_non_colo)
+
+    def full_analysis(reason):
+        results_df = analyze_5g_offload(df_4g, df_5g, progress_callback=progress_callback,
+                                        index_cache=index_cache, workers=workers, **params)
+        results_df.attrs['incremental'] = {'recomputed': len(results_df), 'reason': reason}
+        return results_df
+
+    if prev_results is None or prev_df_5g is None or prev_results.attrs.get('params') != params:
+        return full_analysis("分析参数变化或没有上次结果")
+
+    _clean_coordinates(df_4g)
+    _clean_coordinates(df_5g)
+    _clean_coordinates(prev_df_5g)
+
+    diff_4g = _diff_cells(prev_results, df_4g)
+    diff_5g = _diff_cells(prev_df_5g, df_5g)
+    if diff_4g is None or diff_5g is None:
+        return full_analysis("小区名称存在重复")
+    pos_in_prev_4g, changed_4g, _ = diff_4g
+    pos_in_prev_5g, changed_5g, removed_or_modified_5g = diff_5g
+
+    # 距离相同的5G小区按行号取最小者，未变化5G小区的相对顺序改变会影响结果，此时不能复用
+    kept_positions = pos_in_prev_5g[~changed_5g]
+    if np.any(np.diff(kept_positions) <= 0):
+        return full_analysis("5G工参表行顺序变化")
+
+    lat_4g = df_4g['纬度'].to_numpy(dtype=np.float64)
+    lon_4g = df_4g['经度'].to_numpy(dtype=np.float64)
+    azimuth_4g = df_4g['方位角'].to_numpy(dtype=np.float64)
+    lat_5g = df_5g['纬度'].to_numpy(dtype=np.float64)
+    lon_5g = df_5g['经度'].to_numpy(dtype=np.float64)
+    azimuth_5g = df_5g['方位角'].to_numpy(dtype=np.float64)
+    names_5g = df_5g['小区名称'].to_numpy(dtype=object)
+
+    # 变化5G小区的新旧位置
+    changed_lat = np.concatenate([lat_5g[changed_5g],
+                                  prev_df_5g['纬度'].to_numpy(dtype=np.float64)[removed_or_modified_5g]])
+    changed_lon = np.concatenate([lon_5g[changed_5g],
+                                  prev_df_5g['经度'].to_numpy(dtype=np.float64)[removed_or_modified_5g]])
+    dirty = changed_4g.copy()
+    if len(changed_lat):
+        changed_index = build_spatial_index(changed_lat, changed_lon, d_non_colo)
+        dirty |= changed_index.any_within(lat_4g, lon_4g, d_non_colo)
+
+    # 未受影响的4G小区沿用上次结果
+    reuse = pos_in_prev_4g[~dirty]
+    categories = np.empty(len(df_4g), dtype=np.int8)
+    suggested = np.empty(len(df_4g), dtype=object)
+    min_dist = np.empty(len(df_4g))
+    angle_diff = np.empty(len(df_4g))
+    counts = np.empty(len(df_4g), dtype=np.intp)
+    categories[~dirty] = prev_results['分析类别'].cat.codes.to_numpy()[reuse]
+    suggested[~dirty] = prev_results['建议分流小区'].to_numpy(dtype=object)[reuse]
+    min_dist[~dirty] = prev_results['最近距离(m)'].fillna(np.inf).to_numpy()[reuse]
+    angle_diff[~dirty] = prev_results['方位角夹角(°)'].fillna(np.inf).to_numpy()[reuse]
+    counts[~dirty] = prev_results['范围内5G小区数'].to_numpy()[reuse]
+
+    dirty_rows = np.flatnonzero(dirty)
+    if len(dirty_rows):
+        if df_5g.empty:
+            nearest = np.full(len(dirty_rows), -1, dtype=np.intp)
+            dirty_dist = np.full(len(dirty_rows), np.inf)
+            dirty_angle = np.full(len(dirty_rows), np.inf)
+            dirty_counts = np.zeros(len(dirty_rows), dtype=np.intp)
+        elif workers != 1:
+            from parallel import match_nearest_parallel
+            nearest, dirty_dist, dirty_angle, dirty_counts = match_nearest_parallel(
+                lat_4g[dirty_rows], lon_4g[dirty_rows], azimuth_4g[dirty_rows], lat_5g, lon_5g, azimuth_5g,
+                d_non_colo, workers, progress_callback)
+        else:
+            index_5g = _get_index(df_5g, lat_5g, lon_5g, index_cache, d_non_colo)
+            nearest, dirty_dist, dirty_angle, dirty_counts = _match_nearest(
+                lat_4g[dirty_rows], lon_4g[dirty_rows], azimuth_4g[dirty_rows], index_5g,
+                lat_5g, lon_5g, azimuth_5g, d_non_colo, progress_callback)
+        dirty_categories = _classify(dirty_dist, dirty_angle, dirty_counts, d_colo, theta_colo, d_non_colo,
+                                     n_non_colo)
+        has_suggestion = (dirty_categories != CATEGORY_PLANNING) & (nearest >= 0)
+        dirty_suggested = np.full(len(dirty_rows), np.nan, dtype=object)
+        dirty_suggested[has_suggestion] = names_5g[nearest[has_suggestion]]
+
+        categories[dirty_rows] = dirty_categories
+        suggested[dirty_rows] = dirty_suggested
+        min_dist[dirty_rows] = dirty_dist
+        angle_diff[dirty_rows] = dirty_angle
+        counts[dirty_rows] = dirty_counts
+
+    # 类别顺序与完整分析一致(按5G表中首次出现的顺序)
+    suggested = pd.Categorical(suggested, categories=pd.factorize(names_5g)[1])
+    results_df = _assemble_results(df_4g, categories, suggested, min_dist, angle_diff, counts)
+    if progress_callback:
+        progress_callback(len(df_4g), len(df_4g))
+    results_df.attrs['params'] = params
+    results_df.attrs['incremental'] = {'recomputed': len(dirty_rows), 'reason': "增量分析"}
+    return results_df
+
+
+def analyze_5g_offload_chunks(chunks_4g, df_5g, d_colo, theta_colo, d_non_colo, n_non_colo, index_cache=None):
+    """
+    流式分析：chunks_4g 为4G工参DataFrame分块的可迭代对象，5G索引只构建一次，
+    每处理完一块就产出该块的结果DataFrame，内存占用只与块大小有关。
+    """
+    _clean_coordinates(df_5g)
+    lat_5g = df_5g['纬度'].to_numpy(dtype=np.float64)
+    lon_5g = df_5g['经度'].to_numpy(dtype=np.float64)
+    azimuth_5g = df_5g['方位角'].to_numpy(dtype=np.float64)
+    names_5g = df_5g['小区名称'].to_numpy(dtype=object)
+    index_5g = _get_index(df_5g, lat_5g, lon_5g, index_cache, d_non_colo) if not df_5g.empty else None
+
+    for chunk_4g in chunks_4g:
+        _clean_coordinates(chunk_4g)
+        total_rows = len(chunk_4g)
+        if df_5g.empty:
+            nearest = np.full(total_rows, -1, dtype=np.intp)
+            min_dist = np.full(total_rows, np.inf)
+            angle_diff = np.full(total_rows, np.inf)
+            counts = np.zeros(total_rows, dtype=np.intp)
+        else:
+            nearest, min_dist, angle_diff, counts = _match_nearest(
+                chunk_4g['纬度'].to_numpy(dtype=np.float64), chunk_4g['经度'].to_numpy(dtype=np.float64),
+                chunk_4g['方位角'].to_numpy(dtype=np.float64), index_5g, lat_5g, lon_5g, azimuth_5g, d_non_colo)
+        categories = _classify(min_dist, angle_diff, counts, d_colo, theta_colo, d_non_colo, n_non_colo)
+        yield _format_results(chunk_4g, categories, nearest, min_dist, angle_diff, counts, names_5g)
+
+
+def make_param_grid(d_colo, theta_colo, d_non_colo, n_non_colo):
+    """由每个参数的取值列表(或单个值)生成参数组合列表，供 sweep_5g_offload 使用"""
+    values = [v if isinstance(v, (list, tuple, range, np.ndarray)) else [v]
+              for v in (d_colo, theta_colo, d_non_colo, n_non_colo)]
+    return [dict(zip(PARAM_NAMES, combo)) for combo in product(*values)]
+
+
+class SweepResult:
+    """
+    参数扫描结果。summary 为每组参数的分类数量表，results(i) 按需生成第i组参数的完整结果。
+    每个4G小区的候选5G小区按距离升序保存，分类时只需对预先算好的数组做掩码运算。
+    """
+
+    def __init__(self, df_4g, names_5g, param_sets, counts, indices, distances, angles):
+        self.df_4g = df_4g
+        self.names_5g = names_5g
+        self.param_sets = param_sets
+        self.candidate_counts = counts
+        self.candidate_indices = indices
+        self.candidate_distances = distances
+        self.candidate_angles = angles
+        self._rows = np.repeat(np.arange(len(counts)), counts)
+
+        # 候选按距离升序排列，每行第一个候选即最大搜索半径内的最近5G小区
+        self._first = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.intp)
+        has_candidates = counts > 0
+        self._nearest_dist = np.full(len(counts), np.inf)
+        self._nearest_idx = np.full(len(counts), -1, dtype=np.intp)
+        self._nearest_angle = np.full(len(counts), np.inf)
+        first = self._first[has_candidates]
+        self._nearest_dist[has_candidates] = distances[first]
+        self._nearest_idx[has_candidates] = indices[first]
+        self._nearest_angle[has_candidates] = angles[first]
+
+        self.summary = self._build_summary()
+
+    def _classify_set(self, params):
+        d_non_colo = params['d_non_colo']
+        counts = np.bincount(self._rows[self.candidate_distances <= d_non_colo],
+                             minlength=len(self.candidate_counts))
+        # 最近小区超出本组搜索半径时视为无候选，与单次分析的结果一致
+        in_range = self._nearest_dist <= d_non_colo
+        min_dist = np.where(in_range, self._nearest_dist, np.inf)
+        angle_diff = np.where(in_range, self._nearest_angle, np.inf)
+        nearest = np.where(in_range, self._nearest_idx, -1)
+        categories = _classify(min_dist, angle_diff, counts, params['d_colo'], params['theta_colo'],
+                               d_non_colo, params['n_non_colo'])
+        return categories, nearest, min_dist, angle_diff, counts
+
+    def _build_summary(self):
+        rows = []
+        for params in self.param_sets:
+            categories = self._classify_set(params)[0]
+            category_counts = np.bincount(categories, minlength=len(CATEGORY_LABELS))
+            row = {name: params[name] for name in PARAM_NAMES}
+            row.update({label: int(category_counts[code]) for code, label in CATEGORY_LABELS.items()})
+            rows.append(row)
+        return pd.DataFrame(rows, columns=PARAM_NAMES + list(CATEGORY_LABELS.values()))
+
+    def results(self, i):
+        """第i组参数的完整分析结果，与 analyze_5g_offload 使用同一组参数的输出一致"""
+        categories, nearest, min_dist, angle_diff, counts = self._classify_set(self.param_sets[i])
+        results_df = _format_results(self.df_4g, categories, nearest, min_dist, angle_diff, counts, self.names_5g)
+        results_df.attrs['params'] = dict(self.param_sets[i])
+        return results_df
+
+
+def sweep_5g_offload(df_4g, df_5g, param_sets, progress_callback=None, index_cache=None):
+    """
+    参数扫描：只按参数组合中最大的 d_non_colo 做一次近邻搜索，
+    保存每个4G小区按距离排序的候选距离和夹角，再逐组参数分类。
+    """
+    if not param_sets:
+        raise ValueError("参数组合不能为空！")
+    _clean_coordinates(df_4g)
+    _clean_coordinates(df_5g)
+
+    total_rows = len(df_4g)
+    lat_4g = df_4g['纬度'].to_numpy(dtype=np.float64)
+    lon_4g = df_4g['经度'].to_numpy(dtype=np.float64)
+    azimuth_4g = df_4g['方位角'].to_numpy(dtype=np.float64)
+    lat_5g = df_5g['纬度'].to_numpy(dtype=np.float64)
+    lon_5g = df_5g['经度'].to_numpy(dtype=np.float64)
+    azimuth_5g = df_5g['方位角'].to_numpy(dtype=np.float64)
+    names_5g = df_5g['小区名称'].to_numpy(dtype=object)
+    max_radius = max(params['d_non_colo'] for params in param_sets)
+
+    counts = np.zeros(total_rows, dtype=np.intp)
+    indices_parts, distance_parts = [], []
+    if not df_5g.empty:
+        index_5g = _get_index(df_5g, lat_5g, lon_5g, index_cache, max_radius)
+        for start in range(0, total_rows, CHUNK_SIZE):
+            end = min(start + CHUNK_SIZE, total_rows)
+            chunk = slice(start, end)
+            chunk_counts, indices, distances = index_5g.query_radius(lat_4g[chunk], lon_4g[chunk], max_radius)
+            counts[chunk] = chunk_counts
+            indices_parts.append(indices)
+            distance_parts.append(distances)
             if progress_callback:
-                progress_callback(idx + 1, total_rows)
-    
-    return pd.DataFrame(results)
\ No newline at end of file
+                progress_callback(end, total_rows)
+
+    indices = np.concatenate(indices_parts) if indices_parts else np.empty(0, dtype=np.intp)
+    distances = np.concatenate(distance_parts) if distance_parts else np.empty(0)
+
+    # 每行内按(距离, 5G索引)排序，距离相同时与单次分析一样取索引最小者
+    rows = np.repeat(np.arange(total_rows), counts)
+    order = np.lexsort((indices, distances, rows))
+    indices, distances = indices[order], distances[order]
+    angles = calculate_azimuth_difference_batch(azimuth_4g[rows], azimuth_5g[indices])
+
+    return SweepResult(df_4g, names_5g, list(param_sets), counts, indices, distances, angles)
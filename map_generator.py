@@ -3,410 +3,885 @@ import streamlit as st
 import folium
 from streamlit_folium import folium_static
 import logging
+import base64
+import html
+import json
+import os
 import numpy as np
-from functools import lru_cache
+from branca.element import Element, MacroElement
+from folium.utilities import JsCode
+from jinja2 import Template
+from algorithms import (create_sector_polygon_batch, SECTOR_EARTH_RADIUS_M, SECTOR_RADIUS_4G_M, SECTOR_RADIUS_5G_M,
+                        SECTOR_ANGLE_DEG, SECTOR_STEPS)
+from main_analyzer import RESULT_COLUMNS, format_analysis_text
+from tiles import build_tile_pyramid, fingerprint_sources, open_tile_pyramid, DEFAULT_MAX_ZOOM, DEFAULT_MIN_ZOOM
+from search_index import SearchIndex
+from datasets import Dataset, StageCache, as_dataset, as_frame
+
+# 扇区顶点坐标保留的小数位数
+GEOJSON_DECIMALS = 5
+# 缓存的坐标清洗结果数量(4G、5G各占一个)
+COORDS_CACHE_SIZE = 8
+# 缓存的扇区几何(SectorGeometryStore)数量
+GEOMETRY_STORE_CACHE_SIZE = 4
+# 缓存的底图页面数量(大区域的页面有几十MB)
+BASE_MAP_CACHE_SIZE = 2
+# 缓存的瓦片金字塔句柄数量(按4G/5G小区和分析结果数据集指纹)
+TILE_PYRAMID_CACHE_SIZE = 4
+# 搜索定位时的缩放级别，以及地图上最多标记的搜索结果数
+SEARCH_ZOOM = 15
+MAP_SEARCH_LIMIT = 200
+# 分级显示(LOD)：小区总数超过该值时自动启用，低于LOD_MIN_ZOOM级只显示网格汇总，
+# 达到该级别后只把视野内的扇区(最多LOD_MAX_FEATURES个)加入地图
+LOD_AUTO_CELLS = 20000
+LOD_MIN_ZOOM = 14
+LOD_MAX_FEATURES = 5000
+# 汇总网格边长(度)，约1公里
+AGGREGATE_CELL_DEG = 0.01
+# 扇区绘制方式：geojson 在服务端生成扇区顶点(各图层共用一份)；canvas 只传输每个小区的经纬度和方位角，由浏览器生成扇区
+# tiles 不传输扇区矢量数据，扇区以预渲染的栅格瓦片图层显示(见 tiles.py)
+RENDER_MODES = ('geojson', 'canvas', 'tiles')
+# canvas 模式的量化精度：经纬度以1e-5度(约1米)为单位存为int32，方位角以0.1度为单位存为uint16
+CANVAS_COORD_SCALE = 10 ** GEOJSON_DECIMALS
+CANVAS_AZIMUTH_SCALE = 10
+
+# canvas 模式的浏览器端插件：解码base64数据，按与 create_sector_polygon_batch 相同的公式生成扇区
+SECTOR_CANVAS_JS = """
+window.SectorCanvas = window.SectorCanvas || (function() {
+    function decode(payload, count) {
+        var raw = atob(payload);
+        var bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) { bytes[i] = raw.charCodeAt(i); }
+        return {
+            lon: new Int32Array(bytes.buffer, 0, count),
+            lat: new Int32Array(bytes.buffer, 4 * count, count),
+            azimuth: new Uint16Array(bytes.buffer, 8 * count, count)
+        };
+    }
+    function prepare(options) {
+        var data = decode(options.payload, options.count);
+        var angle = options.angle * Math.PI / 180;
+        var cosOffsets = [], sinOffsets = [];
+        for (var k = 0; k <= options.steps; k++) {
+            var offset = angle * (k / options.steps - 0.5);
+            cosOffsets.push(Math.cos(offset));
+            sinOffsets.push(Math.sin(offset));
+        }
+        var latScale = options.radius / options.earthRadius * 180 / Math.PI;
+        return {
+            options: options,
+            latScale: latScale,
+            center: function(i) { return [data.lat[i] / options.coordScale, data.lon[i] / options.coordScale]; },
+            latlngs: function(i) {
+                var lat = data.lat[i] / options.coordScale, lon = data.lon[i] / options.coordScale;
+                var azimuth = data.azimuth[i] / options.azimuthScale * Math.PI / 180;
+                var cosAz = Math.cos(azimuth), sinAz = Math.sin(azimuth);
+                var lonScale = latScale / Math.cos(lat * Math.PI / 180);
+                var latlngs = [[lat, lon]];
+                for (var k = 0; k <= options.steps; k++) {
+                    latlngs.push([lat + latScale * (cosAz * cosOffsets[k] - sinAz * sinOffsets[k]),
+                                  lon + lonScale * (sinAz * cosOffsets[k] + cosAz * sinOffsets[k])]);
+                }
+                return latlngs;
+            }
+        };
+    }
+    function add(group, sectors, i) {
+        var polygon = L.polygon(sectors.latlngs(i), sectors.options.style);
+        polygon.bindTooltip(sectors.options.tooltips[i]);
+        polygon.sectorIndex = i;
+        group.addLayer(polygon);
+    }
+    function build(group, options) {
+        var sectors = prepare(options);
+        // 分级显示时不生成多边形，由 SectorLevelOfDetail 通过 source() 按视野生成
+        if (options.lazy) {
+            group.sectors = sectors;
+            return;
+        }
+        for (var i = 0; i < options.count; i++) { add(group, sectors, i); }
+    }
+    function source(group) {
+        var sectors = group.sectors, count = sectors.options.count;
+        // 扇区范围取以站点为中心、半径为扇区半径的外接矩形，不必先生成顶点
+        var bounds = new Float64Array(4 * count);
+        for (var i = 0; i < count; i++) {
+            var center = sectors.center(i), latScale = sectors.latScale;
+            var lonScale = latScale / Math.cos(center[0] * Math.PI / 180);
+            bounds.set([center[0] - latScale, center[1] - lonScale, center[0] + latScale, center[1] + lonScale], 4 * i);
+        }
+        return {
+            group: group,
+            count: count,
+            bounds: bounds,
+            show: function(i) { add(group, sectors, i); },
+            position: function(shape) { return shape.sectorIndex; },
+            hide: function(shape) { group.removeLayer(shape); }
+        };
+    }
+    return {build: build, source: source};
+})();
+"""
+
+# geojson 模式的浏览器端插件：SectorLayer 的要素只带扇区序号(feature.id)、属性和空多边形，
+# 加入图层前从共用的顶点数组中取出扇区坐标填入
+SECTOR_GEOMETRY_JS = """
+window.SectorGeometry = window.SectorGeometry || (function() {
+    var deferred = {};
+    function attach(sectors, feature) {
+        var ring = sectors[feature.id], coordinates = [];
+        for (var k = 0; k < ring.length; k += 2) { coordinates.push([ring[k], ring[k + 1]]); }
+        coordinates.push(coordinates[0]);
+        feature.geometry.coordinates = [coordinates];
+        return feature;
+    }
+    function filter(sectors, feature, lazy) {
+        if (feature.geometry.coordinates.length) { return true; }
+        // 分级显示时先不生成多边形，要素留给 SectorLevelOfDetail 通过 source() 按视野加入
+        if (lazy) {
+            (deferred[lazy] = deferred[lazy] || []).push(feature);
+            return false;
+        }
+        attach(sectors, feature);
+        return true;
+    }
+    function source(sectors, layer, lazy) {
+        var features = deferred[lazy] || [], index = {};
+        delete deferred[lazy];
+        // 扇区范围由共用的顶点数组算出，不生成多边形
+        var bounds = new Float64Array(4 * features.length);
+        features.forEach(function(feature, i) {
+            var ring = sectors[feature.id], south = Infinity, west = Infinity, north = -Infinity, east = -Infinity;
+            for (var k = 0; k < ring.length; k += 2) {
+                west = Math.min(west, ring[k]);
+                east = Math.max(east, ring[k]);
+                south = Math.min(south, ring[k + 1]);
+                north = Math.max(north, ring[k + 1]);
+            }
+            bounds.set([south, west, north, east], 4 * i);
+            index[feature.id] = i;
+        });
+        return {
+            group: layer,
+            count: features.length,
+            bounds: bounds,
+            show: function(i) { layer.addData(attach(sectors, features[i])); },
+            position: function(shape) { return index[shape.feature.id]; },
+            hide: function(shape) {
+                layer.removeLayer(shape);
+                shape.feature.geometry.coordinates = [];
+            }
+        };
+    }
+    return {attach: attach, filter: filter, source: source};
+})();
+"""
+
+# 各类小区的颜色
+COLOR_MAP = {
+    '4G小区': '#336699',            # 蓝色
+    '5G小区': '#FF0000',            # 红色
+    '共站址5G分流小区': '#28a745',  # 绿色
+    '共站址射频调优小区': '#ffc107',  # 黄色
+    '非共站址5G分流小区': '#17a2b8',  # 青色
+    '需要5G规划建设小区': '#800080',  # 紫色
+    '其他': '#6c757d'             # 灰色
+}
+# 分析类别 -> 图层显示名称
+CATEGORY_LAYER_NAMES = {
+    '共站址5G分流小区': '共站址5G分流小区',
+    '共站址5G射频调优小区': '共站址射频调优小区',
+    '非共站址5G分流小区': '非共站址5G分流小区',
+    '5G规划建设': '需要5G规划建设小区',
+}
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-@st.cache_data
-def convert_coords_for_folium(_df):
-    """转换坐标为folium使用的WGS84坐标系"""
-    if _df is None or _df.empty:
-        return pd.DataFrame()
-    
-    df = _df.copy()
+def _clean_coords(df):
+    """数值类型转换并去掉坐标无效的行；浅拷贝后整列替换，不修改传入的表"""
+    df = df.copy(deep=False)
     df['经度'] = pd.to_numeric(df['经度'], errors='coerce')
     df['纬度'] = pd.to_numeric(df['纬度'], errors='coerce')
     df['方位角'] = pd.to_numeric(df['方位角'], errors='coerce')
     df.dropna(subset=['经度', '纬度', '方位角'], inplace=True)
-    
     return df
 
-# 缓存装饰器，避免重复计算相同的扇形
-@lru_cache(maxsize=10000)
-def get_point_at_distance_cached(lon, lat, distance_m, angle_deg):
-    """根据距离和角度获取新的坐标，使用缓存避免重复计算"""
-    import math
-    EARTH_RADIUS = 6378137.0
+
+_coords_cache = StageCache('坐标清洗', COORDS_CACHE_SIZE)
+
+
+def clean_coords_dataset(dataset):
+    """清洗坐标后的数据集句柄，按输入数据集指纹缓存"""
+    if dataset is None:
+        return None
+    return _coords_cache.get([dataset], lambda: dataset.derive(_clean_coords(dataset.view()), '坐标清洗'))
+
+
+def convert_coords_for_folium(_df):
+    """转换坐标为folium使用的WGS84坐标系"""
+    # 不使用st.cache_data：每次重跑都要哈希整张表并深拷贝结果。传入 Dataset 时按其指纹缓存，返回只读视图
+    if _df is None or _df.empty:
+        return pd.DataFrame()
+    if isinstance(_df, Dataset):
+        return clean_coords_dataset(_df).view()
+    return _clean_coords(_df)
+
+class SectorGeometryStore:
+    """
+    一次分析的扇区几何：4G小区在前、5G小区在后，扇区序号为小区在该顺序中的位置。
+    每个小区的扇区顶点只计算一次，并预先序列化为JSON，地图中各图层只引用扇区序号。
+    """
+
+    def __init__(self, df_4g, df_5g):
+        self.n_4g = 0 if df_4g is None else len(df_4g)
+        self.n_5g = 0 if df_5g is None else len(df_5g)
+        frames = [df for df in (df_4g, df_5g) if df is not None and len(df)]
+        columns = {col: np.concatenate([df[col].to_numpy(dtype=np.float64) for df in frames]) if frames else np.empty(0)
+                   for col in ('经度', '纬度', '方位角')}
+        radius = np.repeat([float(SECTOR_RADIUS_4G_M), float(SECTOR_RADIUS_5G_M)], [self.n_4g, self.n_5g])
+        # 去掉闭合点(浏览器端补上)，每个扇区存为 [经度, 纬度, 经度, 纬度, ...]，与GeoJSON的坐标顺序一致
+        sectors = create_sector_polygon_batch(columns['经度'], columns['纬度'], columns['方位角'], radius,
+                                              SECTOR_ANGLE_DEG)[:, :-1, :]
+        # 保留5位小数(约1米)，对几百米的扇区足够精确，同时减小页面体积
+        self.vertices = np.round(sectors, GEOJSON_DECIMALS)
+        self.json = json.dumps(self.vertices.reshape(len(self.vertices), -1).tolist(), separators=(',', ':'))
+
+    def __len__(self):
+        return self.n_4g + self.n_5g
+
+
+_geometry_cache = StageCache('扇区几何', GEOMETRY_STORE_CACHE_SIZE)
+
+
+def get_geometry_store(df_4g, df_5g):
+    """按4G/5G小区数据集指纹缓存的 SectorGeometryStore，同一分析结果重新生成地图(如搜索)时直接复用"""
+    ds_4g, ds_5g = as_dataset(df_4g), as_dataset(df_5g)
+    return _geometry_cache.get([ds_4g, ds_5g], lambda: SectorGeometryStore(as_frame(ds_4g), as_frame(ds_5g)))
+
+
+class SectorGeometry(MacroElement):
+    """把 SectorGeometryStore 的扇区顶点写入页面一次，供各 SectorLayer 按扇区序号引用"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = {{ this.store.json }};
+        {% endmacro %}
+    """)
+
+    def __init__(self, store):
+        super().__init__()
+        self._name = 'SectorGeometry'
+        self.store = store
+
+    def render(self, **kwargs):
+        self.get_root().header.add_child(Element(f'<script>{SECTOR_GEOMETRY_JS}</script>'), name='sector_geometry_js')
+        super().render(**kwargs)
+
+
+class SectorLayer(folium.GeoJson):
+    """
+    geojson 模式的扇区图层，即普通的 folium.GeoJson(整层一个样式，GeoJsonTooltip 显示提示信息)，
+    只是要素的多边形不带坐标：feature.id 为扇区序号，加入图层时由 filter 从 SectorGeometry 中取出扇区坐标，
+    4G小区图层和各分析类别图层共用同一份顶点，页面中不重复嵌入坐标。
+    lazy 为真(分级显示)时加载页面不生成多边形，由 SectorLevelOfDetail 按视野加入。
+    """
+
+    def __init__(self, geometry, cells, properties, tooltip_fields, color, lazy=False):
+        style = {'color': color, 'fillColor': color, 'fillOpacity': 0.3, 'weight': 2, 'opacity': 0.8}
+        features = [{'type': 'Feature', 'id': cell, 'geometry': {'type': 'Polygon', 'coordinates': []},
+                     'properties': props}
+                    for cell, props in zip(np.asarray(cells).tolist(), properties)]
+        super().__init__(
+            {'type': 'FeatureCollection', 'features': features},
+            style_function=lambda feature: style,
+            tooltip=folium.GeoJsonTooltip(fields=list(tooltip_fields), aliases=list(tooltip_fields.values())),
+        )
+        self.geometry = geometry
+        self.lazy = lazy
+        # 延迟加入的要素按图层名称暂存，filter 在 super().__init__ 之后才能引用图层名称
+        deferred = json.dumps(self.get_name()) if lazy else 'null'
+        self.options['filter'] = JsCode(
+            f'function(feature) {{ return SectorGeometry.filter({geometry.get_name()}, feature, {deferred}); }}')
+
+    def lod_source(self):
+        """SectorLevelOfDetail 使用的扇区来源(JS表达式)"""
+        return f'SectorGeometry.source({self.geometry.get_name()}, {self.get_name()}, {json.dumps(self.get_name())})'
+
+    def _get_self_bounds(self):
+        # 要素中没有坐标，范围由扇区顶点给出
+        cells = [feature['id'] for feature in self.data['features']]
+        if not cells:
+            return [[None, None], [None, None]]
+        vertices = self.geometry.store.vertices[cells]
+        return [[float(vertices[..., 1].min()), float(vertices[..., 0].min())],
+                [float(vertices[..., 1].max()), float(vertices[..., 0].max())]]
+
+
+def sector_properties(df, tooltip_fields):
+    """每个小区的提示字段(转为文本)，tooltip_fields 为 {列名: 提示标签}"""
+    columns = [df[col].astype(str).tolist() for col in tooltip_fields]
+    return [dict(zip(tooltip_fields, values)) for values in zip(*columns)]
+
+
+def sector_tooltips(df, tooltip_fields):
+    """每个小区的提示信息HTML，tooltip_fields 为 {列名: 提示标签}"""
+    columns = [df[col].astype(str).tolist() for col in tooltip_fields]
+    return ['<br>'.join(f'{html.escape(label)} {html.escape(value)}' for label, value in zip(tooltip_fields.values(), values))
+            for values in zip(*columns)]
+
+
+def sector_payload(df):
+    """
+    canvas 模式的紧凑数据：经度、纬度(int32，1e-5度)和方位角(uint16，0.1度)三段小端序数组拼接后base64编码，
+    每个小区10字节。
+    """
+    lon = np.round(df['经度'].to_numpy(dtype=np.float64) * CANVAS_COORD_SCALE).astype('<i4')
+    lat = np.round(df['纬度'].to_numpy(dtype=np.float64) * CANVAS_COORD_SCALE).astype('<i4')
+    azimuth = np.round(np.mod(df['方位角'].to_numpy(dtype=np.float64), 360) * CANVAS_AZIMUTH_SCALE).astype('<u2')
+    return base64.b64encode(lon.tobytes() + lat.tobytes() + azimuth.tobytes()).decode('ascii')
+
+
+class SectorCanvas(MacroElement):
+    """
+    canvas 模式的扇区图层：页面中只嵌入 sector_payload 和提示文本，浏览器端由 SECTOR_CANVAS_JS 生成扇区，
+    地图启用了 prefer_canvas，扇区绘制在canvas上。lazy 为真(分级显示)时加载页面不生成多边形。
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.featureGroup().addTo({{ this._parent.get_name() }});
+        SectorCanvas.build({{ this.get_name() }}, {{ this.options|tojson }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, df, radius_m, color, tooltip_fields, lazy=False):
+        super().__init__()
+        self._name = 'SectorCanvas'
+        self.options = {
+            'payload': sector_payload(df),
+            'count': len(df),
+            'tooltips': sector_tooltips(df, tooltip_fields),
+            'radius': float(radius_m),
+            'angle': float(SECTOR_ANGLE_DEG),
+            'steps': SECTOR_STEPS,
+            'earthRadius': SECTOR_EARTH_RADIUS_M,
+            'coordScale': CANVAS_COORD_SCALE,
+            'azimuthScale': CANVAS_AZIMUTH_SCALE,
+            'style': {'color': color, 'fillColor': color, 'fillOpacity': 0.3, 'weight': 2, 'opacity': 0.8},
+            'lazy': bool(lazy),
+        }
+
+    def lod_source(self):
+        """SectorLevelOfDetail 使用的扇区来源(JS表达式)"""
+        return f'SectorCanvas.source({self.get_name()})'
+
+    def render(self, **kwargs):
+        self.get_root().header.add_child(Element(f'<script>{SECTOR_CANVAS_JS}</script>'), name='sector_canvas_js')
+        super().render(**kwargs)
+
+
+def add_sector_layer(layer, df, radius_m, color, tooltip_fields, render_mode='geojson', geometry=None, lazy=False):
+    """
+    按 render_mode 把df中全部小区的扇区加入layer，返回生成的图层元素；
+    geojson 模式从 geometry (SectorGeometry) 中按df的 '扇区序号' 列引用扇区顶点。
+    lazy 为真时扇区由 SectorLevelOfDetail 按视野生成。
+    """
+    if render_mode == 'canvas':
+        element = SectorCanvas(df, radius_m, color, tooltip_fields, lazy)
+    else:
+        element = SectorLayer(geometry, df['扇区序号'].to_numpy(), sector_properties(df, tooltip_fields), tooltip_fields,
+                              color, lazy)
+    element.add_to(layer)
+    return element
+
+
+def _hex_to_rgb(color):
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def sector_tile_cells(df_4g, df_5g, results_df):
+    """
+    瓦片金字塔的小区数据和配色：与矢量图层的叠放顺序一致，依次为全部4G小区、5G小区、各分析类别的4G小区，
+    返回(小区数组字典, RGB颜色列表)。
+    """
+    layers = [('4G小区', df_4g, SECTOR_RADIUS_4G_M), ('5G小区', df_5g, SECTOR_RADIUS_5G_M)]
+    if df_4g is not None and not df_4g.empty and results_df is not None and not results_df.empty:
+        df_4g_with_result = pd.merge(df_4g, results_df[['小区名称', '分析类别']], on='小区名称', how='inner')
+        for category, layer_name in CATEGORY_LAYER_NAMES.items():
+            layers.append((layer_name, df_4g_with_result[df_4g_with_result['分析类别'] == category],
+                           SECTOR_RADIUS_4G_M))
+
+    parts = {name: [] for name in ('lon', 'lat', 'azimuth', 'radius', 'style')}
+    colors = []
+    for style, (layer_name, df, radius_m) in enumerate(layers):
+        colors.append(_hex_to_rgb(COLOR_MAP[layer_name]))
+        n = 0 if df is None else len(df)
+        if n == 0:
+            continue
+        parts['lon'].append(df['经度'].to_numpy(dtype=np.float64))
+        parts['lat'].append(df['纬度'].to_numpy(dtype=np.float64))
+        parts['azimuth'].append(df['方位角'].to_numpy(dtype=np.float64))
+        parts['radius'].append(np.full(n, float(radius_m)))
+        parts['style'].append(np.full(n, style, dtype=np.uint8))
+    cells = {name: np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint8 if name == 'style' else np.float64)
+             for name, arrays in parts.items()}
+    return cells, colors
+
+
+_tile_pyramid_cache = StageCache('扇区瓦片', TILE_PYRAMID_CACHE_SIZE)
+
+
+def build_sector_tiles(df_4g, df_5g, results_df, previous=None, workers=None, progress_callback=None,
+                       max_zoom=DEFAULT_MAX_ZOOM):
+    """
+    生成(或复用)扇区瓦片金字塔，返回 tiles.TilePyramid；previous 为上一版金字塔的指纹，
+    数据部分变化时只重画受影响的瓦片。输入均为 Dataset (或None)时金字塔句柄按数据集指纹缓存，
+    金字塔指纹也由数据集指纹得到，页面重跑(如搜索)时不合并、不哈希小区数据；
+    传入 DataFrame 时按小区数据内容计算指纹。
+    """
+    sources = (df_4g, df_5g, results_df)
+
+    def build(fingerprint=None):
+        cells, colors = sector_tile_cells(convert_coords_for_folium(df_4g), convert_coords_for_folium(df_5g),
+                                          as_frame(results_df))
+        return build_tile_pyramid(cells, colors, previous=previous, workers=workers,
+                                  progress_callback=progress_callback, max_zoom=max_zoom, fingerprint=fingerprint)
+
+    if not all(source is None or isinstance(source, Dataset) for source in sources):
+        return build()
+
+    def open_or_build():
+        fingerprint = fingerprint_sources(['' if source is None else source.key for source in sources],
+                                          [COLOR_MAP, CATEGORY_LAYER_NAMES, SECTOR_RADIUS_4G_M, SECTOR_RADIUS_5G_M],
+                                          DEFAULT_MIN_ZOOM, max_zoom)
+        return open_tile_pyramid(fingerprint, max_zoom=max_zoom) or build(fingerprint)
+
+    pyramid = _tile_pyramid_cache.get(sources, open_or_build, max_zoom)
+    if not os.path.isdir(pyramid.path):
+        # 缓存的金字塔已被磁盘淘汰(只保留最近的几套)，重新生成
+        _tile_pyramid_cache.discard(sources, max_zoom)
+        pyramid = _tile_pyramid_cache.get(sources, open_or_build, max_zoom)
+    if progress_callback:
+        progress_callback(1, 1)
+    return pyramid
+
+
+def aggregate_feature_collection(df_4g_with_result, df_5g, color_map, category_names, cell_deg=AGGREGATE_CELL_DEG):
+    """
+    低缩放级别使用的网格汇总：按 cell_deg 度的网格统计各分析类别的4G小区数和5G小区数，
+    每个有小区的网格一个矩形要素，颜色取数量最多的分析类别，透明度随4G小区数增加。
+    category_names 为 {分析类别: 图层显示名称}。
+    """
+    categories = list(category_names)
+    lat = np.concatenate([df_4g_with_result['纬度'].to_numpy(dtype=np.float64), df_5g['纬度'].to_numpy(dtype=np.float64)])
+    lon = np.concatenate([df_4g_with_result['经度'].to_numpy(dtype=np.float64), df_5g['经度'].to_numpy(dtype=np.float64)])
+    if len(lat) == 0:
+        return {'type': 'FeatureCollection', 'features': []}
+    # 每行的统计列：4G按分析类别编码，5G统一计入最后一列
+    n_4g = len(df_4g_with_result)
+    codes = np.full(len(lat), len(categories), dtype=np.intp)
+    if n_4g:
+        codes[:n_4g] = pd.Categorical(df_4g_with_result['分析类别'], categories=categories).codes
+
+    grid = np.column_stack([np.floor(lat / cell_deg), np.floor(lon / cell_deg)]).astype(np.int64)
+    cells, inverse = np.unique(grid, axis=0, return_inverse=True)
+    counts = np.zeros((len(cells), len(categories) + 1), dtype=np.int64)
+    np.add.at(counts, (inverse.ravel(), codes), 1)
+
+    totals_4g = counts[:, :-1].sum(axis=1)
+    dominant = counts[:, :-1].argmax(axis=1)
+    density = np.clip(np.log1p(totals_4g) / np.log1p(max(totals_4g.max(), 1)), 0, 1)
+    features = []
+    for (row, col), cell_counts, total, top, alpha in zip(cells.tolist(), counts.tolist(), totals_4g.tolist(),
+                                                           dominant.tolist(), density.tolist()):
+        south, west = row * cell_deg, col * cell_deg
+        ring = [[west, south], [west + cell_deg, south], [west + cell_deg, south + cell_deg],
+                [west, south + cell_deg], [west, south]]
+        properties = {category_names[category]: count for category, count in zip(categories, cell_counts)}
+        properties.update({'4G小区数': total, '5G小区数': cell_counts[-1],
+                           'color': color_map[category_names[categories[top]]] if total else color_map['5G小区'],
+                           'opacity': round(0.2 + 0.5 * alpha, 1)})
+        features.append({'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+                         'properties': properties})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+class SectorLevelOfDetail(MacroElement):
+    """
+    扇区图层的分级显示：缩放级别低于min_zoom时隐藏扇区、显示网格汇总图层；
+    达到min_zoom后每次移动地图只为视野内的扇区生成多边形(总数不超过max_features)，离开视野的扇区移除并释放。
+    detail_layers 为以 lazy=True 创建的 SectorLayer/SectorCanvas，页面加载时只计算各扇区的范围。
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var overview = {{ this.overview.get_name() }};
+            var minZoom = {{ this.min_zoom }};
+            var maxFeatures = {{ this.max_features }};
+            // 各图层的扇区来源：范围数组(南、西、北、东)和按序号生成/移除多边形的方法
+            var sources = [{% for layer in this.detail_layers %}{{ layer.lod_source() }}, {% endfor %}];
+            var shown = sources.map(function(source) { return new Uint8Array(source.count); });
+            function update() {
+                var detailed = map.getZoom() >= minZoom;
+                if (detailed) {
+                    map.removeLayer(overview);
+                } else if (!map.hasLayer(overview)) {
+                    map.addLayer(overview);
+                }
+                var view = map.getBounds().pad(0.2);
+                var south = view.getSouth(), west = view.getWest(), north = view.getNorth(), east = view.getEast();
+                var budget = maxFeatures;
+                sources.forEach(function(source, s) {
+                    var bounds = source.bounds, wanted = new Uint8Array(source.count);
+                    for (var i = 0; detailed && i < source.count && budget > 0; i++) {
+                        if (bounds[4 * i] <= north && bounds[4 * i + 2] >= south &&
+                                bounds[4 * i + 1] <= east && bounds[4 * i + 3] >= west) {
+                            wanted[i] = 1;
+                            budget--;
+                        }
+                    }
+                    source.group.eachLayer(function(shape) {
+                        var i = source.position(shape);
+                        if (!wanted[i]) {
+                            source.hide(shape);
+                            shown[s][i] = 0;
+                        }
+                    });
+                    for (var i = 0; i < source.count; i++) {
+                        if (wanted[i] && !shown[s][i]) {
+                            source.show(i);
+                            shown[s][i] = 1;
+                        }
+                    }
+                });
+            }
+            map.on('moveend', update);
+            update();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, detail_layers, overview, min_zoom=LOD_MIN_ZOOM, max_features=LOD_MAX_FEATURES):
+        super().__init__()
+        self._name = 'SectorLevelOfDetail'
+        self.detail_layers = detail_layers
+        self.overview = overview
+        self.min_zoom = int(min_zoom)
+        self.max_features = int(max_features)
+
+def search_overlay_js(map_name, matches):
+    """搜索结果图层的脚本：每个匹配小区(SearchIndex.search 的结果)一个紫色星形标记，地图中心移到排名第一的小区"""
+    points = [[lat, lon, f'搜索结果: {html.escape(name)}']
+              for name, lat, lon in zip(matches['小区名称'].tolist(), matches['纬度'].astype(float).tolist(),
+                                        matches['经度'].astype(float).tolist())]
+    return f"""
+        (function(map, points) {{
+            var icon = L.AwesomeMarkers.icon({{icon: 'star', markerColor: 'purple', prefix: 'fa', iconColor: 'white'}});
+            var layer = L.featureGroup().addTo(map);
+            points.forEach(function(point) {{
+                L.marker([point[0], point[1]], {{icon: icon}}).bindTooltip(point[2]).addTo(layer);
+            }});
+            if (points.length) {{ map.setView([points[0][0], points[0][1]], {SEARCH_ZOOM}); }}
+        }})({map_name}, {json.dumps(points, ensure_ascii=False)});
+    """
+
+
+class SearchOverlay(MacroElement):
+    """搜索结果叠加层，脚本由 search_overlay_js 生成"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        {{ this.script(this._parent.get_name()) }}
+        {% endmacro %}
+    """)
+
+    def __init__(self, matches):
+        super().__init__()
+        self._name = 'SearchOverlay'
+        self.matches = matches
+
+    def script(self, map_name):
+        return search_overlay_js(map_name, self.matches)
+
+
+_base_map_cache = StageCache('地图底图', BASE_MAP_CACHE_SIZE)
+
+
+def _build_base_map(ds_4g, ds_5g, ds_results, lod_zoom, render_mode, tile_pyramid):
+    m = _create_map(ds_4g, ds_5g, ds_results, None, lod_zoom, render_mode, tile_pyramid)
+    page = folium.Figure().add_child(m).render()
+    # 页面在地图脚本之后(</html>之前)断开，搜索结果脚本插在断开处；小区名称搜索索引随底图一起缓存
+    position = page.rfind('</html>')
+    return (page[:position], page[position:], m.get_name(),
+            SearchIndex.from_frames(convert_coords_for_folium(ds_4g), convert_coords_for_folium(ds_5g)))
+
+
+def render_map_html(df_4g, df_5g, results_df, search_name=None, lod_zoom=None, render_mode='geojson',
+                    tile_pyramid=None):
+    """
+    生成地图页面HTML，返回(页面, 搜索结果)。不含搜索结果的底图按4G/5G小区数据集、分析结果的指纹和绘制参数缓存，
+    搜索时只用随底图缓存的 SearchIndex 查找，在底图上追加 search_overlay_js 生成的叠加层脚本，不重新生成地图。
+    数据可以是 Dataset 句柄(直接使用加载时算好的指纹)或 DataFrame(当场计算指纹)。
+    """
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"不支持的扇区绘制方式: {render_mode}，可选: {', '.join(RENDER_MODES)}")
+    datasets = [as_dataset(df) for df in (df_4g, df_5g, results_df)]
+    try:
+        entry = _base_map_cache.get(datasets, lambda: _build_base_map(*datasets, lod_zoom, render_mode, tile_pyramid),
+                                    lod_zoom, render_mode,
+                                    tile_pyramid.fingerprint if tile_pyramid is not None else None)
+    except Exception as e:
+        # 出错的地图不进缓存，下次重跑时重新生成
+        logger.error(f"地图生成错误: {str(e)}")
+        return folium.Figure().add_child(error_map(e)).render(), SearchIndex.from_frames().search(None)
+
+    head, tail, map_name, search_index = entry
+    matches = search_index.search(search_name, MAP_SEARCH_LIMIT)
+    overlay = f'<script>{search_overlay_js(map_name, matches)}</script>\n' if not matches.empty else ''
+    # 一次拼接，大页面只复制一遍
+    return ''.join((head, overlay, tail)), matches
+
+
+def error_map(error):
+    """地图生成出错时显示的基本地图，标出错误信息"""
+    m = folium.Map(location=[22.8170, 108.3661], zoom_start=12)
+    folium.Marker(
+        location=[22.8170, 108.3661],
+        icon=folium.Icon(color='red', icon='exclamation-sign'),
+        tooltip=f"地图生成错误: {str(error)}"
+    ).add_to(m)
+    return m
+
+
+def create_folium_map(df_4g, df_5g, results_df, baidu_ak, search_name=None, lod_zoom=None, render_mode='geojson',
+                      tile_pyramid=None):
+    """
+    使用folium创建地图，显示小区分布和扇区图。
+    lod_zoom 为扇区开始显示的缩放级别，低于该级别只显示网格汇总；None 表示小区总数超过
+    LOD_AUTO_CELLS 时使用 LOD_MIN_ZOOM，否则不分级；0 表示始终显示全部扇区。
+    render_mode 为扇区绘制方式，见 RENDER_MODES；tiles 模式使用 tile_pyramid (build_sector_tiles 的结果)，
+    未提供时当场生成。
+    出错时记录日志并返回 error_map 生成的基本地图。
+    """
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"不支持的扇区绘制方式: {render_mode}，可选: {', '.join(RENDER_MODES)}")
+    try:
+        return _create_map(df_4g, df_5g, results_df, search_name, lod_zoom, render_mode, tile_pyramid)
+    except Exception as e:
+        logger.error(f"地图生成错误: {str(e)}")
+        return error_map(e)
+
+
+def _create_map(df_4g, df_5g, results_df, search_name, lod_zoom, render_mode, tile_pyramid):
+    """create_folium_map 的实现，出错时直接抛出异常(底图缓存不缓存出错的地图)"""
+    # 1. 颜色映射，确保所有指定的小区类型都有对应的颜色
+    color_map = COLOR_MAP
+    
+    # 2. 转换和过滤坐标(清洗结果按数据集指纹缓存，扇区几何也按清洗后的数据集缓存)
+    ds_4g_conv = clean_coords_dataset(as_dataset(df_4g))
+    ds_5g_conv = clean_coords_dataset(as_dataset(df_5g))
+    df_4g_conv = ds_4g_conv.view() if ds_4g_conv is not None else pd.DataFrame()
+    df_5g_conv = ds_5g_conv.view() if ds_5g_conv is not None else pd.DataFrame()
+    results_df = as_frame(results_df)
+    
+    # 3. 初始化地图 - 不设置默认瓦片，后续手动添加
+    m = folium.Map(
+        location=[22.8170, 108.3661],  # 南宁市中心坐标
+        zoom_start=12,  # 初始缩放级别
+        control_scale=True,
+        max_zoom=19,  # 最大缩放级别
+        tiles=None,  # 不使用默认瓦片，后续手动添加
+        zoom_control=True,  # 启用缩放控制
+        attribution_control=False,  # 禁用默认的版权信息
+        min_zoom=10,  # 设置最小缩放级别，避免在低缩放级别显示网格线
+        prefer_canvas=True  # 使用canvas渲染，提高性能并避免显示不必要的网格线
+    )
     
-    lon_rad = math.radians(lon)
-    lat_rad = math.radians(lat)
-    angle_rad = math.radians(angle_deg)
+    # 添加高德基础地图 - 包含详细的街道信息
+    folium.TileLayer(
+        name='高德基础地图',
+        tiles='https://webst0{s}.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=2&style=8&x={x}&y={y}&z={z}',
+        attr='&copy; 高德地图',
+        subdomains=['1', '2', '3', '4'],
+        control=True  # 允许用户控制
+    ).add_to(m)
     
-    # 计算新的纬度
-    new_lat = math.asin(math.sin(lat_rad) * math.cos(distance_m/EARTH_RADIUS) + 
-                       math.cos(lat_rad) * math.sin(distance_m/EARTH_RADIUS) * math.cos(angle_rad))
+    # 添加纯卫星地图 - 不显示网格线和标注
+    folium.TileLayer(
+        name='高德纯卫星地图',
+        tiles='https://webst0{s}.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=2&style=6&x={x}&y={y}&z={z}',
+        attr='&copy; 高德地图',
+        subdomains=['1', '2', '3', '4'],
+        control=True  # 允许用户控制
+    ).add_to(m)
     
-    # 计算新的经度
-    new_lon = lon_rad + math.atan2(math.sin(angle_rad) * math.sin(distance_m/EARTH_RADIUS) * math.cos(lat_rad),
-                                 math.cos(distance_m/EARTH_RADIUS) - math.sin(lat_rad) * math.sin(new_lat))
+    # 添加高德卫星混合地图 - 包含卫星影像和标注
+    folium.TileLayer(
+        name='高德卫星混合地图',
+        tiles='https://webst0{s}.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=2&style=7&x={x}&y={y}&z={z}',
+        attr='&copy; 高德地图',
+        subdomains=['1', '2', '3', '4'],
+        control=True  # 允许用户控制
+    ).add_to(m)
     
-    return math.degrees(new_lon), math.degrees(new_lat)
-
-def get_point_at_distance(lon, lat, distance_m, angle_deg):
-    """包装函数，处理浮点数精度问题后调用缓存函数"""
-    # 限制小数位数，避免因为浮点数精度问题导致缓存失效
-    lon_rounded = round(lon, 6)
-    lat_rounded = round(lat, 6)
-    distance_rounded = round(distance_m)
-    angle_rounded = round(angle_deg, 2)
+    # 4. 创建图层 - 按照要求创建所有需要的图层
+    layer_4g = folium.FeatureGroup(name="4G小区", show=True)
+    layer_5g = folium.FeatureGroup(name="5G小区", show=True)
+    layer_colo_offload = folium.FeatureGroup(name="共站址5G分流小区", show=True)
+    layer_colo_optimize = folium.FeatureGroup(name="共站址射频调优小区", show=True)
+    layer_noncolo_offload = folium.FeatureGroup(name="非共站址5G分流小区", show=True)
+    layer_need_construction = folium.FeatureGroup(name="需要5G规划建设小区", show=True)
     
-    return get_point_at_distance_cached(lon_rounded, lat_rounded, distance_rounded, angle_rounded)
+    # 5. 处理5G小区和扇区：扇区顶点按小区数据缓存、一次批量生成，所有图层按扇区序号共用同一份顶点
+    detail_layers = []
+    vector_sectors = render_mode != 'tiles'
+    # 是否分级显示需在创建扇区图层前确定：分级显示时扇区图层加载页面时不生成多边形
+    n_cells = len(df_4g_conv) + len(df_5g_conv)
+    if lod_zoom is None:
+        lod_zoom = LOD_MIN_ZOOM if n_cells > LOD_AUTO_CELLS else 0
+    lazy = bool(lod_zoom) and vector_sectors
+    df_4g_conv['扇区序号'] = np.arange(len(df_4g_conv))
+    df_5g_conv['扇区序号'] = len(df_4g_conv) + np.arange(len(df_5g_conv))
+    geometry = None
+    if render_mode == 'geojson':
+        geometry = SectorGeometry(get_geometry_store(ds_4g_conv, ds_5g_conv))
+        geometry.add_to(m)
+    if vector_sectors and df_5g_conv is not None and not df_5g_conv.empty:
+        try:
+            detail_layers.append(add_sector_layer(layer_5g, df_5g_conv, SECTOR_RADIUS_5G_M,
+                                                  color_map['5G小区'], {'小区名称': '5G小区:'}, render_mode,
+                                                  geometry, lazy))
+        except Exception as e:
+            logger.error(f"生成5G扇区失败: {e}")
 
-@lru_cache(maxsize=5000)
-def create_sector_shape_cached(lon, lat, azimuth, radius_m, angle_deg=60, num_points=10):
-    """创建真实的扇形形状，通过多个点模拟圆弧边，使用缓存避免重复计算"""
-    try:
-        # 中心点
-        center = (lat, lon)
-        
-        # 计算扇形的起始和结束角度
-        start_angle = azimuth - angle_deg / 2
-        end_angle = azimuth + angle_deg / 2
-        
-        # 生成扇形的顶点列表
-        sector_points = [center]  # 首先添加中心点
-        
-        # 生成圆弧上的点
-        for i in range(num_points + 1):
-            # 计算当前角度
-            current_angle = start_angle + (end_angle - start_angle) * (i / num_points)
-            # 获取当前角度对应的坐标
-            arc_lon, arc_lat = get_point_at_distance(lon, lat, radius_m, current_angle)
-            sector_points.append((arc_lat, arc_lon))
-        
-        # 闭合多边形，添加中心点
-        sector_points.append(center)
-        
-        return sector_points
-    except Exception as e:
-        logger.error(f"生成扇形失败: {e}")
-        # 如果生成扇形失败，返回一个简单的三角形
-        return [(lat, lon), (lat + 0.001, lon), (lat, lon + 0.001), (lat, lon)]
+    # 6. 处理4G小区和扇区
+    # 首先处理没有分析结果的4G小区，确保它们能显示在4G小区图层
+    if vector_sectors and df_4g_conv is not None and not df_4g_conv.empty:
+        try:
+            detail_layers.append(add_sector_layer(layer_4g, df_4g_conv, SECTOR_RADIUS_4G_M,
+                                                  color_map['4G小区'], {'小区名称': '4G小区:'}, render_mode,
+                                                  geometry, lazy))
+        except Exception as e:
+            logger.error(f"生成4G扇区失败: {e}")
 
-def create_sector_shape(lon, lat, azimuth, radius_m, angle_deg=60, num_points=10):
-    """包装函数，处理浮点数精度问题后调用缓存函数"""
-    try:
-        # 限制小数位数，避免因为浮点数精度问题导致缓存失效
-        lon_rounded = round(lon, 6)
-        lat_rounded = round(lat, 6)
-        azimuth_rounded = round(azimuth, 2)
-        radius_rounded = round(radius_m)
-        angle_rounded = round(angle_deg, 2)
-        
-        return create_sector_shape_cached(lon_rounded, lat_rounded, azimuth_rounded, radius_rounded, angle_rounded, num_points)
-    except Exception as e:
-        logger.error(f"创建扇形失败: {e}")
-        # 如果创建扇形失败，返回一个简单的三角形
-        return [(lat, lon), (lat + 0.001, lon), (lat, lon + 0.001), (lat, lon)]
+    # 7. 处理有分析结果的4G小区，按分析类别分组，与4G小区图层共用扇区顶点
+    # 分析类别 -> (图层, 图层名称)
+    category_layers = {
+        '共站址5G分流小区': (layer_colo_offload, '共站址5G分流小区'),
+        '共站址5G射频调优小区': (layer_colo_optimize, '共站址射频调优小区'),
+        '非共站址5G分流小区': (layer_noncolo_offload, '非共站址5G分流小区'),
+        '5G规划建设': (layer_need_construction, '需要5G规划建设小区'),
+    }
+    df_4g_with_result = pd.DataFrame()
+    if (vector_sectors and df_4g_conv is not None and not df_4g_conv.empty and results_df is not None
+            and not results_df.empty):
+        df_4g_with_result = pd.merge(df_4g_conv, results_df[['小区名称'] + RESULT_COLUMNS], on='小区名称', how='inner')
+        # 可读的分析结果文本只在生成提示信息时构建
+        df_4g_with_result['分析结果'] = format_analysis_text(df_4g_with_result)
 
-def create_folium_map(df_4g, df_5g, results_df, baidu_ak, search_name=None):
-    """使用folium创建地图，显示小区分布和扇区图"""
-    try:
-        # 1. 定义颜色映射，确保所有指定的小区类型都有对应的颜色
-        color_map = {
-            '4G小区': '#336699',            # 蓝色
-            '5G小区': '#FF0000',            # 红色
-            '共站址5G分流小区': '#28a745',  # 绿色
-            '共站址射频调优小区': '#ffc107',  # 黄色
-            '非共站址5G分流小区': '#17a2b8',  # 青色
-            '需要5G规划建设小区': '#800080',  # 紫色
-            '其他': '#6c757d'             # 灰色
-        }
-        
-        # 2. 转换和过滤坐标
-        df_4g_conv = convert_coords_for_folium(df_4g)
-        df_5g_conv = convert_coords_for_folium(df_5g)
-        
-        # 3. 初始化地图 - 不设置默认瓦片，后续手动添加
-        m = folium.Map(
-            location=[22.8170, 108.3661],  # 南宁市中心坐标
-            zoom_start=12,  # 初始缩放级别
-            control_scale=True,
-            max_zoom=19,  # 最大缩放级别
-            tiles=None,  # 不使用默认瓦片，后续手动添加
-            zoom_control=True,  # 启用缩放控制
-            attribution_control=False,  # 禁用默认的版权信息
-            min_zoom=10,  # 设置最小缩放级别，避免在低缩放级别显示网格线
-            prefer_canvas=True  # 使用canvas渲染，提高性能并避免显示不必要的网格线
+        for category, group in df_4g_with_result.groupby('分析类别', observed=True):
+            layer, layer_name = category_layers[category]
+            try:
+                detail_layers.append(add_sector_layer(layer, group, SECTOR_RADIUS_4G_M, color_map[layer_name],
+                                                      {'小区名称': f'{layer_name}:', '分析结果': '分析结果:'},
+                                                      render_mode, geometry, lazy))
+            except Exception as e:
+                logger.error(f"生成分析结果4G扇区失败: {e}")
+
+    # 8. 处理搜索功能：匹配的小区以标记叠加显示，并把地图中心移到第一个匹配小区
+    if search_name is not None and search_name.strip():
+        matches = SearchIndex.from_frames(df_4g_conv, df_5g_conv).search(search_name, MAP_SEARCH_LIMIT)
+        if not matches.empty:
+            SearchOverlay(matches).add_to(m)
+
+    # 9. 将所有图层添加到地图，确保LayerControl能正确控制它们
+    # 先添加图层，再添加LayerControl和图例
+    layer_4g.add_to(m)
+    layer_5g.add_to(m)
+    layer_colo_offload.add_to(m)
+    layer_colo_optimize.add_to(m)
+    layer_noncolo_offload.add_to(m)
+    layer_need_construction.add_to(m)
+    
+    # 10. 确保所有图层都有数据，即使是空的也添加一个隐藏的点
+    # 这样LayerControl中就能显示所有图层选项
+    def ensure_layer_has_data(layer, color):
+        if not hasattr(layer, '_children') or len(layer._children) == 0:
+            # 添加一个隐藏的点，确保图层在LayerControl中显示
+            folium.CircleMarker(
+                location=[22.8170, 108.3661],
+                radius=0,
+                color=color,
+                fill=False,
+                opacity=0
+            ).add_to(layer)
+    
+    # 为每个图层添加隐藏点，确保它们在LayerControl中显示
+    ensure_layer_has_data(layer_4g, color_map['4G小区'])
+    ensure_layer_has_data(layer_5g, color_map['5G小区'])
+    ensure_layer_has_data(layer_colo_offload, color_map['共站址5G分流小区'])
+    ensure_layer_has_data(layer_colo_optimize, color_map['共站址射频调优小区'])
+    ensure_layer_has_data(layer_noncolo_offload, color_map['非共站址5G分流小区'])
+    ensure_layer_has_data(layer_need_construction, color_map['需要5G规划建设小区'])
+    
+    # 10.1 分级显示：低缩放级别只显示网格汇总，高缩放级别只显示视野内的扇区
+    if lazy and detail_layers:
+        category_names = CATEGORY_LAYER_NAMES
+        empty_cells = pd.DataFrame(columns=['经度', '纬度', '分析类别'])
+        overview = folium.GeoJson(
+            aggregate_feature_collection(empty_cells if df_4g_with_result.empty else df_4g_with_result,
+                                         empty_cells if df_5g_conv is None else df_5g_conv,
+                                         color_map, category_names),
+            name='小区分布概览',
+            control=False,
+            style_function=lambda feature: {'color': feature['properties']['color'], 'weight': 0,
+                                            'fillColor': feature['properties']['color'],
+                                            'fillOpacity': feature['properties']['opacity']},
+            tooltip=folium.GeoJsonTooltip(fields=['4G小区数', '5G小区数'] + list(category_names.values())),
         )
-        
-        # 添加高德基础地图 - 包含详细的街道信息
-        folium.TileLayer(
-            name='高德基础地图',
-            tiles='https://webst0{s}.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=2&style=8&x={x}&y={y}&z={z}',
-            attr='&copy; 高德地图',
-            subdomains=['1', '2', '3', '4'],
-            control=True  # 允许用户控制
-        ).add_to(m)
-        
-        # 添加纯卫星地图 - 不显示网格线和标注
-        folium.TileLayer(
-            name='高德纯卫星地图',
-            tiles='https://webst0{s}.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=2&style=6&x={x}&y={y}&z={z}',
-            attr='&copy; 高德地图',
-            subdomains=['1', '2', '3', '4'],
-            control=True  # 允许用户控制
-        ).add_to(m)
-        
-        # 添加高德卫星混合地图 - 包含卫星影像和标注
+        overview.add_to(m)
+        SectorLevelOfDetail(detail_layers, overview, lod_zoom).add_to(m)
+
+    # 10.2 瓦片模式：扇区以预渲染的栅格瓦片叠加显示
+    if render_mode == 'tiles':
+        if tile_pyramid is None:
+            tile_pyramid = build_sector_tiles(df_4g_conv, df_5g_conv, results_df)
         folium.TileLayer(
-            name='高德卫星混合地图',
-            tiles='https://webst0{s}.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=2&style=7&x={x}&y={y}&z={z}',
-            attr='&copy; 高德地图',
-            subdomains=['1', '2', '3', '4'],
-            control=True  # 允许用户控制
+            tiles=tile_pyramid.url_template,
+            name='扇区瓦片图层',
+            attr='5G分流分析',
+            overlay=True,
+            control=True,
+            min_zoom=10,
+            max_zoom=19,
+            max_native_zoom=tile_pyramid.max_zoom,
         ).add_to(m)
-        
-        # 4. 创建图层 - 按照要求创建所有需要的图层
-        layer_4g = folium.FeatureGroup(name="4G小区", show=True)
-        layer_5g = folium.FeatureGroup(name="5G小区", show=True)
-        layer_colo_offload = folium.FeatureGroup(name="共站址5G分流小区", show=True)
-        layer_colo_optimize = folium.FeatureGroup(name="共站址射频调优小区", show=True)
-        layer_noncolo_offload = folium.FeatureGroup(name="非共站址5G分流小区", show=True)
-        layer_need_construction = folium.FeatureGroup(name="需要5G规划建设小区", show=True)
-        
-        # 5. 处理5G小区和扇区
-        if df_5g_conv is not None and not df_5g_conv.empty:
-            for _, row in df_5g_conv.iterrows():
-                lon = row['经度']
-                lat = row['纬度']
-                cell_name = row['小区名称']
-                azimuth = row['方位角']
-                
-                # 生成5G扇区，使用algorithms.py中的create_sector_polygon函数
-                try:
-                    from algorithms import create_sector_polygon
-                    sector_points = create_sector_polygon(lon, lat, azimuth, 400, 60)
-                    
-                    # 转换坐标格式，从[[lon, lat], ...]转换为[(lat, lon), ...]
-                    if sector_points is not None:
-                        sector_polygon = [(point[1], point[0]) for point in sector_points]
-                        
-                        # 添加到5G小区图层
-                        folium.Polygon(
-                            locations=sector_polygon,
-                            color=color_map['5G小区'],
-                            fill=True,
-                            fill_color=color_map['5G小区'],
-                            fill_opacity=0.3,
-                            weight=2,
-                            opacity=0.8,
-                            tooltip=f"5G小区: {cell_name}"
-                        ).add_to(layer_5g)
-                except Exception as e:
-                    logger.error(f"生成5G扇区失败: {e}")
-        
-        # 6. 处理4G小区和扇区
-        # 首先处理没有分析结果的4G小区，确保它们能显示在4G小区图层
-        if df_4g_conv is not None and not df_4g_conv.empty:
-            for _, row in df_4g_conv.iterrows():
-                lon = row['经度']
-                lat = row['纬度']
-                cell_name = row['小区名称']
-                azimuth = row['方位角']
-                
-                # 生成4G扇区，使用algorithms.py中的create_sector_polygon函数
-                try:
-                    from algorithms import create_sector_polygon
-                    sector_points = create_sector_polygon(lon, lat, azimuth, 500, 60)
-                    
-                    # 转换坐标格式，从[[lon, lat], ...]转换为[(lat, lon), ...]
-                    if sector_points is not None:
-                        sector_polygon = [(point[1], point[0]) for point in sector_points]
-                        
-                        # 直接添加到4G小区图层，确保4G小区能显示
-                        folium.Polygon(
-                            locations=sector_polygon,
-                            color=color_map['4G小区'],
-                            fill=True,
-                            fill_color=color_map['4G小区'],
-                            fill_opacity=0.3,
-                            weight=2,
-                            opacity=0.8,
-                            tooltip=f"4G小区: {cell_name}"
-                        ).add_to(layer_4g)
-                except Exception as e:
-                    logger.error(f"生成4G扇区失败: {e}")
-        
-        # 7. 处理有分析结果的4G小区，添加到对应的分析结果图层
-        df_4g_with_result = pd.DataFrame()
-        if df_4g_conv is not None and not df_4g_conv.empty and results_df is not None and not results_df.empty:
-            df_4g_with_result = pd.merge(df_4g_conv, results_df[['小区名称', '分析结果']], on='小区名称', how='left')
-            
-            if not df_4g_with_result.empty:
-                for _, row in df_4g_with_result.iterrows():
-                    lon = row['经度']
-                    lat = row['纬度']
-                    cell_name = row['小区名称']
-                    azimuth = row['方位角']
-                    analysis_result = row['分析结果']
-                    analysis_result_str = str(analysis_result)
-                    
-                    # 生成4G扇区，使用algorithms.py中的create_sector_polygon函数
-                    try:
-                        from algorithms import create_sector_polygon
-                        sector_points = create_sector_polygon(lon, lat, azimuth, 500, 60)
-                        
-                        # 转换坐标格式，从[[lon, lat], ...]转换为[(lat, lon), ...]
-                        if sector_points is not None:
-                            sector_polygon = [(point[1], point[0]) for point in sector_points]
-                            
-                            # 确定小区类别
-                            cell_category = '4G小区'
-                            
-                            # 检查小区类型，确保所有类型都能被正确识别
-                            analysis_result_lower = analysis_result_str.lower()
-                            
-                            # 调整匹配顺序，确保非共站址5G分流小区能被正确识别
-                            if '非共站址5G分流小区' in analysis_result_str or '非共站址分流' in analysis_result_lower or '非共站址' in analysis_result_lower:
-                                cell_category = '非共站址5G分流小区'
-                            elif '共站址射频调优小区' in analysis_result_str or '射频调优' in analysis_result_lower:
-                                cell_category = '共站址射频调优小区'
-                            elif '共站址5G分流小区' in analysis_result_str or '共站址分流' in analysis_result_lower or '5g分流' in analysis_result_lower:
-                                cell_category = '共站址5G分流小区'
-                            elif '需要5G规划建设小区' in analysis_result_str or '需要规划' in analysis_result_lower or '规划建设' in analysis_result_lower:
-                                cell_category = '需要5G规划建设小区'
-                            
-                            # 根据类型添加到对应的分析结果图层
-                            if cell_category == '共站址5G分流小区':
-                                folium.Polygon(
-                                    locations=sector_polygon,
-                                    color=color_map['共站址5G分流小区'],
-                                    fill=True,
-                                    fill_color=color_map['共站址5G分流小区'],
-                                    fill_opacity=0.3,
-                                    weight=2,
-                                    opacity=0.8,
-                                    tooltip=f"共站址5G分流小区: {cell_name}<br>分析结果: {analysis_result}"
-                                ).add_to(layer_colo_offload)
-                            elif cell_category == '共站址射频调优小区':
-                                folium.Polygon(
-                                    locations=sector_polygon,
-                                    color=color_map['共站址射频调优小区'],
-                                    fill=True,
-                                    fill_color=color_map['共站址射频调优小区'],
-                                    fill_opacity=0.3,
-                                    weight=2,
-                                    opacity=0.8,
-                                    tooltip=f"共站址射频调优小区: {cell_name}<br>分析结果: {analysis_result}"
-                                ).add_to(layer_colo_optimize)
-                            elif cell_category == '非共站址5G分流小区':
-                                folium.Polygon(
-                                    locations=sector_polygon,
-                                    color=color_map['非共站址5G分流小区'],
-                                    fill=True,
-                                    fill_color=color_map['非共站址5G分流小区'],
-                                    fill_opacity=0.3,
-                                    weight=2,
-                                    opacity=0.8,
-                                    tooltip=f"非共站址5G分流小区: {cell_name}<br>分析结果: {analysis_result}"
-                                ).add_to(layer_noncolo_offload)
-                            elif cell_category == '需要5G规划建设小区':
-                                folium.Polygon(
-                                    locations=sector_polygon,
-                                    color=color_map['需要5G规划建设小区'],
-                                    fill=True,
-                                    fill_color=color_map['需要5G规划建设小区'],
-                                    fill_opacity=0.3,
-                                    weight=2,
-                                    opacity=0.8,
-                                    tooltip=f"需要5G规划建设小区: {cell_name}<br>分析结果: {analysis_result}"
-                                ).add_to(layer_need_construction)
-                    except Exception as e:
-                        logger.error(f"生成分析结果4G扇区失败: {e}")
-        
-        # 8. 处理搜索功能
-        if search_name is not None and search_name.strip():
-            # 合并所有小区数据
-            all_cells = pd.DataFrame()
-            if df_4g_conv is not None and not df_4g_conv.empty:
-                all_cells = pd.concat([all_cells, df_4g_conv], ignore_index=True)
-            if df_5g_conv is not None and not df_5g_conv.empty:
-                all_cells = pd.concat([all_cells, df_5g_conv], ignore_index=True)
-            
-            if not all_cells.empty:
-                # 搜索匹配的小区
-                all_cells['小区名称'] = all_cells['小区名称'].astype(str)
-                matching_cells = all_cells[all_cells['小区名称'].str.contains(search_name, case=False, na=False)]
-                
-                if not matching_cells.empty:
-                    # 调整地图中心到第一个匹配小区
-                    first_match = matching_cells.iloc[0]
-                    m.location = [first_match['纬度'], first_match['经度']]
-                    m.zoom_start = 15
-                    
-                    # 添加搜索结果标记
-                    for _, match in matching_cells.iterrows():
-                        folium.Marker(
-                            location=[match['纬度'], match['经度']],
-                            icon=folium.Icon(color='purple', icon='star', prefix='fa'),
-                            tooltip=f"搜索结果: {match['小区名称']}"
-                        ).add_to(m)
-        
-        # 9. 将所有图层添加到地图，确保LayerControl能正确控制它们
-        # 先添加图层，再添加LayerControl和图例
-        layer_4g.add_to(m)
-        layer_5g.add_to(m)
-        layer_colo_offload.add_to(m)
-        layer_colo_optimize.add_to(m)
-        layer_noncolo_offload.add_to(m)
-        layer_need_construction.add_to(m)
-        
-        # 10. 确保所有图层都有数据，即使是空的也添加一个隐藏的点
-        # 这样LayerControl中就能显示所有图层选项
-        def ensure_layer_has_data(layer, color):
-            if not hasattr(layer, '_children') or len(layer._children) == 0:
-                # 添加一个隐藏的点，确保图层在LayerControl中显示
-                folium.CircleMarker(
-                    location=[22.8170, 108.3661],
-                    radius=0,
-                    color=color,
-                    fill=False,
-                    opacity=0
-                ).add_to(layer)
-        
-        # 为每个图层添加隐藏点，确保它们在LayerControl中显示
-        ensure_layer_has_data(layer_4g, color_map['4G小区'])
-        ensure_layer_has_data(layer_5g, color_map['5G小区'])
-        ensure_layer_has_data(layer_colo_offload, color_map['共站址5G分流小区'])
-        ensure_layer_has_data(layer_colo_optimize, color_map['共站址射频调优小区'])
-        ensure_layer_has_data(layer_noncolo_offload, color_map['非共站址5G分流小区'])
-        ensure_layer_has_data(layer_need_construction, color_map['需要5G规划建设小区'])
-        
-        # 11. 添加图层控制 - 确保所有图层都能被控制
-        # 重新创建LayerControl，确保它能正确控制所有图层
-        from folium import LayerControl
-        
-        # 确保LayerControl在所有图层和图例添加之后添加
-        folium.LayerControl(
-            position='topright',
-            collapsed=False,  # 不折叠，确保用户能看到所有图层选项
-            autoZIndex=True  # 自动管理Z轴索引
-        ).add_to(m)
-        
-        # 12. 调整地图中心和缩放级别，确保能看到所有小区
-        # 如果有小区数据，调整地图中心到第一个小区
-        if df_4g_conv is not None and not df_4g_conv.empty:
-            first_cell = df_4g_conv.iloc[0]
-            m.location = [first_cell['纬度'], first_cell['经度']]
-            m.zoom_start = 10
-        elif df_5g_conv is not None and not df_5g_conv.empty:
-            first_cell = df_5g_conv.iloc[0]
-            m.location = [first_cell['纬度'], first_cell['经度']]
-            m.zoom_start = 10
-        
-        # 12. 返回地图对象
-        return m
-    except Exception as e:
-        logger.error(f"地图生成错误: {str(e)}")
-        # 返回一个基本地图，显示错误信息
-        m = folium.Map(location=[22.8170, 108.3661], zoom_start=12)
-        folium.Marker(
-            location=[22.8170, 108.3661],
-            icon=folium.Icon(color='red', icon='exclamation-sign'),
-            tooltip=f"地图生成错误: {str(e)}"
-        ).add_to(m)
-        return m
\ No newline at end of file
+
+    # 11. 添加图层控制 - 确保所有图层都能被控制
+    # 重新创建LayerControl，确保它能正确控制所有图层
+    from folium import LayerControl
+    
+    # 确保LayerControl在所有图层和图例添加之后添加
+    folium.LayerControl(
+        position='topright',
+        collapsed=False,  # 不折叠，确保用户能看到所有图层选项
+        autoZIndex=True  # 自动管理Z轴索引
+    ).add_to(m)
+    
+    # 12. 调整地图中心和缩放级别，确保能看到所有小区
+    # 如果有小区数据，调整地图中心到第一个小区
+    if df_4g_conv is not None and not df_4g_conv.empty:
+        first_cell = df_4g_conv.iloc[0]
+        m.location = [first_cell['纬度'], first_cell['经度']]
+        m.zoom_start = 10
+    elif df_5g_conv is not None and not df_5g_conv.empty:
+        first_cell = df_5g_conv.iloc[0]
+        m.location = [first_cell['纬度'], first_cell['经度']]
+        m.zoom_start = 10
+    
+    # 12. 返回地图对象
+    return m
\ No newline at end of file
@@ -0,0 +1,147 @@
+# ===== File: parallel.py (多进程地理分块并行分析) =====
+# 4G小区按地理位置切分为若干矩形分块，每个分块带上向外延伸 d_non_colo 的5G"缓冲带"小区，
+# 保证分块边界上的4G小区也能找到所有候选5G小区。坐标数组和输出数组都放在共享内存中，
+# 子进程只接收共享内存名称和分块范围，不传递(pickle)DataFrame；结果直接写回原始行位置。
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from main_analyzer import _match_nearest
+from spatial_index import build_spatial_index, METERS_PER_DEGREE
+
+# 每个进程分到的分块数，分块越多负载越均衡，但每块都要单独构建5G索引
+TILES_PER_WORKER = 4
+
+
+class SharedArrays:
+    """把一组NumPy数组复制到共享内存，spec可传给子进程重新挂载"""
+
+    def __init__(self, arrays):
+        self._blocks = []
+        self.spec = {}
+        self.arrays = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+            self.arrays[name] = shared
+
+    def release(self):
+        self.arrays = {}
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def _attach(spec):
+    """子进程中按spec挂载共享内存，返回(数组字典, 共享内存句柄列表)"""
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays, blocks
+
+
+def make_tiles(lat, lon, n_tiles):
+    """
+    按纬度分条、每条内再按经度分段，得到点数大致相等的矩形分块。
+    返回(按分块排列的行号, 每个分块在行号数组中的[起, 止)范围列表)。
+    """
+    n = len(lat)
+    n_strips = max(1, int(np.sqrt(n_tiles)))
+    n_per_strip = max(1, -(-n_tiles // n_strips))
+    order_parts, bounds = [], []
+    position = 0
+    for strip in np.array_split(np.argsort(lat, kind='stable'), n_strips):
+        strip = strip[np.argsort(lon[strip], kind='stable')]
+        for tile in np.array_split(strip, n_per_strip):
+            if len(tile) == 0:
+                continue
+            order_parts.append(tile)
+            bounds.append((position, position + len(tile)))
+            position += len(tile)
+    order = np.concatenate(order_parts) if order_parts else np.empty(0, dtype=np.intp)
+    return order, bounds
+
+
+def _halo_mask(lat_tile, lon_tile, lat_5g, lon_5g, d_non_colo):
+    """分块外包矩形向外扩展 d_non_colo 米后包含的5G小区（经度方向按分块最高纬度放宽）"""
+    dlat = d_non_colo / METERS_PER_DEGREE
+    lat_min, lat_max = lat_tile.min() - dlat, lat_tile.max() + dlat
+    max_abs_lat = min(max(abs(lat_min), abs(lat_max)), 89.9)
+    dlon = d_non_colo / (METERS_PER_DEGREE * np.cos(np.radians(max_abs_lat)))
+    lon_min, lon_max = lon_tile.min() - dlon, lon_tile.max() + dlon
+    return (lat_5g >= lat_min) & (lat_5g <= lat_max) & (lon_5g >= lon_min) & (lon_5g <= lon_max)
+
+
+def _process_tile(spec, start, end, d_non_colo):
+    """子进程：处理一个分块，结果写回共享输出数组，返回处理的4G小区数"""
+    arrays, blocks = _attach(spec)
+    try:
+        rows = arrays['order'][start:end]
+        lat_4g, lon_4g = arrays['lat_4g'][rows], arrays['lon_4g'][rows]
+        halo = np.flatnonzero(_halo_mask(lat_4g, lon_4g, arrays['lat_5g'], arrays['lon_5g'], d_non_colo))
+        lat_5g, lon_5g = arrays['lat_5g'][halo], arrays['lon_5g'][halo]
+
+        # 缓冲带内的5G小区保持原有的相对顺序，距离相同时的选择与单进程一致
+        nearest, min_dist, angle_diff, counts = _match_nearest(
+            lat_4g, lon_4g, arrays['azimuth_4g'][rows], build_spatial_index(lat_5g, lon_5g, d_non_colo),
+            lat_5g, lon_5g, arrays['azimuth_5g'][halo], d_non_colo)
+
+        matched = nearest >= 0
+        global_nearest = np.full(len(rows), -1, dtype=np.intp)
+        global_nearest[matched] = halo[nearest[matched]]
+        arrays['nearest'][rows] = global_nearest
+        arrays['min_dist'][rows] = min_dist
+        arrays['angle_diff'][rows] = angle_diff
+        arrays['counts'][rows] = counts
+        return end - start
+    finally:
+        arrays.clear()
+        for block in blocks:
+            block.close()
+
+
+def match_nearest_parallel(lat_4g, lon_4g, azimuth_4g, lat_5g, lon_5g, azimuth_5g, d_non_colo, workers=None,
+                           progress_callback=None):
+    """
+    多进程版 main_analyzer._match_nearest，结果与单进程完全一致。
+    返回(最近5G索引, 最近距离, 方位角夹角, 范围内5G数量)，均按原始4G行顺序排列。
+    """
+    workers = workers or os.cpu_count() or 1
+    total_rows = len(lat_4g)
+    order, bounds = make_tiles(lat_4g, lon_4g, workers * TILES_PER_WORKER)
+
+    shared = SharedArrays({
+        'lat_4g': lat_4g, 'lon_4g': lon_4g, 'azimuth_4g': azimuth_4g,
+        'lat_5g': lat_5g, 'lon_5g': lon_5g, 'azimuth_5g': azimuth_5g,
+        'order': order,
+        'nearest': np.full(total_rows, -1, dtype=np.intp),
+        'min_dist': np.full(total_rows, np.inf),
+        'angle_diff': np.full(total_rows, np.inf),
+        'counts': np.zeros(total_rows, dtype=np.intp),
+    })
+    try:
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_process_tile, shared.spec, start, end, d_non_colo) for start, end in bounds]
+            try:
+                for future in as_completed(futures):
+                    done += future.result()
+                    if progress_callback:
+                        progress_callback(done, total_rows)
+            except BaseException:
+                # 进度回调抛出AnalysisCancelled(或分块出错)时，未开始的分块不再执行
+                for future in futures:
+                    future.cancel()
+                raise
+        return tuple(shared.arrays[name].copy() for name in ('nearest', 'min_dist', 'angle_diff', 'counts'))
+    finally:
+        shared.release()
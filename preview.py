@@ -0,0 +1,72 @@
+# ===== File: preview.py (数据预览分页读取) =====
+# 上传文件的预览不再把整张表读入 session_state：第一页只读取文件开头几行即可显示，
+# 翻页、排序、筛选时才从 ingestion 的解析缓存中按页取出行。排序和筛选在服务端计算，
+# 结果只缓存行号数组(按解析结果指纹和排序/筛选条件)，不复制整张表。
+import numpy as np
+
+from datasets import StageCache
+from ingestion import parse_table, peek_table, is_parsed, table_source
+
+# 每页行数
+PREVIEW_PAGE_SIZE = 10
+# 缓存的排序/筛选行号数组数量
+ROW_ORDER_CACHE_SIZE = 16
+
+_row_orders = StageCache('预览行号', ROW_ORDER_CACHE_SIZE)
+
+
+def _filter_rows(df, column, query):
+    """column 列(转为文本)包含 query 的行号，不区分大小写"""
+    if not query:
+        return np.arange(len(df))
+    text = df[column].astype(str)
+    return np.flatnonzero(text.str.contains(query, case=False, regex=False).to_numpy())
+
+
+def _sort_rows(df, rows, column, ascending):
+    """按 column 列稳定排序 rows，缺失值排在最后；类型混杂无法比较时按文本排序"""
+    values = df[column].iloc[rows].reset_index(drop=True)
+    try:
+        order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index
+    except TypeError:
+        order = values.astype(str).sort_values(ascending=ascending, kind='stable').index
+    return rows[order.to_numpy()]
+
+
+def row_order(dataset, sort_by=None, ascending=True, filter_column=None, query=''):
+    """按筛选、排序条件得到的行号数组(按数据集指纹和条件缓存)"""
+    def build():
+        df = dataset.view()
+        rows = _filter_rows(df, filter_column, query) if filter_column else np.arange(len(df))
+        return _sort_rows(df, rows, sort_by, ascending) if sort_by else rows
+    return _row_orders.get([dataset], build, sort_by, ascending, filter_column, query)
+
+
+class PagedTable:
+    """
+    上传文件的分页预览。page() 返回(一页DataFrame, 符合条件的总行数)：
+    无排序、筛选的第一页在文件尚未解析时只读取开头几行(总行数可能未知，为None)，
+    其余情况从解析缓存中按行号取出一页。文件的缓存键在创建时确定，翻页、排序、筛选不再哈希文件内容。
+    """
+
+    def __init__(self, source, page_size=PREVIEW_PAGE_SIZE):
+        self.source = table_source(source)
+        self.page_size = page_size
+
+    @property
+    def columns(self):
+        return list(peek_table(self.source, 1)[0].columns)
+
+    def page(self, number, sort_by=None, ascending=True, filter_column=None, query=''):
+        if number <= 1 and not sort_by and not query and not is_parsed(self.source):
+            return peek_table(self.source, self.page_size)
+        dataset = parse_table(self.source)
+        rows = row_order(dataset, sort_by, ascending, filter_column, query)
+        start = (max(number, 1) - 1) * self.page_size
+        return dataset.view().iloc[rows[start:start + self.page_size]], len(rows)
+
+    def page_count(self, total):
+        """总页数；总行数未知时为None"""
+        if total is None:
+            return None
+        return max(1, -(-total // self.page_size))
@@ -0,0 +1,154 @@
+# ===== File: progress.py (限频、可取消的进度报告) =====
+# 分析引擎每处理完一批4G小区调用一次 progress_callback(已处理数, 总数)。ProgressReporter 可直接作为该回调：
+# 按最小时间间隔合并更新后再转发给界面，附带吞吐量和预计剩余时间；并在每批之间检查 CancelToken，
+# 用户取消后抛出 AnalysisCancelled，分析在当前批次结束后停止。
+# BackgroundTask 在后台线程中运行分析：Streamlit 只在脚本重跑时执行按钮回调，分析若在脚本线程中运行，
+# 停止按钮的回调要等分析结束才执行；放到后台线程后，界面线程轮询进度，重跑时回调即可设置取消标记。
+import threading
+import time
+
+# 两次界面更新之间的最小间隔(秒)
+DEFAULT_MIN_INTERVAL = 0.25
+
+
+class AnalysisCancelled(Exception):
+    """分析被用户取消"""
+
+
+class CancelToken:
+    """取消标记：界面线程调用cancel()，分析引擎在批次之间调用check()"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise AnalysisCancelled("分析已取消")
+
+
+def format_seconds(seconds):
+    """秒数格式化为 '1小时02分' / '3分05秒' / '12秒'"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}小时{seconds % 3600 // 60:02d}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60:02d}秒"
+    return f"{seconds}秒"
+
+
+class ProgressInfo:
+    """一次进度更新：已处理数、总数、已用时间(秒)、吞吐量(个/秒)、预计剩余时间(秒，未知时为None)"""
+
+    __slots__ = ('current', 'total', 'elapsed', 'rate', 'eta')
+
+    def __init__(self, current, total, elapsed, rate, eta):
+        self.current = current
+        self.total = total
+        self.elapsed = elapsed
+        self.rate = rate
+        self.eta = eta
+
+    @property
+    def fraction(self):
+        return min(self.current / self.total, 1.0) if self.total > 0 else 1.0
+
+    def __str__(self):
+        text = f"已分析 {self.current}/{self.total} 个4G小区，{self.rate:,.0f} 个/秒"
+        if self.eta is not None and self.current < self.total:
+            text += f"，预计剩余 {format_seconds(self.eta)}"
+        return text
+
+
+class ProgressReporter:
+    """
+    限频的进度回调。on_update(ProgressInfo) 最多每 min_interval 秒调用一次，完成时总会调用一次；
+    每次被引擎调用时先检查 cancel_token，已取消则抛出 AnalysisCancelled。
+    """
+
+    def __init__(self, on_update=None, min_interval=DEFAULT_MIN_INTERVAL, cancel_token=None, clock=time.monotonic):
+        self.on_update = on_update
+        self.min_interval = min_interval
+        self.cancel_token = cancel_token
+        self._clock = clock
+        self._start = clock()
+        self._last_update = None
+        # 引擎调用次数与实际转发给界面的更新次数
+        self.calls = 0
+        self.updates = 0
+
+    def __call__(self, current, total):
+        self.calls += 1
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+        now = self._clock()
+        finished = current >= total
+        if not finished and self._last_update is not None and now - self._last_update < self.min_interval:
+            return
+        self._last_update = now
+        if self.on_update is None:
+            return
+
+        elapsed = now - self._start
+        rate = current / elapsed if elapsed > 0 else 0.0
+        eta = (total - current) / rate if rate > 0 else None
+        self.updates += 1
+        self.on_update(ProgressInfo(current, total, elapsed, rate, eta))
+
+
+class BackgroundTask:
+    """
+    在后台线程中运行 func(task)，func 通过 task.reporter() 取得进度回调传给分析引擎。
+    界面线程调用 wait() 轮询是否完成，读取 progress 显示进度，调用 cancel() 取消，完成后由 result()
+    取得返回值(后台线程中的异常，包括 AnalysisCancelled，在这里重新抛出)。后台线程中不能调用界面函数。
+    """
+
+    def __init__(self, func, min_interval=DEFAULT_MIN_INTERVAL):
+        self.cancel_token = CancelToken()
+        self.min_interval = min_interval
+        # 最近一次进度(阶段名称, ProgressInfo)，尚未报告进度时为None
+        self.progress = None
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(func,), daemon=True)
+
+    def _run(self, func):
+        try:
+            self._result = func(self)
+        except BaseException as e:
+            self._error = e
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def reporter(self, stage=''):
+        """某一阶段的进度回调：检查取消标记，并把限频后的进度记录到 progress"""
+        def on_update(info):
+            self.progress = (stage, info)
+        return ProgressReporter(on_update, self.min_interval, self.cancel_token)
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def wait(self, timeout=None):
+        """等待至多 timeout 秒，返回任务是否已结束"""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    def result(self):
+        """任务的返回值；任务抛出异常时重新抛出。须在任务结束后调用"""
+        if self._error is not None:
+            raise self._error
+        return self._result
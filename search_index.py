@@ -0,0 +1,208 @@
+# ===== File: search_index.py (小区名称搜索索引) =====
+# 加载数据后对全部小区名称建一次索引，之后每次搜索不再扫描DataFrame：
+# - 规范化：NFKC(全角转半角)后 casefold，搜索不区分大小写和全角/半角；
+# - 子串：1~3字符的n-gram倒排表(CSR数组)，查询不超过3个字符时倒排表即是结果，
+#   更长的查询取各3-gram倒排表的交集，再逐个确认是否包含整个查询串；
+# - 前缀：规范化名称排序后二分查找；
+# - 容错：子串无结果时，按与查询共有的3-gram(短查询用2-gram)数量选出候选，
+#   再用近似子串编辑距离排序，允许少量错字、漏字、多字。
+import bisect
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# 默认返回的最多结果数
+DEFAULT_SEARCH_LIMIT = 50
+# 建立倒排表的n-gram长度
+MAX_GRAM = 3
+# 容错匹配最多允许的编辑次数(查询较短时按长度减少)，以及参与编辑距离排序的候选数上限
+MAX_TYPOS = 2
+FUZZY_CANDIDATES = 200
+# 匹配方式，按排名先后
+MATCH_EXACT = '完全匹配'
+MATCH_PREFIX = '前缀匹配'
+MATCH_SUBSTRING = '包含'
+MATCH_FUZZY = '近似匹配'
+
+# Unicode码位不超过 0x10FFFF，每个字符占21位，不超过3个字符的n-gram可以编码为一个int64
+_CODE_BITS = 21
+
+
+def normalize_name(name):
+    """小区名称规范化：NFKC + casefold + 去掉首尾空白"""
+    return unicodedata.normalize('NFKC', str(name)).casefold().strip()
+
+
+def _codes(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+
+
+def _gram_keys(codes, n):
+    """
+    codes中每个位置起长度为n的n-gram编码为int64(高位补0)。字符码位不为0，
+    因此不同长度的n-gram编码互不冲突。
+    """
+    count = len(codes) - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+    keys = np.zeros(count, dtype=np.int64)
+    for offset in range(n):
+        keys = (keys << _CODE_BITS) | codes[offset:offset + count]
+    return keys
+
+
+def _edit_distance_in(query, text, max_distance):
+    """query与text中最相近子串的编辑距离(近似子串匹配，text首尾的多余字符不计)，超过max_distance时提前返回"""
+    previous = [0] * (len(text) + 1)
+    for i, q_char in enumerate(query, 1):
+        current = [i] + [0] * len(text)
+        for j, t_char in enumerate(text, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (q_char != t_char))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous)
+
+
+class SearchIndex:
+    """
+    小区名称搜索索引。cells 为包含 小区名称/纬度/经度 列的表(4G、5G小区可先合并)，
+    search() 返回按匹配程度排序的结果，带坐标，地图可直接定位。
+    """
+
+    def __init__(self, cells):
+        cells = cells[['小区名称', '纬度', '经度']] if len(cells) else pd.DataFrame(columns=['小区名称', '纬度', '经度'])
+        self.names = cells['小区名称'].astype(str).to_numpy(dtype=object)
+        self.lat = cells['纬度'].to_numpy(dtype=np.float64)
+        self.lon = cells['经度'].to_numpy(dtype=np.float64)
+        self.normalized = [normalize_name(name) for name in self.names]
+        self.lengths = np.fromiter((len(name) for name in self.normalized), dtype=np.int64, count=len(self.normalized))
+
+        # 前缀：规范化名称排序
+        self.prefix_order = np.array(sorted(range(len(self.normalized)), key=self.normalized.__getitem__),
+                                     dtype=np.intp)
+        self.sorted_names = [self.normalized[i] for i in self.prefix_order]
+
+        # n-gram倒排表：所有名称以\0连接后一次性编码，剔除跨越名称边界的n-gram
+        joined = _codes('\0'.join(self.normalized))
+        owner = np.repeat(np.arange(len(self.normalized)), self.lengths + 1)[:len(joined)]
+        nonzero = joined != 0
+        key_parts, cell_parts = [], []
+        for n in range(1, MAX_GRAM + 1):
+            keys = _gram_keys(joined, n)
+            valid = np.ones(len(keys), dtype=bool)
+            for offset in range(n):
+                valid &= nonzero[offset:offset + len(keys)]
+            key_parts.append(keys[valid])
+            cell_parts.append(owner[:len(keys)][valid])
+        keys = np.concatenate(key_parts) if key_parts else np.empty(0, dtype=np.int64)
+        cells_of_key = np.concatenate(cell_parts) if cell_parts else np.empty(0, dtype=np.int64)
+        order = np.lexsort((cells_of_key, keys))
+        keys, cells_of_key = keys[order], cells_of_key[order]
+        # 同一名称中重复出现的n-gram只保留一次
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (cells_of_key[1:] != cells_of_key[:-1])
+        keys, cells_of_key = keys[first], cells_of_key[first]
+        self.gram_keys, starts = np.unique(keys, return_index=True)
+        self.gram_starts = np.append(starts, len(keys))
+        self.postings = cells_of_key.astype(np.intp)
+
+    @classmethod
+    def from_frames(cls, *frames):
+        """由若干小区表(如已清洗的4G、5G表)建立索引，结果中的序号按表的先后顺序连续编号"""
+        frames = [df[['小区名称', '纬度', '经度']] for df in frames if df is not None and not df.empty]
+        return cls(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame())
+
+    def __len__(self):
+        return len(self.names)
+
+    def _posting(self, key):
+        position = np.searchsorted(self.gram_keys, key)
+        if position == len(self.gram_keys) or self.gram_keys[position] != key:
+            return self.postings[:0]
+        return self.postings[self.gram_starts[position]:self.gram_starts[position + 1]]
+
+    def _substring(self, query):
+        """包含query的全部小区序号(升序)"""
+        codes = _codes(query)
+        if len(codes) <= MAX_GRAM:
+            return self._posting(_gram_keys(codes, len(codes))[0])
+        postings = sorted((self._posting(key) for key in np.unique(_gram_keys(codes, MAX_GRAM))), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = candidates[np.isin(candidates, posting, assume_unique=True)]
+        return np.array([i for i in candidates.tolist() if query in self.normalized[i]], dtype=np.intp)
+
+    def _prefix(self, query):
+        """以query开头的小区序号"""
+        start = bisect.bisect_left(self.sorted_names, query)
+        end = bisect.bisect_left(self.sorted_names, query + '\U0010ffff', lo=start)
+        return self.prefix_order[start:end]
+
+    def _fuzzy(self, query):
+        """容错匹配：返回(小区序号, 编辑距离)，按编辑距离、名称长度排序"""
+        max_typos = min(MAX_TYPOS, max(0, (len(query) - 1) // 3))
+        if max_typos == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64)
+        n = MAX_GRAM if len(query) > 4 else 2
+        grams = np.unique(_gram_keys(_codes(query), n))
+        postings = [self._posting(key) for key in grams]
+        hits = np.concatenate(postings) if postings else np.empty(0, dtype=np.intp)
+        if len(hits) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64)
+        # 每处编辑最多破坏n个n-gram，共有n-gram过少的名称不可能在允许的编辑次数内
+        candidates, shared = np.unique(hits, return_counts=True)
+        keep = shared >= len(grams) - n * max_typos
+        candidates, shared = candidates[keep], shared[keep]
+        candidates = candidates[np.argsort(-shared, kind='stable')[:FUZZY_CANDIDATES]]
+
+        distances = np.array([_edit_distance_in(query, self.normalized[i], max_typos) for i in candidates.tolist()],
+                             dtype=np.int64)
+        matched = distances <= max_typos
+        candidates, distances = candidates[matched], distances[matched]
+        order = np.lexsort((candidates, self.lengths[candidates], distances))
+        return candidates[order], distances[order]
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, fuzzy=True):
+        """
+        搜索小区名称，返回最多limit行的 DataFrame(小区名称/纬度/经度/匹配方式)，排序依次为：
+        完全匹配、前缀匹配、包含(名称短的在前)，子串无结果且 fuzzy 为真时返回近似匹配(编辑距离小的在前)。
+        attrs['total'] 为截断前的匹配总数。
+        """
+        query = normalize_name(query) if query is not None else ''
+        if not query or len(self) == 0:
+            return self._result(np.empty(0, dtype=np.intp), [], 0)
+
+        matches = self._substring(query)
+        if len(matches):
+            is_prefix = np.zeros(len(self), dtype=bool)
+            is_prefix[self._prefix(query)] = True
+            lengths = self.lengths[matches]
+            tier = np.where(is_prefix[matches], np.where(lengths == len(query), 0, 1), 2)
+            # 排序键 (匹配方式, 名称长度, 序号) 合成一个整数，先用argpartition取出前limit个再排序
+            rank = (tier * (self.lengths.max() + 1) + lengths) * len(self) + matches
+            if len(rank) > limit:
+                top = np.argpartition(rank, limit)[:limit]
+                order = top[np.argsort(rank[top])]
+            else:
+                order = np.argsort(rank)
+            kinds = np.array([MATCH_EXACT, MATCH_PREFIX, MATCH_SUBSTRING], dtype=object)[tier[order]]
+            return self._result(matches[order], kinds, len(matches))
+
+        if fuzzy:
+            candidates, _ = self._fuzzy(query)
+            return self._result(candidates[:limit], [MATCH_FUZZY] * min(len(candidates), limit), len(candidates))
+        return self._result(np.empty(0, dtype=np.intp), [], 0)
+
+    def _result(self, rows, kinds, total):
+        result = pd.DataFrame({
+            '小区名称': self.names[rows],
+            '纬度': self.lat[rows],
+            '经度': self.lon[rows],
+            '匹配方式': pd.Categorical(list(kinds), categories=[MATCH_EXACT, MATCH_PREFIX, MATCH_SUBSTRING, MATCH_FUZZY]),
+        })
+        result.attrs['total'] = int(total)
+        return result
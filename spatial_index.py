@@ -0,0 +1,240 @@
+# ===== File: spatial_index.py (米制空间索引) =====
+# 将经纬度投影到以地心为原点的三维直角坐标(ECEF，球面模型)，
+# 球面上两点的弦长与haversine距离单调对应，因此搜索半径可以直接用米表示，
+# 不再出现按度数搜索时经度方向被压缩导致的"椭圆形"搜索范围。
+# 候选的球面距离由弦长直接换算；只有弦长落在半径容差带内的候选才用haversine复核是否在半径内。
+import numpy as np
+from algorithms import calculate_distance_batch, AVG_EARTH_RADIUS_M
+
+# 尝试导入 scipy，如果失败则使用纯NumPy的网格索引 GridIndex
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    pass
+
+# 纬度方向每度对应的米数（与haversine使用的地球平均半径一致）
+METERS_PER_DEGREE = AVG_EARTH_RADIUS_M * np.pi / 180
+# 弦长半径的容差比例：弦长在半径对应弦长的 (1±容差) 之间的候选以haversine精确距离为准，
+# 防止浮点误差漏掉或误收恰好位于边界上的小区
+CHORD_TOLERANCE = 1e-9
+# 网格索引默认的网格边长(米)，一般取搜索半径 d_non_colo
+DEFAULT_GRID_CELL_M = 300
+# 网格索引每批查询点数，限制候选对数组的内存占用
+GRID_QUERY_BATCH = 10000
+
+
+def to_ecef(lat, lon):
+    """经纬度(度)转换为球面地心直角坐标(米)，返回(N, 3)数组"""
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat_rad)
+    return AVG_EARTH_RADIUS_M * np.column_stack([cos_lat * np.cos(lon_rad),
+                                                 cos_lat * np.sin(lon_rad),
+                                                 np.sin(lat_rad)])
+
+
+def chord_length(distance_m):
+    """球面距离(米)对应的弦长(米)"""
+    return 2 * AVG_EARTH_RADIUS_M * np.sin(np.asarray(distance_m, dtype=np.float64) / (2 * AVG_EARTH_RADIUS_M))
+
+
+def _valid_coords(lat, lon):
+    """经纬度是否在合法范围内"""
+    return (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+
+def _within_radius(rows, indices, chord, lat, lon, index, radius_m):
+    """
+    按弦长判断候选对是否在半径内，返回(保留掩码, 球面距离)。弦长明显小于半径对应弦长的直接保留、
+    明显大于的直接剔除，距离由弦长换算(与haversine同一球面模型)；只有容差带内的候选用haversine复核。
+    经纬度超出合法范围的点与 calculate_distance_batch 一致视为无穷远。
+    """
+    limit = float(chord_length(radius_m))
+    distances = 2 * AVG_EARTH_RADIUS_M * np.arcsin(np.minimum(chord / (2 * AVG_EARTH_RADIUS_M), 1.0))
+    keep = chord < limit * (1 - CHORD_TOLERANCE)
+    band = np.flatnonzero(np.abs(chord - limit) <= limit * CHORD_TOLERANCE)
+    if len(band):
+        exact = calculate_distance_batch(lat[rows[band]], lon[rows[band]],
+                                         index.lat[indices[band]], index.lon[indices[band]])
+        keep[band] = exact <= radius_m
+        distances[band] = exact
+    keep &= _valid_coords(lat, lon)[rows] & index.valid[indices]
+    return keep, distances
+
+
+class SpatialIndex:
+    """
+    基于ECEF弦长的cKDTree索引。query_radius返回的候选都在半径内(边界附近的经haversine复核)，
+    结果为CSR形式：(每个查询点的候选数, 5G索引, 距离)，每个查询点内5G索引升序排列。
+    """
+
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.valid = _valid_coords(self.lat, self.lon)
+        self.tree = cKDTree(to_ecef(self.lat, self.lon))
+        self._degree_tree = None
+
+    @classmethod
+    def from_tree(cls, lat, lon, tree):
+        """由已构建好的树(如磁盘缓存中加载的)创建索引，跳过构建"""
+        index = cls.__new__(cls)
+        index.lat = lat
+        index.lon = lon
+        index.valid = _valid_coords(lat, lon)
+        index.tree = tree
+        index._degree_tree = None
+        return index
+
+    def __len__(self):
+        return len(self.lat)
+
+    def query_radius(self, lat, lon, radius_m):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        n = len(lat)
+        if n == 0 or len(self) == 0:
+            return np.zeros(n, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+
+        chord = float(chord_length(radius_m)) * (1 + CHORD_TOLERANCE)
+        query_tree = cKDTree(to_ecef(lat, lon))
+        pairs = query_tree.sparse_distance_matrix(self.tree, chord, output_type='ndarray')
+
+        order = np.lexsort((pairs['j'], pairs['i']))
+        rows = pairs['i'][order].astype(np.intp)
+        indices = pairs['j'][order].astype(np.intp)
+
+        keep, distances = _within_radius(rows, indices, pairs['v'][order], lat, lon, self, radius_m)
+        rows, indices, distances = rows[keep], indices[keep], distances[keep]
+
+        counts = np.bincount(rows, minlength=n).astype(np.intp)
+        return counts, indices, distances
+
+    def any_within(self, lat, lon, radius_m):
+        """返回布尔数组：每个查询点的半径范围内是否存在索引中的小区（只求存在性，比query_radius快）"""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if len(lat) == 0 or len(self) == 0:
+            return np.zeros(len(lat), dtype=bool)
+        chord = float(chord_length(radius_m)) * (1 + CHORD_TOLERANCE)
+        distances, _ = self.tree.query(to_ecef(lat, lon), k=1, distance_upper_bound=chord)
+        return np.isfinite(distances)
+
+    def degree_candidate_counts(self, lat, lon, radius_m):
+        """
+        对照统计：按经纬度(度)建树时，为保证不漏掉半径内小区所需的度数搜索半径
+        (按最高纬度的经度收缩放大)会返回的候选数量。
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if self._degree_tree is None:
+            self._degree_tree = cKDTree(np.column_stack([self.lat, self.lon]))
+        max_abs_lat = max(np.abs(lat).max(), np.abs(self.lat).max())
+        radius_deg = radius_m / (METERS_PER_DEGREE * np.cos(np.radians(max_abs_lat)))
+        return self._degree_tree.query_ball_point(np.column_stack([lat, lon]), r=radius_deg,
+                                                  return_length=True)
+
+
+class GridIndex:
+    """
+    纯NumPy的均匀网格(类geohash分桶)索引，scipy不可用时替代 SpatialIndex，接口和结果与其一致。
+    小区按纬度/经度方向边长约 cell_size_m 米的网格分桶，经度方向按索引范围内最高纬度换算，
+    查询半径不超过网格边长时只需检查相邻的3×3个网格，候选再按ECEF弦长(边界附近用haversine)判断是否在半径内。
+    """
+
+    def __init__(self, lat, lon, cell_size_m=DEFAULT_GRID_CELL_M):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_size_m = float(cell_size_m)
+        self.valid = _valid_coords(self.lat, self.lon)
+        self.ecef = to_ecef(self.lat, self.lon)
+        if len(self.lat) == 0:
+            self.lat_origin = self.lon_origin = 0.0
+            self.max_abs_lat = 0.0
+        else:
+            self.lat_origin, self.lon_origin = self.lat.min(), self.lon.min()
+            self.max_abs_lat = min(np.abs(self.lat).max() + self.cell_size_m / METERS_PER_DEGREE, 89.0)
+        self.cell_lat_deg = self.cell_size_m / METERS_PER_DEGREE
+        self.cell_lon_deg = self.cell_size_m / (METERS_PER_DEGREE * np.cos(np.radians(self.max_abs_lat)))
+
+        col = self._cell_col(self.lon)
+        self.n_cols = int(col.max()) + 1 if len(col) else 1
+        keys = self._cell_row(self.lat) * self.n_cols + col
+        # 稳定排序：同一网格内保持小区原有顺序(索引升序)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _cell_row(self, lat):
+        return np.floor((lat - self.lat_origin) / self.cell_lat_deg).astype(np.int64)
+
+    def _cell_col(self, lon):
+        return np.floor((lon - self.lon_origin) / self.cell_lon_deg).astype(np.int64)
+
+    def _rings(self, lat, radius_m):
+        """查询需要检查的网格圈数(纬度方向, 经度方向)，查询点纬度超出索引范围时经度方向相应放宽"""
+        ring_lat = int(np.ceil(radius_m / self.cell_size_m))
+        max_abs_lat = min(max(np.abs(lat).max() + radius_m / METERS_PER_DEGREE, self.max_abs_lat), 89.9)
+        # 半径内两点经度差不超过 r/(R·cos(最高纬度))，乘以微小余量抵消 asin 的非线性
+        lon_extent = radius_m * 1.0001 / (METERS_PER_DEGREE * np.cos(np.radians(max_abs_lat)))
+        ring_lon = int(np.ceil(lon_extent / self.cell_lon_deg))
+        return ring_lat, ring_lon
+
+    def _query_batch(self, lat, lon, radius_m):
+        n = len(lat)
+        rows_q, cols_q = self._cell_row(lat), self._cell_col(lon)
+        ring_lat, ring_lon = self._rings(lat, radius_m)
+
+        row_parts, index_parts = [], []
+        for d_row in range(-ring_lat, ring_lat + 1):
+            for d_col in range(-ring_lon, ring_lon + 1):
+                cols = cols_q + d_col
+                valid = (cols >= 0) & (cols < self.n_cols)
+                keys = (rows_q + d_row) * self.n_cols + cols
+                starts = np.searchsorted(self.sorted_keys, keys, side='left')
+                ends = np.searchsorted(self.sorted_keys, keys, side='right')
+                lengths = np.where(valid, ends - starts, 0)
+                total = int(lengths.sum())
+                if total == 0:
+                    continue
+                # 把每个查询点命中的 [start, end) 区间展开为候选位置
+                offsets = np.cumsum(lengths) - lengths
+                positions = np.arange(total) - np.repeat(offsets, lengths) + np.repeat(starts, lengths)
+                row_parts.append(np.repeat(np.arange(n), lengths))
+                index_parts.append(self.order[positions])
+
+        if not row_parts:
+            return np.zeros(n, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        rows = np.concatenate(row_parts)
+        indices = np.concatenate(index_parts)
+
+        chord = np.linalg.norm(to_ecef(lat, lon)[rows] - self.ecef[indices], axis=1)
+        keep, distances = _within_radius(rows, indices, chord, lat, lon, self, radius_m)
+        rows, indices, distances = rows[keep], indices[keep], distances[keep]
+        order = np.lexsort((indices, rows))
+        counts = np.bincount(rows, minlength=n).astype(np.intp)
+        return counts, indices[order].astype(np.intp), distances[order]
+
+    def query_radius(self, lat, lon, radius_m):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        n = len(lat)
+        if n == 0 or len(self) == 0:
+            return np.zeros(n, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+
+        parts = [self._query_batch(lat[start:start + GRID_QUERY_BATCH], lon[start:start + GRID_QUERY_BATCH], radius_m)
+                 for start in range(0, n, GRID_QUERY_BATCH)]
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+    def any_within(self, lat, lon, radius_m):
+        """返回布尔数组：每个查询点的半径范围内是否存在索引中的小区"""
+        return self.query_radius(lat, lon, radius_m)[0] > 0
+
+
+def build_spatial_index(lat, lon, cell_size_m=DEFAULT_GRID_CELL_M):
+    """构建5G小区空间索引；scipy不可用时使用网格边长为 cell_size_m 的纯NumPy网格索引"""
+    if 'cKDTree' not in globals():
+        return GridIndex(lat, lon, cell_size_m)
+    return SpatialIndex(lat, lon)
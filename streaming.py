@@ -0,0 +1,270 @@
+# ===== File: streaming.py (超大4G工参表的分块流式分析) =====
+# 用法: python streaming.py 4G工参.csv 5G工参.xlsx 分析结果.parquet [--chunk-size 100000]
+# 4G表按固定行数分块读取(CSV/Parquet/Excel)，每块与内存中的5G索引比对后立即写入结果文件，
+# 峰值内存只与块大小有关，与4G表总行数无关。
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from main_analyzer import analyze_5g_offload_chunks, with_analysis_text
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+REQUIRED_COLUMNS = ['小区名称', '经度', '纬度', '方位角']
+DEFAULT_CHUNK_SIZE = 100_000
+# Excel单个工作表的最大行数(含表头)，超出后续写到新的工作表
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def _normalize_columns(df):
+    """清理列名空格，并检查必需列"""
+    df.columns = [str(col).strip() for col in df.columns]
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_cols:
+        raise ValueError(f"文件缺少以下必需的列: {', '.join(missing_cols)}")
+    return df
+
+
+def _iter_excel(path, chunk_size):
+    """openpyxl只读模式逐行读取，每chunk_size行组成一个DataFrame"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(col).strip() if col is not None else '' for col in header]
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _iter_parquet(path, chunk_size):
+    if pa is None:
+        raise ValueError("读取Parquet文件需要安装pyarrow。")
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+def iter_table_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """按文件扩展名选择读取方式，逐块产出DataFrame（已清理列名并检查必需列）"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        chunks = pd.read_csv(path, chunksize=chunk_size)
+    elif ext == '.parquet':
+        chunks = _iter_parquet(path, chunk_size)
+    elif ext == '.xlsx':
+        chunks = _iter_excel(path, chunk_size)
+    elif ext == '.xls':
+        raise ValueError("旧版.xls文件无法分块读取，请另存为.xlsx、CSV或Parquet格式。")
+    else:
+        raise ValueError(f"不支持的文件格式: {ext}")
+    for chunk in chunks:
+        yield _normalize_columns(chunk)
+
+
+class CsvSink:
+    """逐块追加写入CSV（UTF-8 BOM，便于Excel直接打开）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self._header_written = False
+
+    def write(self, df):
+        df.to_csv(self._file, index=False, header=not self._header_written)
+        self._header_written = True
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """逐块写入Parquet的行组，以第一块的结构作为文件结构"""
+
+    def __init__(self, path):
+        if pa is None:
+            raise ValueError("写入Parquet文件需要安装pyarrow。")
+        self.path = path
+        self._writer = None
+
+    def write(self, df):
+        if self._writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _excel_rows(df):
+    """
+    逐行产出写入Excel的值：缺失值写为空单元格，无穷大写为 'inf'/'-inf'(与 DataFrame.to_excel 一致)，
+    避免写出Excel无法识别的NaN/inf数值。
+    """
+    columns = []
+    for col in df.columns:
+        values = df[col].to_numpy(dtype=object)
+        missing = pd.isna(values)
+        if missing.any():
+            values[missing] = None
+        if df[col].dtype.kind == 'f':
+            numbers = df[col].to_numpy()
+            values[numbers == np.inf] = 'inf'
+            values[numbers == -np.inf] = '-inf'
+        columns.append(values)
+    return zip(*columns)
+
+
+class ExcelSink:
+    """
+    逐行写入，不在内存中保留整个工作簿：装有xlsxwriter时使用其 constant_memory 模式(更快)，
+    否则使用openpyxl只写模式。单个工作表写满 EXCEL_MAX_ROWS 行后续写到新的工作表
+    (名称依次加 _2、_3 后缀，每个工作表都带表头)。
+    """
+
+    def __init__(self, path, sheet_name='5G分流分析结果', max_rows=EXCEL_MAX_ROWS):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.max_rows = max_rows
+        if xlsxwriter is not None:
+            self._workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        else:
+            from openpyxl import Workbook
+            self._workbook = Workbook(write_only=True)
+        self._sheet = self._add_sheet(sheet_name)
+        self._sheet_count = 1
+        self._header = None
+        self._next_row = 0
+
+    def _add_sheet(self, sheet_name):
+        if xlsxwriter is not None:
+            return self._workbook.add_worksheet(sheet_name)
+        return self._workbook.create_sheet(sheet_name)
+
+    def _append(self, sheet, row_number, row):
+        if row_number >= self.max_rows:
+            raise ValueError(f"Excel工作表最多 {self.max_rows} 行，第 {row_number + 1} 行无法写入")
+        if xlsxwriter is not None:
+            # xlsxwriter 写入失败(超出行列范围等)时不抛异常，只返回负数
+            if sheet.write_row(row_number, 0, row) < 0:
+                raise ValueError(f"写入Excel第 {row_number + 1} 行失败")
+        else:
+            sheet.append(row)
+
+    def _write_header(self):
+        self._append(self._sheet, 0, self._header)
+        self._next_row = 1
+
+    def _next_sheet(self):
+        """当前工作表已写满，新建下一个工作表并写入表头"""
+        self._sheet_count += 1
+        self._sheet = self._add_sheet(f'{self.sheet_name}_{self._sheet_count}')
+        self._write_header()
+
+    def write(self, df):
+        if self._header is None:
+            self._header = [str(col) for col in df.columns]
+            self._write_header()
+        for row in _excel_rows(df):
+            if self._next_row >= self.max_rows:
+                self._next_sheet()
+            self._append(self._sheet, self._next_row, row)
+            self._next_row += 1
+
+    def write_sheet(self, sheet_name, df):
+        """另建一个工作表写入整张(小)表，如统计信息；须在 close() 之前调用"""
+        sheet = self._add_sheet(sheet_name)
+        self._append(sheet, 0, [str(col) for col in df.columns])
+        for row_number, row in enumerate(_excel_rows(df), 1):
+            self._append(sheet, row_number, row)
+
+    def close(self):
+        if xlsxwriter is not None:
+            self._workbook.close()
+        else:
+            self._workbook.save(self.path)
+
+
+SINKS = {'.csv': CsvSink, '.parquet': ParquetSink, '.xlsx': ExcelSink}
+
+
+def open_sink(path):
+    """按扩展名创建结果写入器"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SINKS:
+        raise ValueError(f"不支持的结果文件格式: {ext}，可选: {', '.join(SINKS)}")
+    return SINKS[ext](path)
+
+
+def write_stream(result_chunks, sink, progress_callback=None):
+    """把结果分块依次写入sink，返回写入的总行数；写入结束(包括出错)时关闭sink"""
+    total = 0
+    try:
+        for chunk in result_chunks:
+            sink.write(chunk)
+            total += len(chunk)
+            if progress_callback:
+                progress_callback(total)
+    finally:
+        sink.close()
+    return total
+
+
+def stream_analysis(path_4g, df_5g, output_path, d_colo, theta_colo, d_non_colo, n_non_colo,
+                    chunk_size=DEFAULT_CHUNK_SIZE, index_cache=None, progress_callback=None):
+    """从文件分块读取4G表，分析结果分块写入output_path，返回结果总行数"""
+    result_chunks = analyze_5g_offload_chunks(iter_table_chunks(path_4g, chunk_size), df_5g, d_colo, theta_colo,
+                                              d_non_colo, n_non_colo, index_cache=index_cache)
+    if not output_path.lower().endswith('.parquet'):
+        # CSV/Excel面向人工查看，写入时生成可读的分析结果文本；Parquet保留结构化列
+        result_chunks = map(with_analysis_text, result_chunks)
+    return write_stream(result_chunks, open_sink(output_path), progress_callback)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="超大4G工参表的分块流式5G分流分析")
+    parser.add_argument("input_4g", help="4G工参表 (.csv/.parquet/.xlsx)")
+    parser.add_argument("input_5g", help="5G工参表 (.csv/.parquet/.xlsx)")
+    parser.add_argument("output", help="结果文件 (.csv/.parquet/.xlsx)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--d-colo", type=float, default=50)
+    parser.add_argument("--theta-colo", type=float, default=30)
+    parser.add_argument("--d-non-colo", type=float, default=300)
+    parser.add_argument("--n-non-colo", type=int, default=1)
+    args = parser.parse_args()
+
+    df_5g = pd.concat(iter_table_chunks(args.input_5g, args.chunk_size), ignore_index=True)
+    total = stream_analysis(args.input_4g, df_5g, args.output, args.d_colo, args.theta_colo, args.d_non_colo,
+                            args.n_non_colo, chunk_size=args.chunk_size,
+                            progress_callback=lambda n: print(f"已分析 {n} 个4G小区", end='\r'))
+    print(f"\n分析完成，共 {total} 行，结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
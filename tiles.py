@@ -0,0 +1,324 @@
+# ===== File: tiles.py (扇区图层的预渲染栅格瓦片) =====
+# 超大区域的扇区即使用紧凑的矢量数据传给浏览器，现场笔记本仍然吃不消。这里把4G、5G和各分析类别的扇区
+# 预先栅格化为 z/x/y 的PNG瓦片金字塔(Web墨卡托，256像素)，多进程并行生成，按小区数据指纹存放在
+# static/tiles/<指纹>/ 下(指纹优先由输入数据集的指纹得到，不逐个小区哈希)，由Streamlit静态文件服务(server.enableStaticServing)提供给地图的TileLayer。
+# 数据变化后基于上一版金字塔增量生成：只重画包含变化小区(新旧位置)的瓦片，其余瓦片直接复用。
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from algorithms import create_sector_polygon_batch, SECTOR_ANGLE_DEG
+from parallel import SharedArrays, _attach
+
+logger = logging.getLogger(__name__)
+
+# 瓦片格式版本，绘制方式变化时递增，旧版本的金字塔不再被复用
+TILE_FORMAT_VERSION = 1
+DEFAULT_TILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'tiles')
+# Streamlit 把应用目录下 static/ 中的文件发布在 /app/static/ 路径下
+TILE_URL_PREFIX = '/app/static/tiles'
+TILE_SIZE = 256
+# 预渲染的缩放级别范围，更高级别由浏览器放大最高一级的瓦片显示
+DEFAULT_MIN_ZOOM = 10
+DEFAULT_MAX_ZOOM = 15
+# 每个子进程任务包含的瓦片数
+TILES_PER_TASK = 64
+# 最多保留的金字塔数量，超出时按最近使用时间淘汰
+DEFAULT_MAX_PYRAMIDS = 5
+# 扇区填充和边线的不透明度(0~255)，与矢量图层的 fillOpacity=0.3、opacity=0.8 一致
+FILL_ALPHA = 77
+OUTLINE_ALPHA = 204
+# 计算扇区覆盖的瓦片时外扩的像素数，防止边线被相邻瓦片截断
+OUTLINE_PAD_PX = 2
+
+CELL_ARRAYS = ('lon', 'lat', 'azimuth', 'radius', 'style')
+
+
+def mercator(lon, lat):
+    """经纬度转换为归一化的Web墨卡托坐标(0~1，x向东、y向南)"""
+    lat_rad = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = 0.5 - np.log(np.tan(np.pi / 4 + lat_rad / 2)) / (2 * np.pi)
+    return x, y
+
+
+def _tile_key(z, x, y):
+    return (np.int64(z) << 42) | (np.asarray(x, dtype=np.int64) << 21) | np.asarray(y, dtype=np.int64)
+
+
+def _split_key(key):
+    key = int(key)
+    return key >> 42, (key >> 21) & 0x1FFFFF, key & 0x1FFFFF
+
+
+def _tile_ranges(mx, my, z):
+    """每个扇区外包矩形(外扩OUTLINE_PAD_PX像素)在第z级覆盖的瓦片范围 (x0, x1, y0, y1)，闭区间"""
+    scale = 2 ** z
+    pad = OUTLINE_PAD_PX / TILE_SIZE
+    x0 = np.floor(mx.min(axis=1) * scale - pad).astype(np.int64)
+    x1 = np.floor(mx.max(axis=1) * scale + pad).astype(np.int64)
+    y0 = np.floor(my.min(axis=1) * scale - pad).astype(np.int64)
+    y1 = np.floor(my.max(axis=1) * scale + pad).astype(np.int64)
+    return np.clip(x0, 0, scale - 1), np.clip(x1, 0, scale - 1), np.clip(y0, 0, scale - 1), np.clip(y1, 0, scale - 1)
+
+
+def _tile_sectors(mx, my, z):
+    """第z级每个扇区覆盖的瓦片，返回按瓦片排序的(瓦片键, 扇区号)对"""
+    if len(mx) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.intp)
+    x0, x1, y0, y1 = _tile_ranges(mx, my, z)
+    nx, ny = x1 - x0 + 1, y1 - y0 + 1
+    counts = nx * ny
+    sectors = np.repeat(np.arange(len(mx)), counts)
+    # 把每个扇区的瓦片矩形展开为逐个瓦片
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tile_x = x0[sectors] + local % nx[sectors]
+    tile_y = y0[sectors] + local // nx[sectors]
+    keys = _tile_key(z, tile_x, tile_y)
+    order = np.lexsort((sectors, keys))
+    return keys[order], sectors[order]
+
+
+def fingerprint_cells(cells, colors, min_zoom, max_zoom):
+    """金字塔指纹：小区数据、配色、缩放级别范围和瓦片格式版本"""
+    digest = hashlib.sha1()
+    for name in CELL_ARRAYS:
+        digest.update(np.ascontiguousarray(cells[name]).tobytes())
+    digest.update(json.dumps([list(colors), min_zoom, max_zoom, TILE_FORMAT_VERSION]).encode())
+    return digest.hexdigest()
+
+
+def fingerprint_sources(keys, params, min_zoom, max_zoom):
+    """
+    由输入数据集指纹得到的金字塔指纹，不读取小区数据。keys 为生成小区数据的各数据集指纹，
+    params 为其余影响小区数据和配色的参数(可转为JSON)。
+    """
+    return hashlib.sha1(json.dumps([list(keys), params, min_zoom, max_zoom, TILE_FORMAT_VERSION]).encode()).hexdigest()
+
+
+def _render_tiles(spec, colors, out_dir, tasks):
+    """子进程：绘制一批瓦片并写入out_dir，tasks 为 [(瓦片键, 扇区号数组)]，返回处理的瓦片数"""
+    arrays, blocks = _attach(spec)
+    try:
+        for key, sectors in tasks:
+            z, x, y = _split_key(key)
+            path = os.path.join(out_dir, str(z), str(x), f'{y}.png')
+            # 增量生成时瓦片是上一版的硬链接，先删除再写，不能覆盖写入；瓦片内已没有小区时只删除
+            if os.path.exists(path):
+                os.remove(path)
+            if len(sectors) == 0:
+                continue
+            scale = 2 ** z * TILE_SIZE
+            px = arrays['mx'][sectors] * scale - x * TILE_SIZE
+            py = arrays['my'][sectors] * scale - y * TILE_SIZE
+            styles = arrays['style'][sectors]
+
+            tile = Image.new('RGBA', (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+            # 按样式编号从小到大逐层绘制：同一样式的扇区画在一个透明度蒙版上，再整体叠加颜色
+            for style in np.unique(styles):
+                mask = Image.new('L', (TILE_SIZE, TILE_SIZE), 0)
+                draw = ImageDraw.Draw(mask)
+                for xs, ys in zip(px[styles == style], py[styles == style]):
+                    draw.polygon(np.column_stack([xs, ys]).ravel().tolist(), fill=FILL_ALPHA, outline=OUTLINE_ALPHA)
+                layer = Image.new('RGBA', (TILE_SIZE, TILE_SIZE), colors[style] + (255,))
+                layer.putalpha(mask)
+                tile.alpha_composite(layer)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tile.save(path, optimize=False)
+        return len(tasks)
+    finally:
+        arrays.clear()
+        for block in blocks:
+            block.close()
+
+
+class TilePyramid:
+    """磁盘上的一套瓦片金字塔"""
+
+    def __init__(self, tile_dir, fingerprint, min_zoom, max_zoom, stats=None):
+        self.tile_dir = tile_dir
+        self.fingerprint = fingerprint
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        # 本次生成的统计：{'rendered': 重画的瓦片数, 'reused': 是否直接复用了已有金字塔, 'incremental': 是否增量生成}
+        self.stats = stats or {}
+
+    @property
+    def path(self):
+        return os.path.join(self.tile_dir, self.fingerprint)
+
+    @property
+    def url_template(self):
+        return f'{TILE_URL_PREFIX}/{self.fingerprint}/{{z}}/{{x}}/{{y}}.png'
+
+
+def _load_manifest(entry_dir):
+    try:
+        with open(os.path.join(entry_dir, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def open_tile_pyramid(fingerprint, tile_dir=DEFAULT_TILE_DIR, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM):
+    """磁盘上已有指纹为 fingerprint 的金字塔时返回 TilePyramid (并更新其使用时间)，否则返回None"""
+    entry_dir = os.path.join(tile_dir, fingerprint)
+    if _load_manifest(entry_dir) is None:
+        return None
+    os.utime(entry_dir)
+    return TilePyramid(tile_dir, fingerprint, min_zoom, max_zoom, {'rendered': 0, 'reused': True, 'incremental': False})
+
+
+def _changed_sectors(previous_cells, cells):
+    """新旧小区数据的差异：返回(新数据中新增或变化的行号, 旧数据中删除或变化的行号)"""
+    def rows(data):
+        table = np.column_stack([np.asarray(data[name], dtype=np.float64) for name in CELL_ARRAYS])
+        return np.ascontiguousarray(table).view(np.dtype((np.void, table.dtype.itemsize * table.shape[1]))).ravel()
+
+    new_rows, old_rows = rows(cells), rows(previous_cells)
+    return np.flatnonzero(~np.isin(new_rows, old_rows)), np.flatnonzero(~np.isin(old_rows, new_rows))
+
+
+def _evict(tile_dir, max_pyramids, keep):
+    entries = []
+    for name in os.listdir(tile_dir):
+        entry_dir = os.path.join(tile_dir, name)
+        if os.path.isdir(entry_dir) and '.tmp' not in name and name != keep:
+            entries.append((os.path.getmtime(entry_dir), entry_dir))
+    for _, entry_dir in sorted(entries)[:max(0, len(entries) + 1 - max_pyramids)]:
+        shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+def build_tile_pyramid(cells, colors, tile_dir=DEFAULT_TILE_DIR, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM,
+                       previous=None, workers=None, progress_callback=None, max_pyramids=DEFAULT_MAX_PYRAMIDS,
+                       fingerprint=None):
+    """
+    生成扇区瓦片金字塔，返回 TilePyramid。
+    cells 为 {'lon', 'lat', 'azimuth', 'radius', 'style'} 数组字典，style 是 colors 中的颜色序号，
+    序号小的先画；colors 为 RGB 元组列表。fingerprint 为调用方按输入数据集指纹得到的金字塔指纹
+    (见 fingerprint_sources)，未给出时按小区数据内容计算。相同指纹的金字塔已存在时直接复用；否则若 previous
+    (上一版金字塔的指纹)存在，则复制上一版并只重画受变化小区影响的瓦片。
+    """
+    if min_zoom > max_zoom:
+        raise ValueError(f"瓦片最小缩放级别 {min_zoom} 大于最大缩放级别 {max_zoom}")
+    cells = {name: np.asarray(cells[name]) for name in CELL_ARRAYS}
+    colors = [tuple(int(c) for c in color) for color in colors]
+    if fingerprint is None:
+        fingerprint = fingerprint_cells(cells, colors, min_zoom, max_zoom)
+    entry_dir = os.path.join(tile_dir, fingerprint)
+    pyramid = open_tile_pyramid(fingerprint, tile_dir, min_zoom, max_zoom)
+    if pyramid is not None:
+        if progress_callback:
+            progress_callback(1, 1)
+        return pyramid
+
+    os.makedirs(tile_dir, exist_ok=True)
+    tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # 增量生成：上一版金字塔的配置一致时复制(硬链接)过来，只重画变化小区新旧位置覆盖的瓦片
+    dirty_sectors = None
+    previous_dir = os.path.join(tile_dir, previous) if previous else None
+    previous_manifest = _load_manifest(previous_dir) if previous_dir else None
+    if (previous_manifest is not None and previous_manifest.get('version') == TILE_FORMAT_VERSION
+            and previous_manifest.get('colors') == [list(color) for color in colors]
+            and previous_manifest.get('zoom') == [min_zoom, max_zoom]):
+        with np.load(os.path.join(previous_dir, 'cells.npz')) as data:
+            previous_cells = {name: data[name] for name in CELL_ARRAYS}
+        added, removed = _changed_sectors(previous_cells, cells)
+        shutil.copytree(previous_dir, tmp_dir, copy_function=os.link)
+        dirty_sectors = (added, {name: previous_cells[name][removed] for name in CELL_ARRAYS})
+    else:
+        os.makedirs(tmp_dir)
+
+    polygons = create_sector_polygon_batch(cells['lon'], cells['lat'], cells['azimuth'], cells['radius'],
+                                           SECTOR_ANGLE_DEG)
+    mx, my = mercator(polygons[:, :-1, 0], polygons[:, :-1, 1])
+    if dirty_sectors is not None:
+        added, removed_cells = dirty_sectors
+        removed_polygons = create_sector_polygon_batch(removed_cells['lon'], removed_cells['lat'],
+                                                       removed_cells['azimuth'], removed_cells['radius'],
+                                                       SECTOR_ANGLE_DEG)
+        removed_mx, removed_my = mercator(removed_polygons[:, :-1, 0], removed_polygons[:, :-1, 1])
+        dirty_mx = np.concatenate([mx[added], removed_mx])
+        dirty_my = np.concatenate([my[added], removed_my])
+
+    tasks = []
+    for z in range(min_zoom, max_zoom + 1):
+        keys, sectors = _tile_sectors(mx, my, z)
+        tile_keys, starts = np.unique(keys, return_index=True)
+        groups = np.split(sectors, starts[1:]) if len(keys) else []
+        if dirty_sectors is None:
+            tasks.extend(zip(tile_keys.tolist(), groups))
+            continue
+        dirty_keys = np.unique(_tile_sectors(dirty_mx, dirty_my, z)[0]) if len(dirty_mx) else np.empty(0, np.int64)
+        positions = np.searchsorted(tile_keys, dirty_keys)
+        for key, position in zip(dirty_keys.tolist(), positions.tolist()):
+            found = position < len(tile_keys) and tile_keys[position] == key
+            tasks.append((key, groups[position] if found else np.empty(0, dtype=np.intp)))
+
+    shared = SharedArrays({'mx': mx, 'my': my, 'style': cells['style'].astype(np.intp)})
+    try:
+        done = 0
+        batches = [tasks[start:start + TILES_PER_TASK] for start in range(0, len(tasks), TILES_PER_TASK)]
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            for batch in batches:
+                done += _render_tiles(shared.spec, colors, tmp_dir, batch)
+                if progress_callback:
+                    progress_callback(done, len(tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_render_tiles, shared.spec, colors, tmp_dir, batch) for batch in batches]
+                try:
+                    for future in as_completed(futures):
+                        done += future.result()
+                        if progress_callback:
+                            progress_callback(done, len(tasks))
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        shared.release()
+
+    # 复制来的cells.npz和manifest.json是上一版的硬链接，先删除再写
+    for name in ('cells.npz', 'manifest.json'):
+        if os.path.exists(os.path.join(tmp_dir, name)):
+            os.remove(os.path.join(tmp_dir, name))
+    np.savez(os.path.join(tmp_dir, 'cells.npz'), **cells)
+    manifest = {
+        'version': TILE_FORMAT_VERSION,
+        'fingerprint': fingerprint,
+        'colors': [list(color) for color in colors],
+        'zoom': [min_zoom, max_zoom],
+        'cells': len(cells['lon']),
+        'rendered': len(tasks),
+        'incremental_from': previous if dirty_sectors is not None else None,
+        'created': time.time(),
+    }
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        # 其他进程已生成同一指纹的金字塔，内容相同
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _evict(tile_dir, max_pyramids, fingerprint)
+    logger.info(f"瓦片金字塔 {fingerprint}: 绘制 {len(tasks)} 个瓦片"
+                f"{'(增量)' if dirty_sectors is not None else ''}")
+    return TilePyramid(tile_dir, fingerprint, min_zoom, max_zoom,
+                       {'rendered': len(tasks), 'reused': False, 'incremental': dirty_sectors is not None})
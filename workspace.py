@@ -0,0 +1,178 @@
+# ===== File: workspace.py (分析工作区的磁盘存储) =====
+# 校验后的4G/5G工参表和分析结果只保存在 st.session_state 中，刷新页面或重启服务后就要重新上传、
+# 重新分析。工作区把这几张表按 Arrow IPC(Feather v2，不压缩)格式保存到项目目录下，
+# 分析参数、各表指纹和结果的 attrs 记录在 manifest.json 中；重新打开时以内存映射方式读取，
+# 不经过Excel解析，也不重新计算指纹。
+# 表文件名带内容指纹，重复保存时未变化的表(如增量分析后的工参表)不会重写。
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from datasets import Dataset, as_dataset
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# 工作区格式版本，表文件或manifest结构变化时递增，旧版本工作区不再打开
+WORKSPACE_FORMAT_VERSION = 1
+DEFAULT_WORKSPACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workspaces')
+# 工作区保存的表及其显示名称
+WORKSPACE_TABLES = {'4g': '4G工参', '5g': '5G工参', 'results': '分析结果'}
+
+
+def _json_default(value):
+    """attrs 中的 numpy 标量等转换为可写入JSON的值"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _to_arrow(df):
+    """DataFrame 转为 Arrow 表；object 列中混有数字和字符串(Excel中常见的纯数字小区名)时统一转为字符串"""
+    try:
+        return pa.Table.from_pandas(df, preserve_index=None)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        df = df.copy(deep=False)
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].map(lambda v: v if isinstance(v, str) or pd.isna(v) else str(v))
+        return pa.Table.from_pandas(df, preserve_index=None)
+
+
+def _list_dtype(arrow_type):
+    """列表类型的列(top-K候选列)还原为 pd.ArrowDtype，与分析结果中的类型一致"""
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def _check_name(name):
+    """工作区名称用作目录名，不能为空，不能包含路径分隔符"""
+    name = str(name).strip()
+    if not name or name.startswith('.') or any(sep in name for sep in ('/', '\\', os.sep)):
+        raise ValueError(f"无效的工作区名称: '{name}'")
+    return name
+
+
+class WorkspaceStore:
+    """按名称保存和打开分析工作区，每个工作区一个子目录"""
+
+    def __init__(self, root=DEFAULT_WORKSPACE_DIR):
+        self.root = root
+
+    def _workspace_dir(self, name):
+        return os.path.join(self.root, _check_name(name))
+
+    def _read_manifest(self, workspace_dir):
+        try:
+            with open(os.path.join(workspace_dir, 'manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('version') != WORKSPACE_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def list(self):
+        """全部可用工作区的manifest，最近保存的在前"""
+        if not os.path.isdir(self.root):
+            return []
+        manifests = [self._read_manifest(os.path.join(self.root, name)) for name in os.listdir(self.root)]
+        return sorted((m for m in manifests if m is not None), key=lambda m: m['updated'], reverse=True)
+
+    def save(self, name, tables, params=None, sources=None):
+        """
+        保存工作区。tables 为 {'4g'/'5g'/'results': Dataset 或 DataFrame}，params 为分析参数，
+        sources 为原始文件名等说明信息。返回写入的manifest。
+        """
+        if pa is None:
+            raise ValueError("保存工作区需要安装pyarrow。")
+        unknown = set(tables) - set(WORKSPACE_TABLES)
+        if unknown:
+            raise ValueError(f"不支持的工作区表: {', '.join(sorted(unknown))}")
+        name = _check_name(name)
+        workspace_dir = self._workspace_dir(name)
+        os.makedirs(workspace_dir, exist_ok=True)
+        previous = self._read_manifest(workspace_dir)
+
+        entries = {}
+        for table, data in tables.items():
+            dataset = as_dataset(data, WORKSPACE_TABLES[table])
+            if dataset is None:
+                continue
+            frame = dataset.view()
+            file_name = f'{table}.{dataset.key[:16]}.arrow'
+            path = os.path.join(workspace_dir, file_name)
+            if not os.path.exists(path):
+                tmp_path = f'{path}.tmp{os.getpid()}'
+                feather.write_feather(_to_arrow(frame), tmp_path, compression='uncompressed')
+                os.replace(tmp_path, path)
+            entries[table] = {
+                'file': file_name,
+                'fingerprint': dataset.key,
+                'rows': len(dataset),
+                'bytes': os.path.getsize(path),
+                'attrs': json.loads(json.dumps(frame.attrs, default=_json_default)),
+            }
+
+        now = time.time()
+        manifest = {
+            'version': WORKSPACE_FORMAT_VERSION,
+            'name': name,
+            'created': previous['created'] if previous else now,
+            'updated': now,
+            'params': params,
+            'sources': sources or {},
+            'tables': entries,
+        }
+        # manifest先写临时文件再原子替换，打开中的工作区不会读到半写入的manifest
+        manifest_path = os.path.join(workspace_dir, 'manifest.json')
+        with open(f'{manifest_path}.tmp{os.getpid()}', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(f'{manifest_path}.tmp{os.getpid()}', manifest_path)
+
+        # 删除不再引用的旧表文件；Windows下仍被内存映射的文件删不掉，留到下次保存
+        keep = {entry['file'] for entry in entries.values()} | {'manifest.json'}
+        for file_name in os.listdir(workspace_dir):
+            if file_name not in keep:
+                try:
+                    os.remove(os.path.join(workspace_dir, file_name))
+                except OSError:
+                    pass
+        summary = ', '.join(f"{table} {entry['rows']}行" for table, entry in entries.items())
+        logger.info(f"工作区已保存: {name} ({summary})")
+        return manifest
+
+    def open(self, name):
+        """
+        打开工作区，返回(manifest, {表名: Dataset})。表文件以内存映射方式读取，数值列尽量不复制；
+        Dataset 直接使用manifest中的指纹。工作区不存在或已损坏时抛出 ValueError。
+        """
+        if pa is None:
+            raise ValueError("打开工作区需要安装pyarrow。")
+        workspace_dir = self._workspace_dir(name)
+        manifest = self._read_manifest(workspace_dir)
+        if manifest is None:
+            raise ValueError(f"工作区不存在或版本不兼容: {name}")
+        datasets = {}
+        try:
+            for table, entry in manifest['tables'].items():
+                arrow_table = feather.read_table(os.path.join(workspace_dir, entry['file']), memory_map=True)
+                frame = arrow_table.to_pandas(split_blocks=True, types_mapper=_list_dtype)
+                frame.attrs.update(entry.get('attrs', {}))
+                datasets[table] = Dataset(frame, WORKSPACE_TABLES[table], key=entry['fingerprint'])
+        except (OSError, pa.ArrowException) as e:
+            raise ValueError(f"工作区 {name} 已损坏: {e}") from e
+        return manifest, datasets
+
+    def delete(self, name):
+        shutil.rmtree(self._workspace_dir(name), ignore_errors=True)